@@ -4,7 +4,8 @@ Admin panel (REST) for your aiogram bot modules:
  - hayvon_top (items with images+audios, grouped by category)
  - darslik (code+title+text+pdf)
  - bot users (upsert, block/unblock)
- - notify (broadcast/send text, audio/voice, video, photo, document, mixed)
+ - notify (broadcast/send text, audio/voice, video, photo, document, mixed, copy)
+   -> durable job queue (BroadcastJob + BroadcastRecipient ledger), sent by broadcast_worker.py
 
 Tech stack: FastAPI + SQLModel + SQLite.
 Auth: X-API-Key header.
@@ -12,30 +13,75 @@ Static uploads: ./static/images, ./static/audios, ./static/pdfs, ./static/videos
 Swagger UI: /docs (Authorize -> apiKey scheme).
 
 Run:
-  pip install fastapi uvicorn sqlmodel python-multipart httpx
+  pip install fastapi uvicorn sqlmodel python-multipart httpx aiosqlite orjson
   export ADMIN_API_KEY="changeme"            # or your own
   export TELEGRAM_BOT_TOKEN="12345:ABCDE"    # required for /notify/* endpoints
+  # broadcast tuning (broadcast.py): BROADCAST_RATE, BROADCAST_WORKERS, BROADCAST_PER_CHAT_INTERVAL
+  # media file_id uchun xizmat chati (ixtiyoriy): BROADCAST_CACHE_CHAT_ID
+  # jadval: BROADCAST_RESERVE_PERCENT (bot uchun zaxira, 20), BROADCAST_QUIET_HOURS, BROADCAST_TZ;
+  #   har bir /notify/* so'rovida: not_before, max_rate, quiet_hours
+  # SQLite: ADMIN_DB_PATH, ADMIN_SQLITE_PROFILE (tuned|default), ADMIN_SQLITE_PRAGMAS,
+  #   ADMIN_DB_POOL_SIZE, ADMIN_DB_MAX_OVERFLOW, ADMIN_DB_POOL_TIMEOUT (sync va async engine uchun)
+  # /export/*, /darslik, /users, /stats — async (aiosqlite); qolganlari sync Session(engine)
+  # ADMIN_STATS_TTL — /stats kesh muddati (soniya); ADMIN_GZIP_MIN_SIZE, ADMIN_GZIP_LEVEL
+  # ro'yxatlar: ?limit= yoki ?cursor= berilsa sahifalanadi, keyingi sahifa — X-Next-Cursor header'i
+  #   (ADMIN_PAGE_SIZE, ADMIN_PAGE_MAX); ikkalasi ham bo'lmasa — avvalgidek hamma qatorlar; ?fields=
+  # qidiruv: /users/search?q=, /darslik/search?q= (SQLite FTS5, bm25 bo'yicha)
+  # /upload/*: hajm chegarasi ADMIN_UPLOAD_LIMITS (MiB, masalan "video=500;image=5")
   uvicorn admin_app:app --reload --port 8099
+  python broadcast_worker.py                 # /notify/* job'larini yuboradi (alohida jarayon)
 """
 
 import os
+import html
+import gzip
+import json
+import base64
+import binascii
+import hashlib
+import logging
+import sqlite3
+import asyncio
+import threading
 import time
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence, Tuple
 from enum import Enum
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
+from urllib.parse import unquote, urlparse
 
-import httpx
 from fastapi import (
     FastAPI, Depends, HTTPException, UploadFile, File, Form,
-    BackgroundTasks, Request
+    Request
 )
+from fastapi.responses import JSONResponse, Response
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
-from    .staticfiles import StaticFiles
+from fastapi.staticfiles import StaticFiles
 from fastapi.openapi.utils import get_openapi
-from sqlmodel import SQLModel, Field, Session, create_engine, select
+from sqlalchemy import Float, Integer, String, bindparam, event, literal, null, tuple_, type_coerce, union_all
+from sqlalchemy import text as sa_text
+from sqlalchemy import column as sa_column, table as sa_table
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel import SQLModel, Field, Session, create_engine, select, func
 from sqlmodel import col
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+try:
+    import orjson
+except ImportError:  # ixtiyoriy: bo'lmasa standart json ishlatiladi
+    orjson = None
+
+from broadcast import parse_quiet_hours, to_utc_naive
+
+log = logging.getLogger("admin_app")
+
+
 class HayGroup(str, Enum):
     animal = "animal"
     action = "action"
@@ -51,13 +97,56 @@ PREF_BOT_TOKEN_ENV = "TELEGRAM_BOT_TOKEN"
 ALT_BOT_TOKEN_ENV = "botToken"
 
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / "data" / "app.db"
+DB_PATH = Path(os.getenv("ADMIN_DB_PATH", str(BASE_DIR / "data" / "app.db")))
+
+# SQLite profili: har bir yangi ulanishda PRAGMA'lar qo'llanadi.
+#   tuned   — WAL (o'quvchilar yozuvchini kutmaydi), synchronous=NORMAL, katta kesh/mmap
+#   default — SQLite standarti (rollback journal); taqqoslash uchun
+# ADMIN_SQLITE_PRAGMAS="cache_size=-131072;mmap_size=0" profil qiymatlarini almashtiradi.
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "tuned": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,            # ms: qulf band bo'lsa darhol xato emas, kutadi
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,        # manfiy — KiB (64 MiB), ulanish boshiga
+        "temp_store": "MEMORY",
+    },
+    "default": {},
+}
+ADMIN_SQLITE_PROFILE = os.getenv("ADMIN_SQLITE_PROFILE", "tuned").strip().lower()
+ADMIN_SQLITE_PRAGMAS = os.getenv("ADMIN_SQLITE_PRAGMAS", "")
+# FastAPI sync endpoint'lari threadpool'da (standart 40 ta) ishlaydi
+ADMIN_DB_POOL_SIZE = int(os.getenv("ADMIN_DB_POOL_SIZE", "10"))
+ADMIN_DB_MAX_OVERFLOW = int(os.getenv("ADMIN_DB_MAX_OVERFLOW", "30"))
+# async endpoint'lar threadpool bilan cheklanmaydi — ortiqcha so'rovlar pool navbatida kutadi
+ADMIN_DB_POOL_TIMEOUT = float(os.getenv("ADMIN_DB_POOL_TIMEOUT", "120"))
+# /stats natijasi shuncha soniya keshda; tegishli jadvalga yozuv bo'lsa darhol bekor qilinadi
+ADMIN_STATS_TTL = float(os.getenv("ADMIN_STATS_TTL", "30"))
+# /export/changes: boshqa jarayonlarning commit'lari shu oraliqda tekshiriladi (soniya)
+EXPORT_CHANGES_POLL = float(os.getenv("EXPORT_CHANGES_POLL", "0.5"))
+EXPORT_CHANGES_KEEP = int(os.getenv("EXPORT_CHANGES_KEEP", "10000"))
+EXPORT_LONGPOLL_MAX = 55.0
+# ro'yxat/eksport javoblari shu hajmdan (bayt) katta bo'lsa, Accept-Encoding: gzip bilan siqiladi
+ADMIN_GZIP_MIN_SIZE = int(os.getenv("ADMIN_GZIP_MIN_SIZE", "1024"))
+ADMIN_GZIP_LEVEL = int(os.getenv("ADMIN_GZIP_LEVEL", "6"))
+# ro'yxat endpoint'lari: faqat ?cursor= berilsa sahifa ADMIN_PAGE_SIZE, eng ko'pi ADMIN_PAGE_MAX qator;
+# limit ham cursor ham yo'q — sahifalashsiz (eski mijozlar, masalan Flutter admin, hammasini oladi)
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "100"))
+ADMIN_PAGE_MAX = int(os.getenv("ADMIN_PAGE_MAX", "1000"))
 
 IMG_DIR = BASE_DIR / "static" / "images"
 AUD_DIR = BASE_DIR / "static" / "audios"
 PDF_DIR = BASE_DIR / "static" / "pdfs"
 VID_DIR = BASE_DIR / "static" / "videos"
 
+# /upload/{kind}: fayl shu bo'laklarda diskka oqiziladi (xotirada butun fayl turmaydi)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# tur bo'yicha eng katta hajm (MiB); ADMIN_UPLOAD_LIMITS="video=500;image=5" almashtiradi
+UPLOAD_LIMITS_MB: Dict[str, int] = {"image": 10, "audio": 50, "pdf": 50, "video": 200}
+ADMIN_UPLOAD_LIMITS = os.getenv("ADMIN_UPLOAD_LIMITS", "")
+UPLOAD_MULTIPART_SLACK = 64 * 1024   # Content-Length'dagi multipart sarlavhalari uchun
+
 # --- SEED DIAGNOSTIKA (10 ta) ---
 SEED_DIAG = [
     ("Savat Asal Gilos", "/static/images/savat.png", 1),
@@ -79,7 +168,7 @@ api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 # ==== NEW: HayvonQuestion (1 audio) + HayvonOption (3 rasmdan biri to‘g‘ri) ====
 class HayvonQuestion(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    key: str                 # unique-like
+    key: str = Field(unique=True, index=True)
     title: str
     group: HayGroup = Field(default=HayGroup.animal)
     audio_path: str
@@ -89,7 +178,7 @@ class HayvonQuestion(SQLModel, table=True):
 class HayvonOption(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     question_id: int = Field(foreign_key="hayvonquestion.id")
-    opt_key: str            # masalan: mushuk_01_A (callback uchun)
+    opt_key: str            # masalan: mushuk_01_A (callback uchun); savol ichida yagona (migratsiya 3)
     image_path: str
     is_correct: bool = False
     sort_order: int = 0
@@ -119,7 +208,7 @@ class DiagnostikaItem(SQLModel, table=True):
 
 class HayvonItem(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    key: str  # unique-like (validated on create/update)
+    key: str = Field(unique=True, index=True)
     title: str
     group: HayGroup = Field(default=HayGroup.animal)
     image_path: str
@@ -130,7 +219,7 @@ class HayvonItem(SQLModel, table=True):
 
 class Darslik(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    code: str = Field(index=True)   # unique-like (validated)
+    code: str = Field(unique=True, index=True)
     title: str
     text: str = ""
     pdf_path: str = ""              # /static/pdfs/...
@@ -146,26 +235,621 @@ class UserRole(str, Enum):
 
 class BotUser(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    tg_id: int = Field(index=True)  # unique-like (validated)
+    tg_id: int = Field(unique=True, index=True)
     username: Optional[str] = ""
     full_name: Optional[str] = ""
     role: UserRole = Field(default=UserRole.user)
     is_blocked: bool = False
     notes: Optional[str] = ""
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # broadcast paytida Telegram doimiy xato qaytargan (botni bloklagan / akkaunt o'chirilgan)
+    unreachable: bool = False
+    unreachable_at: Optional[datetime] = None
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    paused = "paused"
+    done = "done"
+    cancelled = "cancelled"
+
+
+class RecipientStatus(str, Enum):
+    pending = "pending"
+    sent = "sent"
+    failed = "failed"            # vaqtinchalik yoki so'rov xatosi
+    blocked = "blocked"          # foydalanuvchi botni bloklagan
+    unreachable = "unreachable"  # chat topilmadi / akkaunt o'chirilgan
+
+
+class BroadcastJob(SQLModel, table=True):
+    """Navbatdagi broadcast: broadcast_worker.py jarayoni yuboradi."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = ""                         # text | audio | video | photo | document | mixed | copy
+    payload: str = "[]"                    # JSON: jobs ro'yxati (broadcast.build_payload formati)
+    disable_notification: bool = False
+    status: JobStatus = Field(default=JobStatus.queued, index=True)
+    total: int = 0                         # targets_ready bo'lguncha — taxminiy
+    target_filter: str = "{}"              # JSON: target_query() filtri
+    cursor: int = 0                        # ledger'ga qo'shilgan oxirgi BotUser.id
+    targets_ready: bool = False            # barcha qabul qiluvchilar ledger'da
+    not_before: Optional[datetime] = None  # UTC; shu vaqtgacha worker job'ni olmaydi
+    max_rate: Optional[float] = None       # msg/s; umumiy BROADCAST_RATE'dan past bo'lsa
+    quiet_hours: Optional[str] = None      # "23:00-08:00" (BROADCAST_TZ); yo'q bo'lsa BROADCAST_QUIET_HOURS
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class BroadcastRecipient(SQLModel, table=True):
+    """Per-recipient ledger: worker har bir yuborishni shu yerda tasdiqlaydi (ack)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    job_id: int = Field(foreign_key="broadcastjob.id", index=True)
+    chat_id: int
+    status: RecipientStatus = Field(default=RecipientStatus.pending)
+    error: str = ""
+    updated_at: Optional[datetime] = None
+
+
+class ContentVersion(SQLModel, table=True):
+    """Eksport kolleksiyasining versiyasi: tegishli jadvalga yozilgan har bir commit'da +1."""
+    collection: str = Field(primary_key=True)   # diagnostika | hayvon | hayvonq | darslik
+    version: int = 0
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class ContentChange(SQLModel, table=True):
+    """/export/changes uchun o'zgarishlar jurnali (oxirgi EXPORT_CHANGES_KEEP tasi saqlanadi)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    collection: str
+    version: int
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class MediaFileId(SQLModel, table=True):
+    """Telegram'ga bir marta yuklangan media: /static/... yo'li (yoki tashqi URL) -> file_id."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    cache_key: str
+    kind: str                              # photo | video | audio | voice | document
+    file_id: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 # ===================== DB =====================
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=False)
+def sqlite_pragmas(profile: str = ADMIN_SQLITE_PROFILE, overrides: str = ADMIN_SQLITE_PRAGMAS) -> Dict[str, Any]:
+    if profile not in SQLITE_PROFILES:
+        raise RuntimeError(f"ADMIN_SQLITE_PROFILE={profile!r}: {', '.join(SQLITE_PROFILES)} dan biri bo'lishi kerak")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for part in overrides.replace(",", ";").split(";"):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition("=")
+        if not sep or not name.strip().isidentifier():
+            raise RuntimeError(f"ADMIN_SQLITE_PRAGMAS: noto'g'ri qism {part!r} (kutilgan: name=value)")
+        pragmas[name.strip().lower()] = value.strip()
+    return pragmas
+
+
+def upload_limits(overrides: str = ADMIN_UPLOAD_LIMITS) -> Dict[str, int]:
+    """Tur -> eng katta hajm (bayt)."""
+    limits = dict(UPLOAD_LIMITS_MB)
+    for part in overrides.replace(",", ";").split(";"):
+        if not part.strip():
+            continue
+        kind, sep, value = part.partition("=")
+        kind = kind.strip().lower()
+        if not sep or kind not in limits or not value.strip().isdigit():
+            raise RuntimeError(
+                f"ADMIN_UPLOAD_LIMITS: noto'g'ri qism {part!r} (kutilgan: {'|'.join(limits)}=<MiB>)"
+            )
+        limits[kind] = int(value)
+    return {kind: mb * 1024 * 1024 for kind, mb in limits.items()}
+
+
+UPLOAD_LIMITS = upload_limits()
+
+
+def _install_pragmas(eng: Engine, pragmas: Dict[str, Any]) -> None:
+    @event.listens_for(eng, "connect")
+    def _apply_pragmas(dbapi_conn, _record) -> None:
+        cur = dbapi_conn.cursor()
+        try:
+            # busy_timeout birinchi: journal_mode=WAL o'tishi ham qulf so'raydi
+            for name in sorted(pragmas, key=lambda n: n != "busy_timeout"):
+                cur.execute(f"PRAGMA {name}={pragmas[name]}")
+        finally:
+            cur.close()
+
+
+def make_engine(
+    path: Path = DB_PATH,
+    profile: str = ADMIN_SQLITE_PROFILE,
+    overrides: str = ADMIN_SQLITE_PRAGMAS,
+) -> Engine:
+    pragmas = sqlite_pragmas(profile, overrides)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    eng = create_engine(
+        f"sqlite:///{path}",
+        echo=False,
+        # ulanish threadpool'ning turli thread'larida olinadi/qaytariladi;
+        # pool bitta ulanishni bir vaqtda faqat bitta thread'ga beradi
+        connect_args={"check_same_thread": False},
+        pool_size=ADMIN_DB_POOL_SIZE,
+        max_overflow=ADMIN_DB_MAX_OVERFLOW,
+        pool_timeout=ADMIN_DB_POOL_TIMEOUT,
+    )
+    _install_pragmas(eng, pragmas)
+    return eng
+
+
+def make_async_engine(
+    path: Path = DB_PATH,
+    profile: str = ADMIN_SQLITE_PROFILE,
+    overrides: str = ADMIN_SQLITE_PRAGMAS,
+) -> AsyncEngine:
+    """
+    aiosqlite: so'rov event loop'ni bloklamaydi va Starlette threadpool'idan
+    (standart 40 ta slot) joy olmaydi. Issiq o'qish endpoint'lari shu engine'da.
+    """
+    pragmas = sqlite_pragmas(profile, overrides)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    eng = create_async_engine(
+        f"sqlite+aiosqlite:///{path}",
+        echo=False,
+        pool_size=ADMIN_DB_POOL_SIZE,
+        max_overflow=ADMIN_DB_MAX_OVERFLOW,
+        pool_timeout=ADMIN_DB_POOL_TIMEOUT,
+    )
+    _install_pragmas(eng.sync_engine, pragmas)
+    return eng
+
+
+engine = make_engine()
+async_engine = make_async_engine()
+
+
+# ===================== Migrations =====================
+# Mavjud data/app.db fayllarini joriy sxemaga olib keladi. Har bir versiya bir marta,
+# tartib bilan, alohida BEGIN IMMEDIATE tranzaksiyada bajariladi va schema_migrations'ga
+# yoziladi (admin_app va broadcast_worker bir vaqtda ishga tushsa ham). Yangi bazada
+# create_all jadvallarni allaqachon yaratgan — qadamlar idempotent bo'lishi kerak.
+# Sxema o'zgarsa: ro'yxat oxiriga yangi versiya qo'shing, eskilarini tahrirlamang.
+
+def _m1_added_columns(db: sqlite3.Connection) -> None:
+    """create_all mavjud jadvalga yangi ustun qo'shmaydi."""
+    added = {
+        "botuser": [
+            ("unreachable", "BOOLEAN NOT NULL DEFAULT 0"),
+            ("unreachable_at", "DATETIME"),
+        ],
+        "broadcastjob": [
+            ("target_filter", "VARCHAR NOT NULL DEFAULT '{}'"),
+            ("cursor", "INTEGER NOT NULL DEFAULT 0"),
+            # eski job'larning ledger'i yaratilganda to'liq yozilgan
+            ("targets_ready", "BOOLEAN NOT NULL DEFAULT 1"),
+            ("not_before", "DATETIME"),
+            ("max_rate", "FLOAT"),
+            ("quiet_hours", "VARCHAR"),
+        ],
+    }
+    for table, columns in added.items():
+        existing = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+        for name, ddl in columns:
+            if name not in existing:
+                db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+def _m2_broadcast_indexes(db: sqlite3.Connection) -> None:
+    # worker: "job bo'yicha hali yuborilmaganlar" — id tartibida
+    db.execute(
+        "CREATE INDEX IF NOT EXISTS ix_broadcastrecipient_job_status "
+        "ON broadcastrecipient (job_id, status, id)"
+    )
+    db.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_mediafileid_key_kind ON mediafileid (cache_key, kind)")
+
+
+def _m3_unique_keys(db: sqlite3.Connection) -> None:
+    """
+    Tekshiruv "avval SELECT, keyin INSERT" o'rniga constraint bilan. Eski bazadagi
+    dublikatlar yo'qotilmaydi: eng kichik id o'z kalitini saqlaydi, qolganlarining
+    matnli kaliti "<kalit>~dup<id>" ga o'zgaradi; BotUser dublikatlari (tg_id — son)
+    botuser_duplicate jadvaliga ko'chiriladi.
+    """
+    unique = [
+        # (jadval, indeks, ustunlar, qayta nomlanadigan ustun)
+        ("hayvonitem", "ix_hayvonitem_key", ("key",), "key"),
+        ("hayvonquestion", "ix_hayvonquestion_key", ("key",), "key"),
+        ("hayvonoption", "ux_hayvonoption_question_opt", ("question_id", "opt_key"), "opt_key"),
+        ("darslik", "ix_darslik_code", ("code",), "code"),
+        ("botuser", "ix_botuser_tg_id", ("tg_id",), None),
+    ]
+    for table, index, columns, rename in unique:
+        is_unique = {row[1]: row[2] for row in db.execute(f"PRAGMA index_list({table})")}
+        if is_unique.get(index):
+            continue
+        db.execute(f"DROP INDEX IF EXISTS {index}")   # eski Field(index=True) — unique emas
+        cols = ", ".join(f'"{c}"' for c in columns)
+        dup_ids = f"SELECT id FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {cols})"
+        if rename:
+            n = db.execute(f"UPDATE {table} SET \"{rename}\" = \"{rename}\" || '~dup' || id WHERE id IN ({dup_ids})").rowcount
+        else:
+            db.execute(f"CREATE TABLE IF NOT EXISTS {table}_duplicate AS SELECT * FROM {table} WHERE 0")
+            db.execute(f"INSERT INTO {table}_duplicate SELECT * FROM {table} WHERE id IN ({dup_ids})")
+            n = db.execute(f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table}_duplicate)").rowcount
+        if n:
+            log.warning("Migration: %d duplicate row(s) in %s(%s) resolved", n, table, cols)
+        db.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({cols})")
+
+
+def _m4_query_indexes(db: sqlite3.Connection) -> None:
+    """Endpoint'larning where/order_by'iga mos indekslar."""
+    for ddl in (
+        # /export/diagnostika: enabled, ORDER BY sort_order
+        "ix_diagnostikaitem_enabled_sort ON diagnostikaitem (enabled, sort_order)",
+        # /hayvon, /export/hayvon, /hayvonq, /export/hayvonq: [enabled], [group], ORDER BY group, sort_order
+        'ix_hayvonitem_group_sort ON hayvonitem ("group", sort_order)',
+        'ix_hayvonitem_enabled_group_sort ON hayvonitem (enabled, "group", sort_order)',
+        'ix_hayvonquestion_group_sort ON hayvonquestion ("group", sort_order)',
+        'ix_hayvonquestion_enabled_group_sort ON hayvonquestion (enabled, "group", sort_order)',
+        # /hayvonq/{qid}/options, kaskad o'chirish: question_id, ORDER BY sort_order
+        "ix_hayvonoption_question_sort ON hayvonoption (question_id, sort_order)",
+        # /darslik, /users: ORDER BY created_at DESC; /users?role=
+        "ix_darslik_created_at ON darslik (created_at)",
+        "ix_botuser_created_at ON botuser (created_at)",
+        "ix_botuser_role_created_at ON botuser (role, created_at)",
+    ):
+        db.execute(f"CREATE INDEX IF NOT EXISTS {ddl}")
+
+
+def _m5_pagination_indexes(db: sqlite3.Connection) -> None:
+    """Keyset sahifalash: (kalit, id) tartibi filtrsiz ham indeksdan o'qilsin."""
+    # /diagnostika: ORDER BY sort_order, id (rowid indeksning oxirida bor)
+    db.execute("CREATE INDEX IF NOT EXISTS ix_diagnostikaitem_sort ON diagnostikaitem (sort_order)")
+
+
+# unicode61: katta-kichik harf va diakritika farqsiz (Ç = c); ʻ/ʼ (Unicode'da "harf") — ajratuvchi,
+# shunda "gʻ", "g‘", "g'" bir xil bo'linadi
+FTS_TOKENIZE = "unicode61 remove_diacritics 2 separators 'ʻʼ'"
+
+
+def _create_fts_index(db: sqlite3.Connection, table: str, columns: Sequence[str], weights: str) -> None:
+    """
+    <jadval>_fts — FTS5 external content: matn faqat asosiy jadvalda, indeks trigger'lar bilan
+    sinxron. prefix='2 3' — 2-3 harfli prefiks so'rovlari ham tayyor indeksdan o'qiladi.
+    """
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    db.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', tokenize=\"{FTS_TOKENIZE}\", prefix='2 3')"
+    )
+    db.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    db.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"
+    )
+    db.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"
+    )
+    db.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    db.execute(f"INSERT INTO {fts}({fts}, rank) VALUES ('rank', '{weights}')")
+
+
+def _drop_fts_index(db: sqlite3.Connection, table: str) -> None:
+    fts = f"{table}_fts"
+    for suffix in ("ai", "ad", "au"):
+        db.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+    db.execute(f"DROP TABLE IF EXISTS {fts}")
+
+
+def _m6_search_index(db: sqlite3.Connection) -> None:
+    _create_fts_index(db, "botuser", ("username", "full_name"), "bm25(2.0, 1.0)")
+    _create_fts_index(db, "darslik", ("code", "title"), "bm25(3.0, 1.0)")
+
+
+def _m7_darslik_text_search(db: sqlite3.Connection) -> None:
+    """Darslik matni ham qidiriladi (/darslik/search snippet'lari shu ustundan)."""
+    _drop_fts_index(db, "darslik")
+    _create_fts_index(db, "darslik", ("code", "title", "text"), "bm25(5.0, 3.0, 1.0)")
+
+
+MIGRATIONS = [
+    (1, _m1_added_columns),
+    (2, _m2_broadcast_indexes),
+    (3, _m3_unique_keys),
+    (4, _m4_query_indexes),
+    (5, _m5_pagination_indexes),
+    (6, _m6_search_index),
+    (7, _m7_darslik_text_search),
+]
+
+
+def run_migrations(path: str) -> List[int]:
+    applied: List[int] = []
+    db = sqlite3.connect(path, isolation_level=None, timeout=30)
+    try:
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+        )
+        for version, step in MIGRATIONS:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,)).fetchone():
+                    db.execute("ROLLBACK")
+                    continue
+                step(db)
+                db.execute(
+                    "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                    (version, step.__name__.lstrip("_"), datetime.utcnow().isoformat(" ")),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            applied.append(version)
+            log.info("Migration %d applied: %s", version, step.__name__)
+    finally:
+        db.close()
+    return applied
 
 
 def init_db():
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine.url.database)
 
 
 # ===================== App =====================
 app = FastAPI(title="Bot Admin API", version="1.4.0")
 
+
+@app.exception_handler(IntegrityError)
+async def integrity_error_handler(request: Request, exc: IntegrityError):
+    """UNIQUE constraint buzilsa — 409 ("<ustun> already exists")."""
+    msg = str(exc.orig)
+    if "UNIQUE constraint failed:" in msg:
+        column = msg.rsplit(".", 1)[-1].strip()
+        return JSONResponse(status_code=409, content={"detail": f"{column} already exists"})
+    return JSONResponse(status_code=409, content={"detail": "constraint violation"})
+
+
+# ===================== Fast JSON =====================
+# O'qish endpoint'lari tayyor Response qaytaradi: FastAPI response_model bo'yicha qayta
+# validatsiya/serializatsiya qilmaydi (response_model faqat OpenAPI hujjati uchun qoladi).
+def _json_default(o: Any) -> Any:
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, Enum):
+        return o.value
+    if isinstance(o, SQLModel):
+        return o.model_dump()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """FastAPI JSONResponse bilan bir xil baytlar: UTF-8, bo'shliqsiz."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode()
+
+
+def accepts_gzip(request: Request) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def gzip_body(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=ADMIN_GZIP_LEVEL, mtime=0)
+
+
+def fast_json(
+    request: Request,
+    data: Any = None,
+    *,
+    body: Optional[bytes] = None,
+    gzipped: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """data (yoki tayyor body/gzipped baytlar) -> application/json, kerak bo'lsa gzip."""
+    if body is None:
+        body = dumps(data)
+    headers = dict(headers or {})
+    if len(body) >= ADMIN_GZIP_MIN_SIZE:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_gzip(request):
+            headers["Content-Encoding"] = "gzip"
+            body = gzipped if gzipped is not None else gzip_body(body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def fetch_rows(q) -> List[Dict[str, Any]]:
+    """ORM obyektlarisiz: ustunlar to'g'ridan-to'g'ri dict bo'lib keladi."""
+    async with async_engine.connect() as conn:
+        return [dict(row) for row in (await conn.execute(q)).mappings()]
+
+
+# ===================== Pagination =====================
+# Keyset: sahifa OFFSET bilan emas, oldingi sahifaning oxirgi qatori kalitidan davom etadi —
+# indeks bo'yicha tartibda, jadval qancha o'smasin, har sahifa bir xil arzon.
+# Kalit oxirida har doim id bor: created_at/sort_order teng qatorlar ham aniq tartibda.
+# Cursor'da kalitlar bazadagi ko'rinishida (datetime — matn) saqlanadi: taqqoslash ORDER BY
+# bilan aynan bir xil bo'ladi (mikrosekundsiz yozilgan eski qatorlar ham tushib qolmaydi).
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(dumps(list(values))).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise HTTPException(400, detail="invalid cursor")
+    if (
+        not isinstance(values, list)
+        or len(values) != size
+        or not all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in values)
+    ):
+        raise HTTPException(400, detail="invalid cursor")
+    return values
+
+
+def parse_fields(model, fields: Optional[str]) -> List[str]:
+    """?fields=id,username -> ustunlar ro'yxati (bo'sh — hammasi)."""
+    columns = list(model.__table__.columns.keys())
+    if not fields:
+        return columns
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in columns]
+    if unknown:
+        raise HTTPException(400, detail=f"unknown field(s): {', '.join(unknown)}")
+    return wanted
+
+
+async def list_page(
+    request: Request,
+    model,
+    order: Sequence[str],
+    *,
+    where: Sequence[Any] = (),
+    desc: bool = False,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+) -> Response:
+    """
+    Bitta sahifa: JSON massiv (avvalgidek); davomi bo'lsa X-Next-Cursor va Link: rel="next".
+    limit ham cursor ham berilmasa — sahifalashsiz, hamma qatorlar (sahifalash ixtiyoriy).
+    order — indeksga mos kalit ustunlari (id avtomatik qo'shiladi), desc — hammasi kamayish tartibida.
+    """
+    table = model.__table__
+    keys = [table.c[name] for name in (*order, "id")]
+    wanted = parse_fields(model, fields)
+    paged = limit is not None or bool(cursor)
+    raw_keys = [type_coerce(k, String).label(f"_cursor{i}") for i, k in enumerate(keys)] if paged else []
+    limit = max(1, min(ADMIN_PAGE_SIZE if limit is None else limit, ADMIN_PAGE_MAX))
+
+    q = select(*[table.c[name] for name in wanted], *raw_keys).where(*where)
+    if cursor:
+        left, right = tuple_(*keys), tuple_(*[literal(v) for v in decode_cursor(cursor, len(keys))])
+        q = q.where(left < right if desc else left > right)
+    q = q.order_by(*[k.desc() if desc else k for k in keys])
+    if paged:
+        q = q.limit(limit + 1)
+    rows = await fetch_rows(q)
+
+    headers: Dict[str, str] = {}
+    if paged and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][k.name] for k in raw_keys])
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    rows = [{name: row[name] for name in wanted} for row in rows]
+    return fast_json(request, rows, headers=headers)
+
+
+# ===================== Search (FTS5) =====================
+# So'rovdagi har bir so'z — prefiks ibora, hammasi bo'lishi shart: "ali val" -> "ali"* "val"*.
+# So'z ichidagi belgilar (o'zb, ali_va) FTS tokenizer'ida xuddi indeksdagidek bo'linadi.
+def fts_match(text: str) -> Optional[str]:
+    words = [w for w in text.split() if any(ch.isalnum() for ch in w)]
+    if not words:
+        return None
+    return " ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+async def fts_search(
+    model,
+    text: str,
+    *,
+    where: Sequence[Any] = (),
+    fields: Optional[str] = None,
+    limit: int = 20,
+    snippet: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    bm25 bo'yicha tartiblangan qatorlar (eng mosi birinchi). snippet=True — har qatorga
+    "snippet": eng mos ustundan parcha (HTML: topilgan so'zlar <b>…</b>, qolgani escape qilingan).
+    """
+    match = fts_match(text)
+    if match is None:
+        return []
+    fts = f"{model.__tablename__}_fts"
+    table = model.__table__
+    fts_table = sa_table(fts, sa_column("rowid", Integer), sa_column("rank", Float))
+    limit = max(1, min(limit, ADMIN_PAGE_MAX))
+    # bm25 barcha mosliklar bo'yicha, LIMIT — tartiblashdan keyin (FTS5 ORDER BY rank ... LIMIT).
+    # where (role/enabled) shu so'rovning o'zida: filtrga mos eng yaxshi qatorlar tushib qolmaydi
+    hits = select(fts_table.c.rowid, fts_table.c.rank).where(sa_text(f"{fts} MATCH :match").bindparams(match=match))
+    if where:
+        hits = hits.join_from(fts_table, table, table.c.id == fts_table.c.rowid).where(*where)
+    hits = hits.order_by(fts_table.c.rank, fts_table.c.rowid.desc()).limit(limit).subquery("hits")
+    wanted = parse_fields(model, fields)
+    q = (
+        select(*[table.c[name] for name in wanted], table.c.id.label("_hit"))
+        .join_from(table, hits, table.c.id == hits.c.rowid)
+        .order_by(hits.c.rank, table.c.id.desc())
+    )
+    rows = await fetch_rows(q)
+    snippets = await _fts_snippets(fts, match, [row["_hit"] for row in rows]) if snippet else {}
+    return [
+        {**{name: row[name] for name in wanted}, **({"snippet": snippets.get(row["_hit"], "")} if snippet else {})}
+        for row in rows
+    ]
+
+
+async def _fts_snippets(fts: str, match: str, ids: Sequence[int], tokens: int = 16) -> Dict[int, str]:
+    # snippet() faqat MATCH so'rovi ichida ishlaydi: barcha mosliklar emas, faqat natija qatorlari uchun
+    if not ids:
+        return {}
+    q = sa_text(
+        f"SELECT rowid, snippet({fts}, -1, char(2), char(3), '…', :tokens) FROM {fts} "
+        f"WHERE {fts} MATCH :match AND rowid IN :ids"
+    ).bindparams(bindparam("ids", list(ids), expanding=True), match=match, tokens=tokens)
+    async with async_engine.connect() as conn:
+        rows = (await conn.execute(q)).all()
+    return {
+        rowid: html.escape(text or "", quote=False).replace("\x02", "<b>").replace("\x03", "</b>")
+        for rowid, text in rows
+    }
+
+# Upload hajmi: CORS ichida — 413 javobi ham CORS header'lari bilan chiqadi
+class UploadSizeGuard:
+    """Content-Length chegaradan katta bo'lsa — body o'qilmasdan (diskka yozilmasdan) 413."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith("/upload/"):
+            limit = UPLOAD_LIMITS.get(scope["path"][len("/upload/"):])
+            length = dict(scope["headers"]).get(b"content-length", b"")
+            if limit is not None and length.isdigit() and int(length) > limit + UPLOAD_MULTIPART_SLACK:
+                response = JSONResponse(status_code=413, content={"detail": f"file too large (max {limit} bytes)"})
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(UploadSizeGuard)
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -173,6 +857,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Link", "ETag"],
 )
 
 # Static
@@ -194,6 +879,12 @@ def on_start():
             s.commit()
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    await change_feed.stop()
+    await async_engine.dispose()
+
+
 # Swagger apiKey
 def custom_openapi():
     if app.openapi_schema:
@@ -217,70 +908,118 @@ def custom_openapi():
 app.openapi = custom_openapi
 
 # ===================== Uploads =====================
+# Starlette multipart faylni o'zi vaqtinchalik faylga (1 MiB'dan keyin diskka) yozadi; bu yerda
+# u UPLOAD_CHUNK_SIZE bo'laklarda static papkadagi ".part" faylga ko'chiriladi — yozish va sha256
+# threadpool'da, event loop bloklanmaydi. Hajm chegarasidan oshsa — 413, qisman fayl o'chiriladi.
+# Nom atomik egallanadi (os.link — mavjud bo'lsa xato): parallel yuklashlar bir-birini bosmaydi
+# va /static'da chala fayl ko'rinmaydi.
+UPLOAD_KINDS: Dict[str, Tuple[Path, str, str]] = {
+    # tur: (papka, /static/<url>, nom berilmasa)
+    "image": (IMG_DIR, "images", "image.bin"),
+    "audio": (AUD_DIR, "audios", "audio.bin"),
+    "pdf": (PDF_DIR, "pdfs", "doc.pdf"),
+    "video": (VID_DIR, "videos", "video.bin"),
+}
+
+
+def _write_chunk(out, digest, chunk: bytes) -> None:
+    digest.update(chunk)
+    out.write(chunk)
+
+
+def _finish_part(out) -> None:
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+
+
+def _claim_name(folder: Path, fname: str, part: Path) -> Path:
+    """part faylni folder/fname (band bo'lsa fname_1, fname_2, ...) nomiga atomik joylaydi."""
+    stem, suf = Path(fname).stem, Path(fname).suffix
+    i = 0
+    while True:
+        dest = folder / (fname if i == 0 else f"{stem}_{i}{suf}")
+        try:
+            os.link(part, dest)
+        except FileExistsError:
+            i += 1
+            continue
+        except OSError:
+            # hardlink yo'q FS: nomni O_EXCL bilan band qilib, ustidan rename
+            try:
+                os.close(os.open(dest, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                i += 1
+                continue
+            os.replace(part, dest)
+            return dest
+        os.unlink(part)
+        return dest
+
+
+async def save_upload(file: UploadFile, kind: str) -> Dict[str, Any]:
+    folder, url_dir, default_name = UPLOAD_KINDS[kind]
+    limit = UPLOAD_LIMITS[kind]
+    fname = Path(file.filename or "").name   # "../x" -> "x"
+    if fname in ("", ".", ".."):
+        fname = default_name
+    part = folder / f".{fname}.{os.urandom(6).hex()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    out = await asyncio.to_thread(open, part, "xb")
+    try:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > limit:
+                    raise HTTPException(413, detail=f"file too large (max {limit} bytes)")
+                await asyncio.to_thread(_write_chunk, out, digest, chunk)
+        finally:
+            await asyncio.to_thread(_finish_part, out)
+        dest = await asyncio.to_thread(_claim_name, folder, fname, part)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    finally:
+        await file.close()
+    return {"url": f"/static/{url_dir}/{dest.name}", "path": str(dest), "size": size, "sha256": digest.hexdigest()}
+
+
 @app.post("/upload/image", dependencies=[Depends(require_api_key)])
-def upload_image(file: UploadFile = File(...)):
-    fname = file.filename or "image.bin"
-    dest = IMG_DIR / fname
-    i = 1
-    while dest.exists():
-        stem, suf = Path(fname).stem, Path(fname).suffix
-        dest = IMG_DIR / f"{stem}_{i}{suf}"
-        i += 1
-    with dest.open("wb") as f:
-        f.write(file.file.read())
-    return {"url": f"/static/images/{dest.name}", "path": str(dest)}
+async def upload_image(file: UploadFile = File(...)):
+    return await save_upload(file, "image")
 
 
 @app.post("/upload/audio", dependencies=[Depends(require_api_key)])
-def upload_audio(file: UploadFile = File(...)):
-    fname = file.filename or "audio.bin"
-    dest = AUD_DIR / fname
-    i = 1
-    while dest.exists():
-        stem, suf = Path(fname).stem, Path(fname).suffix
-        dest = AUD_DIR / f"{stem}_{i}{suf}"
-        i += 1
-    with dest.open("wb") as f:
-        f.write(file.file.read())
-    return {"url": f"/static/audios/{dest.name}", "path": str(dest)}
+async def upload_audio(file: UploadFile = File(...)):
+    return await save_upload(file, "audio")
 
 
 @app.post("/upload/pdf", dependencies=[Depends(require_api_key)])
-def upload_pdf(file: UploadFile = File(...)):
-    fname = file.filename or "doc.pdf"
-    dest = PDF_DIR / fname
-    i = 1
-    while dest.exists():
-        stem, suf = Path(fname).stem, Path(fname).suffix
-        dest = PDF_DIR / f"{stem}_{i}{suf}"
-        i += 1
-    with dest.open("wb") as f:
-        f.write(file.file.read())
-    return {"url": f"/static/pdfs/{dest.name}", "path": str(dest)}
+async def upload_pdf(file: UploadFile = File(...)):
+    return await save_upload(file, "pdf")
 
 
 @app.post("/upload/video", dependencies=[Depends(require_api_key)])
-def upload_video(file: UploadFile = File(...)):
-    fname = file.filename or "video.bin"
-    dest = VID_DIR / fname
-    i = 1
-    while dest.exists():
-        stem, suf = Path(fname).stem, Path(fname).suffix
-        dest = VID_DIR / f"{stem}_{i}{suf}"
-        i += 1
-    with dest.open("wb") as f:
-        f.write(file.file.read())
-    return {"url": f"/static/videos/{dest.name}", "path": str(dest)}
+async def upload_video(file: UploadFile = File(...)):
+    return await save_upload(file, "video")
 
 
 # ===================== Diagnostika CRUD =====================
 @app.get("/diagnostika", response_model=List[DiagnostikaItem])
-def list_diag(enabled: Optional[bool] = None):
-    with Session(engine) as s:
-        query = select(DiagnostikaItem).order_by(DiagnostikaItem.sort_order)
-        if enabled is not None:
-            query = query.where(DiagnostikaItem.enabled == enabled)
-        return s.exec(query).all()
+async def list_diag(
+    request: Request,
+    enabled: Optional[bool] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    where = []
+    if enabled is not None:
+        where.append(DiagnostikaItem.enabled == enabled)
+    return await list_page(
+        request, DiagnostikaItem, ["sort_order"], where=where, fields=fields, cursor=cursor, limit=limit
+    )
 
 
 @app.post("/diagnostika", response_model=DiagnostikaItem, dependencies=[Depends(require_api_key)])
@@ -319,22 +1058,27 @@ def delete_diag(item_id: int):
 
 # ===================== Hayvon_top CRUD =====================
 @app.get("/hayvon", response_model=List[HayvonItem])
-def list_hayvon(enabled: Optional[bool] = None, group: Optional[HayGroup] = None):
-    with Session(engine) as s:
-        query = select(HayvonItem).order_by(HayvonItem.group, HayvonItem.sort_order)
-        if enabled is not None:
-            query = query.where(HayvonItem.enabled == enabled)
-        if group is not None:
-            query = query.where(HayvonItem.group == group)
-        return s.exec(query).all()
+async def list_hayvon(
+    request: Request,
+    enabled: Optional[bool] = None,
+    group: Optional[HayGroup] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    where = []
+    if enabled is not None:
+        where.append(HayvonItem.enabled == enabled)
+    if group is not None:
+        where.append(HayvonItem.group == group)
+    return await list_page(
+        request, HayvonItem, ["group", "sort_order"], where=where, fields=fields, cursor=cursor, limit=limit
+    )
 
 
 @app.post("/hayvon", response_model=HayvonItem, dependencies=[Depends(require_api_key)])
 def create_hayvon(item: HayvonItem):
     with Session(engine) as s:
-        exists = s.exec(select(HayvonItem).where(HayvonItem.key == item.key)).first()
-        if exists:
-            raise HTTPException(409, detail="key already exists")
         s.add(item)
         s.commit()
         s.refresh(item)
@@ -347,10 +1091,6 @@ def update_hayvon(item_id: int, data: HayvonItem):
         obj = s.get(HayvonItem, item_id)
         if not obj:
             raise HTTPException(404)
-        if data.key != obj.key:
-            dupe = s.exec(select(HayvonItem).where(HayvonItem.key == data.key)).first()
-            if dupe:
-                raise HTTPException(409, detail="key already exists")
         for f in ["key", "title", "group", "image_path", "audio_path", "enabled", "sort_order"]:
             setattr(obj, f, getattr(data, f))
         s.add(obj)
@@ -372,28 +1112,51 @@ def delete_hayvon(item_id: int):
 
 # ===================== Darslik CRUD & Export =====================
 @app.get("/darslik", response_model=List[Darslik])
-def list_darslik(
+async def list_darslik(
+    request: Request,
     code: Optional[str] = None,
     title: Optional[str] = None,
     enabled: Optional[bool] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
 ):
-    with Session(engine) as s:
-        q = select(Darslik).order_by(Darslik.created_at.desc())
-        if enabled is not None:
-            q = q.where(Darslik.enabled == enabled)
-        if code:
-            q = q.where(Darslik.code.contains(code))
-        if title:
-            q = q.where(Darslik.title.contains(title))
-        return s.exec(q).all()
+    where = []
+    if enabled is not None:
+        where.append(Darslik.enabled == enabled)
+    if code:
+        where.append(Darslik.code.contains(code))
+    if title:
+        where.append(Darslik.title.contains(title))
+    return await list_page(
+        request, Darslik, ["created_at"], where=where, desc=True, fields=fields, cursor=cursor, limit=limit
+    )
+
+
+@app.get("/darslik/search", response_model=List[Darslik])
+async def search_darslik(
+    request: Request,
+    q: str,
+    enabled: Optional[bool] = None,
+    fields: Optional[str] = None,
+    limit: int = 20,
+):
+    """
+    code/title/text bo'yicha: so'z boshi (prefiks) mosligi, bm25 bo'yicha tartiblangan; har qatorda
+    "snippet" (HTML). Natija katalog versiyasi bilan keshlanadi: darslik o'zgarmaguncha qayta
+    qidirilmaydi, If-None-Match (ETag) -> 304.
+    """
+    where = [] if enabled is None else [Darslik.enabled == enabled]
+    params = ("search", " ".join(q.lower().split()), enabled, fields, limit)
+    return await _snapshot_response(
+        request, "darslik", params,
+        lambda: fts_search(Darslik, q, where=where, fields=fields, limit=limit, snippet=True),
+    )
 
 
 @app.post("/darslik", response_model=Darslik, dependencies=[Depends(require_api_key)])
 def create_darslik(item: Darslik):
     with Session(engine) as s:
-        exists = s.exec(select(Darslik).where(Darslik.code == item.code)).first()
-        if exists:
-            raise HTTPException(409, detail="code already exists")
         s.add(item)
         s.commit()
         s.refresh(item)
@@ -406,10 +1169,6 @@ def update_darslik(item_id: int, data: Darslik):
         obj = s.get(Darslik, item_id)
         if not obj:
             raise HTTPException(404)
-        if data.code != obj.code:
-            dupe = s.exec(select(Darslik).where(Darslik.code == data.code)).first()
-            if dupe:
-                raise HTTPException(409, detail="code already exists")
         for f in ["code", "title", "text", "pdf_path", "enabled"]:
             setattr(obj, f, getattr(data, f))
         s.add(obj)
@@ -440,28 +1199,46 @@ def get_darslik_by_code(code: str):
 
 # ===================== Users CRUD, Upsert & Block =====================
 @app.get("/users", response_model=List[BotUser])
-def list_users(
+async def list_users(
+    request: Request,
     blocked: Optional[bool] = None,
     username: Optional[str] = None,
     role: Optional[UserRole] = None,
+    unreachable: Optional[bool] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
 ):
-    with Session(engine) as s:
-        q = select(BotUser).order_by(BotUser.created_at.desc())
-        if blocked is not None:
-            q = q.where(BotUser.is_blocked == blocked)
-        if username:
-            q = q.where(BotUser.username.contains(username))
-        if role is not None:
-            q = q.where(BotUser.role == role)
-        return s.exec(q).all()
+    where = []
+    if blocked is not None:
+        where.append(BotUser.is_blocked == blocked)
+    if unreachable is not None:
+        where.append(BotUser.unreachable == unreachable)
+    if username:
+        where.append(BotUser.username.contains(username))
+    if role is not None:
+        where.append(BotUser.role == role)
+    return await list_page(
+        request, BotUser, ["created_at"], where=where, desc=True, fields=fields, cursor=cursor, limit=limit
+    )
+
+
+@app.get("/users/search", response_model=List[BotUser])
+async def search_users(
+    request: Request,
+    q: str,
+    role: Optional[UserRole] = None,
+    fields: Optional[str] = None,
+    limit: int = 20,
+):
+    """username/full_name bo'yicha: so'z boshi (prefiks) mosligi, bm25 bo'yicha tartiblangan."""
+    where = [] if role is None else [BotUser.role == role]
+    return fast_json(request, await fts_search(BotUser, q, where=where, fields=fields, limit=limit))
 
 
 @app.post("/users", response_model=BotUser, dependencies=[Depends(require_api_key)])
 def create_user(item: BotUser):
     with Session(engine) as s:
-        exists = s.exec(select(BotUser).where(BotUser.tg_id == item.tg_id)).first()
-        if exists:
-            raise HTTPException(409, detail="tg_id already exists")
         s.add(item)
         s.commit()
         s.refresh(item)
@@ -474,10 +1251,6 @@ def update_user(user_id: int, data: BotUser):
         obj = s.get(BotUser, user_id)
         if not obj:
             raise HTTPException(404)
-        if data.tg_id != obj.tg_id:
-            dupe = s.exec(select(BotUser).where(BotUser.tg_id == data.tg_id)).first()
-            if dupe:
-                raise HTTPException(409, detail="tg_id already exists")
         for f in ["tg_id", "username", "full_name", "role", "is_blocked", "notes"]:
             setattr(obj, f, getattr(data, f))
         s.add(obj)
@@ -505,28 +1278,34 @@ def upsert_user(
     role: UserRole = Form(UserRole.user),
     notes: Optional[str] = Form(None),
 ):
+    # bitta INSERT ... ON CONFLICT(tg_id): bir vaqtdagi ikki /start poygasiz
+    table = BotUser.__table__
+    stmt = sqlite_insert(table).values(
+        tg_id=tg_id,
+        username=username or "",
+        full_name=full_name or "",
+        role=role,
+        notes=notes or "",
+        created_at=datetime.utcnow(),
+    )
+    keep = lambda c: func.coalesce(func.nullif(stmt.excluded[c], ""), table.c[c])  # noqa: E731
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.tg_id],
+        set_={
+            "username": keep("username"),
+            "full_name": keep("full_name"),
+            "role": stmt.excluded.role,
+            "notes": keep("notes"),
+            # bot bilan qayta gaplashdi (/start) — yana yetib boriladi
+            "unreachable": False,
+            "unreachable_at": None,
+        },
+    )
     with Session(engine) as s:
-        obj = s.exec(select(BotUser).where(BotUser.tg_id == tg_id)).first()
-        if obj:
-            obj.username = username or obj.username
-            obj.full_name = full_name or obj.full_name
-            obj.role = role or obj.role
-            obj.notes = notes or obj.notes
-            s.add(obj)
-            s.commit()
-            s.refresh(obj)
-            return obj
-        new_u = BotUser(
-            tg_id=tg_id,
-            username=username or "",
-            full_name=full_name or "",
-            role=role,
-            notes=notes or "",
-        )
-        s.add(new_u)
+        s.execute(stmt)
         s.commit()
-        s.refresh(new_u)
-        return new_u
+        invalidate_stats()
+        return s.exec(select(BotUser).where(BotUser.tg_id == tg_id)).one()
 
 
 @app.post("/users/{user_id}/block", response_model=BotUser, dependencies=[Depends(require_api_key)])
@@ -555,90 +1334,322 @@ def unblock_user(user_id: int):
         return obj
 
 
+# ===================== Export snapshots =====================
+# Har bir eksport (va uning parametrlari) uchun tayyor JSON baytlar xotirada saqlanadi.
+# ContentVersion bazada — yozuv bilan bitta tranzaksiyada oshadi, shuning uchun bir nechta
+# uvicorn worker ham o'zgarishni darhol ko'radi; snapshot versiya o'zgargandagina qayta quriladi.
+EXPORT_COLLECTIONS = {
+    DiagnostikaItem: "diagnostika",
+    HayvonItem: "hayvon",
+    HayvonQuestion: "hayvonq",
+    HayvonOption: "hayvonq",
+    Darslik: "darslik",
+}
+_snapshots: Dict[Tuple[Any, ...], Tuple[int, str, bytes, Optional[bytes]]] = {}
+SNAPSHOT_MAX_ENTRIES = 512      # /darslik/search kalitlari foydalanuvchi matnidan — cheklanadi
+_snapshot_build = asyncio.Lock()
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _bump_content_versions(session, _flush_context) -> None:
+    touched = {
+        EXPORT_COLLECTIONS[type(o)]
+        for o in (*session.new, *session.dirty, *session.deleted)
+        if type(o) in EXPORT_COLLECTIONS
+    }
+    bumped = session.info.setdefault("bumped_collections", set())
+    table = ContentVersion.__table__
+    for name in sorted(touched - bumped):
+        stmt = sqlite_insert(table).values(collection=name, version=1, updated_at=datetime.utcnow())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.collection],
+            set_={"version": table.c.version + 1, "updated_at": stmt.excluded.updated_at},
+        )
+        session.connection().execute(stmt)
+        session.connection().exec_driver_sql(
+            "INSERT INTO contentchange (collection, version, created_at) "
+            "SELECT collection, version, updated_at FROM contentversion WHERE collection = ?",
+            (name,),
+        )
+        bumped.add(name)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _notify_bumped(session) -> None:
+    if session.info.pop("bumped_collections", None):
+        change_feed.poke()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _reset_bumped(session) -> None:
+    session.info.pop("bumped_collections", None)
+
+
+async def last_change_id() -> int:
+    async with async_engine.connect() as conn:
+        return (await conn.execute(select(func.max(ContentChange.id)))).scalar() or 0
+
+
+class ChangeFeed:
+    """
+    /export/changes long-poll kutuvchilarini uyg'otadi. Shu jarayondagi commit'lar
+    poke() bilan darhol, boshqa jarayonlarniki (boshqa uvicorn worker) esa
+    EXPORT_CHANGES_POLL oralig'idagi MAX(id) tekshiruvi bilan bilinadi.
+    """
+
+    def __init__(self) -> None:
+        self.last_id = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed: Optional[asyncio.Condition] = None
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Future] = None
+
+    async def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task is None or self._task.done():
+            # await'siz: bir vaqtdagi birinchi so'rovlar bitta kuzatuvchi va bitta Condition oladi
+            self._loop = loop
+            self._changed = asyncio.Condition()
+            self._ready = loop.create_future()
+            self._task = loop.create_task(self._watch())
+        await asyncio.shield(self._ready)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._loop = self._task = None
+
+    def poke(self) -> None:
+        """Commit'dan keyin chaqiriladi (threadpool'dan ham)."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(lambda: loop.create_task(self._refresh()))
+
+    async def _refresh(self) -> None:
+        last = await last_change_id()
+        if last != self.last_id:
+            self.last_id = last
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def _watch(self) -> None:
+        try:
+            self.last_id = await last_change_id()
+        except Exception as e:  # noqa: BLE001
+            log.warning("Change feed start failed: %s", e)
+        finally:
+            if not self._ready.done():
+                self._ready.set_result(None)
+        ticks = 0
+        while True:
+            await asyncio.sleep(EXPORT_CHANGES_POLL)
+            try:
+                await self._refresh()
+                ticks += 1
+                if ticks % 120 == 0:
+                    async with async_engine.begin() as conn:
+                        await conn.exec_driver_sql(
+                            "DELETE FROM contentchange WHERE id <= (SELECT MAX(id) FROM contentchange) - ?",
+                            (EXPORT_CHANGES_KEEP,),
+                        )
+            except Exception as e:  # noqa: BLE001 — kuzatuvchi to'xtamasin
+                log.warning("Change feed refresh failed: %s", e)
+
+    async def wait(self, since: int, timeout: float) -> None:
+        await self._ensure_started()
+        if since > self.last_id:
+            await self._refresh()  # boshqa jarayon yozgan bo'lishi mumkin
+            if since > self.last_id:
+                return  # jurnaldan oldinda (baza almashgan / eski cursor): darhol reset=true
+        if self.last_id > since or timeout <= 0:
+            return
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self.last_id > since), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+change_feed = ChangeFeed()
+
+
+async def content_versions() -> Dict[str, int]:
+    versions = {name: 0 for name in sorted(set(EXPORT_COLLECTIONS.values()))}
+    async with async_engine.connect() as conn:
+        rows = await conn.execute(select(ContentVersion.collection, ContentVersion.version))
+        versions.update({name: version for name, version in rows})
+    return versions
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match — kuchsiz taqqoslash: W/ prefiksi e'tiborga olinmaydi
+    return etag in {t.strip().removeprefix("W/") for t in header.split(",")}
+
+
+async def _snapshot_response(request: Request, collection: str, params: Tuple[Any, ...], build) -> Response:
+    key = (collection, *params)
+    version = (await content_versions())[collection]
+    snap = _snapshots.get(key)
+    if snap is None or snap[0] != version:
+        async with _snapshot_build:  # yozuvdan keyingi birinchi so'rovlar bitta qurilishni kutadi
+            snap = _snapshots.get(key)
+            if snap is None or snap[0] != version:
+                # versiya qurishdan oldin o'qilgan: oraliqdagi yozuv keyingi so'rovda qayta quradi
+                body = dumps(await build())
+                gzipped = gzip_body(body) if len(body) >= ADMIN_GZIP_MIN_SIZE else None
+                snap = (version, f'"{hashlib.sha256(body).hexdigest()[:32]}"', body, gzipped)
+                _snapshots.pop(key, None)
+                _snapshots[key] = snap
+                while len(_snapshots) > SNAPSHOT_MAX_ENTRIES:
+                    _snapshots.pop(next(iter(_snapshots)))   # eng eski qurilgani
+    _, etag, body, gzipped = snap
+    if gzipped is not None and accepts_gzip(request):
+        etag = etag[:-1] + '-gz"'   # boshqa representation — boshqa kuchli ETag
+    headers = {"ETag": etag, "X-Content-Version": str(version), "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return fast_json(request, body=body, gzipped=gzipped, headers=headers)
+
+
+def _static_url(path: str, folder: str) -> str:
+    return path if path.startswith("/static/") else f"/static/{folder}/{Path(path).name}"
+
+
 # ===================== Exports for bot =====================
-@app.get("/export/diagnostika")
-def export_diag(enabled_only: bool = True):
-    with Session(engine) as s:
+async def _build_export_diag(enabled_only: bool) -> List[Dict[str, Any]]:
+    async with AsyncSession(async_engine) as s:
         q = select(DiagnostikaItem).order_by(DiagnostikaItem.sort_order)
         if enabled_only:
             q = q.where(DiagnostikaItem.enabled == True)
-        items = s.exec(q).all()
-    return [
-        {
-            "phrase": i.phrase,
-            "image_url": i.image_path if i.image_path.startswith("/static/") else f"/static/images/{Path(i.image_path).name}"
-        }
-        for i in items
-    ]
+        items = (await s.exec(q)).all()
+    return [{"phrase": i.phrase, "image_url": _static_url(i.image_path, "images")} for i in items]
 
 
-@app.get("/export/hayvon")
-def export_hayvon(enabled_only: bool = True, group: Optional[HayGroup] = None):
-    with Session(engine) as s:
+@app.get("/export/diagnostika")
+async def export_diag(request: Request, enabled_only: bool = True):
+    return await _snapshot_response(
+        request, "diagnostika", (enabled_only,), lambda: _build_export_diag(enabled_only)
+    )
+
+
+async def _build_export_hayvon(enabled_only: bool, group: Optional[HayGroup]) -> List[Dict[str, Any]]:
+    async with AsyncSession(async_engine) as s:
         q = select(HayvonItem).order_by(HayvonItem.group, HayvonItem.sort_order)
         if enabled_only:
             q = q.where(HayvonItem.enabled == True)
         if group is not None:
             q = q.where(HayvonItem.group == group)
-        items = s.exec(q).all()
+        items = (await s.exec(q)).all()
     return [
         {
             "key": i.key,
             "title": i.title,
             "group": i.group,
-            "image_url": i.image_path if i.image_path.startswith("/static/") else f"/static/images/{Path(i.image_path).name}",
-            "audio_url": i.audio_path if i.audio_path.startswith("/static/") else f"/static/audios/{Path(i.audio_path).name}",
+            "image_url": _static_url(i.image_path, "images"),
+            "audio_url": _static_url(i.audio_path, "audios"),
         }
         for i in items
     ]
-# ===================== Export for bot (Questions) =====================
-@app.get("/export/hayvonq")
-def export_hayvonq(enabled_only: bool = True, group: Optional[HayGroup] = None):
-    with Session(engine) as s:
-        q = select(HayvonQuestion).order_by(HayvonQuestion.group, HayvonQuestion.sort_order)
-        if enabled_only:
-            q = q.where(HayvonQuestion.enabled == True)
-        if group is not None:
-            q = q.where(HayvonQuestion.group == group)
-        questions = s.exec(q).all()
 
-        # oldini olish uchun bitta select bilan hammasini olib, keyin group qilamiz
-        all_opts = s.exec(select(HayvonOption)).all()
+
+@app.get("/export/hayvon")
+async def export_hayvon(request: Request, enabled_only: bool = True, group: Optional[HayGroup] = None):
+    return await _snapshot_response(
+        request, "hayvon", (enabled_only, group), lambda: _build_export_hayvon(enabled_only, group)
+    )
+
+
+# ===================== Export for bot (Questions) =====================
+async def _build_export_hayvonq(enabled_only: bool, group: Optional[HayGroup]) -> List[Dict[str, Any]]:
+    filters = []
+    if enabled_only:
+        filters.append(HayvonQuestion.enabled == True)
+    if group is not None:
+        filters.append(HayvonQuestion.group == group)
+    async with AsyncSession(async_engine) as s:
+        q = select(HayvonQuestion).where(*filters).order_by(HayvonQuestion.group, HayvonQuestion.sort_order)
+        questions = (await s.exec(q)).all()
+
+        # faqat tanlangan savollarning variantlari — bitta so'rovda, (question_id, sort_order) indeksi bo'yicha
+        opts_q = (
+            select(HayvonOption)
+            .where(col(HayvonOption.question_id).in_(select(HayvonQuestion.id).where(*filters)))
+            .order_by(HayvonOption.question_id, HayvonOption.sort_order)
+        )
         by_q: Dict[int, list[HayvonOption]] = {}
-        for o in all_opts:
+        for o in (await s.exec(opts_q)).all():
             by_q.setdefault(o.question_id, []).append(o)
 
     out = []
     for qu in questions:
-        opts = sorted(by_q.get(qu.id, []), key=lambda x: x.sort_order)
+        opts = by_q.get(qu.id, [])
         if not opts:
             # variantlar bo‘lmasa, eksport qilmaymiz
             continue
-
-        # yo‘llarni /static/... ga to‘g‘rilash
-        def fix_img(p: str) -> str:
-            return p if p.startswith("/static/") else f"/static/images/{Path(p).name}"
-        def fix_aud(p: str) -> str:
-            return p if p.startswith("/static/") else f"/static/audios/{Path(p).name}"
-
-        options = [{"opt_key": o.opt_key, "image_url": fix_img(o.image_path)} for o in opts]
-        correct_opt_key = next((o.opt_key for o in opts if o.is_correct), None)
-
         out.append({
             "key": qu.key,
             "title": qu.title,
             "group": qu.group,
-            "audio_url": fix_aud(qu.audio_path),
-            "options": options,
-            "correct_opt_key": correct_opt_key,
+            "audio_url": _static_url(qu.audio_path, "audios"),
+            "options": [{"opt_key": o.opt_key, "image_url": _static_url(o.image_path, "images")} for o in opts],
+            "correct_opt_key": next((o.opt_key for o in opts if o.is_correct), None),
         })
     return out
 
 
+@app.get("/export/hayvonq")
+async def export_hayvonq(request: Request, enabled_only: bool = True, group: Optional[HayGroup] = None):
+    return await _snapshot_response(
+        request, "hayvonq", (enabled_only, group), lambda: _build_export_hayvonq(enabled_only, group)
+    )
+
+
+@app.get("/export/version")
+async def export_version():
+    """Kolleksiyalar versiyasi; last_change — /export/changes?since= uchun boshlang'ich nuqta."""
+    return {"versions": await content_versions(), "last_change": await last_change_id()}
+
+
+@app.get("/export/changes")
+async def export_changes(since: int = 0, timeout: float = 25.0, limit: int = 500):
+    """
+    Long-poll: since'dan keyingi o'zgarish bo'lguncha (yoki timeout soniya) kutadi.
+    Javobdagi last_change keyingi so'rovning since qiymati. reset=true — jurnal
+    qisqartirilgan yoki baza almashgan: barcha eksportlarni qayta oling.
+    """
+    limit = max(1, min(limit, 1000))
+    await change_feed.wait(since, min(max(timeout, 0.0), EXPORT_LONGPOLL_MAX))
+    async with AsyncSession(async_engine) as s:
+        rows = (await s.exec(
+            select(ContentChange).where(ContentChange.id > since).order_by(ContentChange.id).limit(limit)
+        )).all()
+        oldest = (await s.exec(select(func.min(ContentChange.id)))).first()
+    last = await last_change_id()
+    reset = since > last or (since > 0 and oldest is not None and since < oldest - 1)
+    return {
+        "changes": [
+            {"id": r.id, "collection": r.collection, "version": r.version, "at": r.created_at.isoformat()}
+            for r in rows
+        ],
+        "last_change": rows[-1].id if rows else (last if reset else since),
+        "versions": await content_versions(),
+        "reset": reset,
+    }
+
+
 @app.get("/export/darslik/{code}")
-def export_darslik(code: str):
-    with Session(engine) as s:
-        obj = s.exec(select(Darslik).where(Darslik.code == code, Darslik.enabled == True)).first()
+async def export_darslik(code: str):
+    async with AsyncSession(async_engine) as s:
+        obj = (await s.exec(select(Darslik).where(Darslik.code == code, Darslik.enabled == True))).first()
         if not obj:
             raise HTTPException(404, detail="not found or disabled")
         pdf_url = obj.pdf_path if obj.pdf_path.startswith("/static/") else f"/static/pdfs/{Path(obj.pdf_path).name}"
@@ -646,40 +1657,91 @@ def export_darslik(code: str):
 
 
 # ===================== Statistics =====================
+# Kesh bitta jarayon ichida: boshqa uvicorn worker'lari yoki jarayonlarning yozuvlari
+# faqat ADMIN_STATS_TTL o'tgach ko'rinadi.
+_STATS_MODELS = (DiagnostikaItem, HayvonItem, Darslik, BotUser)
+_stats_lock = threading.Lock()
+_stats_cache: Dict[str, Any] = {"value": None, "expires": 0.0, "gen": 0}
+_stats_refresh = asyncio.Lock()
+
+
+def invalidate_stats() -> None:
+    with _stats_lock:
+        _stats_cache["gen"] += 1
+        _stats_cache["value"] = None
+
+
+@event.listens_for(OrmSession, "after_flush")
+def _stats_track_flush(session, _flush_context) -> None:
+    if any(isinstance(o, _STATS_MODELS) for o in (*session.new, *session.dirty, *session.deleted)):
+        session.info["stats_dirty"] = True
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _stats_track_commit(session) -> None:
+    # commit'dan keyin: oraliqda hisoblangan natija eski ma'lumotni keshlab qo'ymasin
+    if session.info.pop("stats_dirty", False):
+        invalidate_stats()
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _stats_track_rollback(session) -> None:
+    session.info.pop("stats_dirty", None)
+
+
+def _stats_query():
+    """Barcha sanoq ikki so'rovda: kontent (UNION ALL) va foydalanuvchilar (GROUP BY role)."""
+    # SUM(bool) natija turini Boolean deb oladi — Integer deb ko'rsatamiz
+    count_true = lambda c: func.coalesce(func.sum(c), 0, type_=Integer)  # noqa: E731
+    content = union_all(
+        select(literal("hayvon"), HayvonItem.group, func.count(), count_true(HayvonItem.enabled))
+        .group_by(HayvonItem.group),
+        select(literal("diagnostika"), null(), func.count(), count_true(DiagnostikaItem.enabled)),
+        select(literal("darslik"), null(), func.count(), count_true(Darslik.enabled)),
+    )
+    users = select(BotUser.role, func.count(), count_true(BotUser.is_blocked)).group_by(BotUser.role)
+    return content, users
+
+
+async def _compute_stats() -> Dict[str, Any]:
+    content_q, users_q = _stats_query()
+    async with async_engine.connect() as conn:
+        content = (await conn.execute(content_q)).all()
+        users = (await conn.execute(users_q)).all()
+
+    totals = {"diagnostika": 0, "diagnostika_enabled": 0, "hayvon": 0, "hayvon_enabled": 0,
+              "darslik": 0, "darslik_enabled": 0}
+    by_group: Dict[str, int] = {g.value: 0 for g in HayGroup}
+    for kind, group, count, enabled_count in content:
+        totals[kind] += count
+        totals[f"{kind}_enabled"] += enabled_count
+        if kind == "hayvon":
+            by_group[getattr(group, "value", group)] = count
+    users_by_role: Dict[str, int] = {"admin": 0, "teacher": 0, "user": 0}
+    blocked_count = 0
+    for role, count, blocked in users:
+        users_by_role[getattr(role, "value", role)] = count
+        blocked_count += blocked
+    totals["users"] = sum(users_by_role.values())
+    totals["users_blocked"] = blocked_count
+    return {"totals": totals, "hayvon_by_group": by_group, "users_by_role": users_by_role}
+
+
 @app.get("/stats")
-def stats() -> Dict[str, Any]:
-    with Session(engine) as s:
-        diag_total = s.exec(select(DiagnostikaItem)).all()
-        diag_enabled = [d for d in diag_total if d.enabled]
-        hay_total = s.exec(select(HayvonItem)).all()
-        hay_enabled = [h for h in hay_total if h.enabled]
-        by_group: Dict[str, int] = {}
-        for g in HayGroup:
-            by_group[g.value] = len([x for x in hay_total if x.group == g])
-        lessons = s.exec(select(Darslik)).all()
-        lessons_enabled = [l for l in lessons if l.enabled]
-        users = s.exec(select(BotUser)).all()
-        users_by_role: Dict[str, int] = {"admin": 0, "teacher": 0, "user": 0}
-        blocked_count = 0
-        for u in users:
-            users_by_role[u.role.value] = users_by_role.get(u.role.value, 0) + 1
-            if u.is_blocked:
-                blocked_count += 1
-
-        return {
-            "totals": {
-                "diagnostika": len(diag_total),
-                "diagnostika_enabled": len(diag_enabled),
-                "hayvon": len(hay_total),
-                "hayvon_enabled": len(hay_enabled),
-                "darslik": len(lessons),
-                "darslik_enabled": len(lessons_enabled),
-                "users": len(users),
-                "users_blocked": blocked_count,
-            },
-            "hayvon_by_group": by_group,
-            "users_by_role": users_by_role,
-        }
+async def stats() -> Dict[str, Any]:
+    cached = _stats_cache["value"]
+    if cached is not None and time.monotonic() < _stats_cache["expires"]:
+        return cached
+    async with _stats_refresh:  # bir vaqtda kelgan so'rovlar bitta hisobni kutadi
+        cached = _stats_cache["value"]
+        if cached is not None and time.monotonic() < _stats_cache["expires"]:
+            return cached
+        gen = _stats_cache["gen"]
+        value = await _compute_stats()
+        with _stats_lock:
+            if _stats_cache["gen"] == gen:
+                _stats_cache.update(value=value, expires=time.monotonic() + ADMIN_STATS_TTL)
+        return value
 
 
 @app.get("/")
@@ -718,283 +1780,313 @@ def _abs_all(req: Request, items: Optional[List[str]]) -> List[str]:
     return [_abs_url_from_req(req, x) for x in (items or []) if x]
 
 
+def target_query(flt: Dict[str, Any]):
+    """
+    Broadcast qabul qiluvchilari: barcha filtrlar SQL'da, faqat (BotUser.id, tg_id).
+    flt — BroadcastJob.target_filter (JSON); broadcast_worker.py ham shu funksiyani ishlatadi.
+    """
+    q = select(BotUser.id, BotUser.tg_id)
+    if flt.get("tg_id"):
+        q = q.where(BotUser.tg_id == flt["tg_id"])
+    elif flt.get("role"):
+        q = q.where(BotUser.role == UserRole(flt["role"]))
+    if not flt.get("include_blocked"):
+        q = q.where(col(BotUser.is_blocked).is_(False))
+    if not flt.get("include_unreachable"):
+        q = q.where(col(BotUser.unreachable).is_(False))
+    return q
+
+
 def _select_targets(
     tg_id: Optional[int],
     role: Optional[UserRole],
     include_blocked: bool,
     to_all: bool = False,
-) -> List[int]:
+    include_unreachable: bool = False,
+) -> Tuple[Dict[str, Any], int]:
+    """
+    (filter, taxminiy soni). Ro'yxat bu yerda yig'ilmaydi: worker BotUser'ni
+    id bo'yicha chunk-chunk (keyset) o'qib, ledger'ga o'zi qo'shadi.
+    """
+    flt: Dict[str, Any] = {
+        "include_blocked": include_blocked,
+        "include_unreachable": include_unreachable,
+    }
     with Session(engine) as s:
         if not to_all and tg_id:
-            u = s.exec(select(BotUser).where(BotUser.tg_id == tg_id)).first()
-            if not u:
+            exists = s.exec(select(BotUser.id).where(BotUser.tg_id == tg_id)).first()
+            if exists is None:
                 raise HTTPException(404, detail="tg_id not found in users table")
-            if u.is_blocked and not include_blocked:
-                return []
-            return [u.tg_id]
-
-        q = select(BotUser)
-        if not to_all and role:
-            q = q.where(BotUser.role == role)
-
-        users = s.exec(q).all()
-        out = []
-        for u in users:
-            if not include_blocked and u.is_blocked:
-                continue
-            out.append(u.tg_id)
-        return out
+            flt["tg_id"] = tg_id
+        elif not to_all and role:
+            flt["role"] = role.value
+        estimate = s.exec(select(func.count()).select_from(target_query(flt).subquery())).one()
+    return flt, estimate
+
+
+@lru_cache(maxsize=256)
+def _static_sha256(local: str, size: int, mtime_ns: int) -> str:
+    # size/mtime kalitda: fayl almashtirilsa qayta hisoblanadi
+    digest = hashlib.sha256()
+    with open(local, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
-def _post_telegram(client: httpx.Client, method: str, data: Dict[str, Any]) -> None:
+def _media_cache_key(url: Optional[str]) -> Optional[str]:
+    """
+    O'zimizning fayllar uchun host'siz /static/... yo'li + kontent sha256'i (fayl shu nom
+    bilan almashtirilsa eski file_id ishlatilmaydi), tashqi URL'lar uchun URL'ning o'zi.
+    """
+    if not url:
+        return None
+    path = urlparse(url).path
+    if not path.startswith("/static/"):
+        return url
+    static = (BASE_DIR / "static").resolve()
+    local = (BASE_DIR / unquote(path).lstrip("/")).resolve()
     try:
-        resp = client.post(method, data=data)
-        # Optional: log bad responses
-        # if resp.status_code != 200:
-        #     print("TG ERR:", method, resp.text)
-    except Exception:
-        pass
+        if not local.is_relative_to(static):
+            return path
+        st = local.stat()
+        return f"{path}#sha256={_static_sha256(str(local), st.st_size, st.st_mtime_ns)}"
+    except OSError:
+        return path  # fayl yo'q: Telegram URL'ni o'zi rad etadi
 
 
-def _broadcast_sync(
+def _job(
     method: str,
-    media_field: Optional[str],            # "audio" | "voice" | "video" | "photo" | "document" | None
-    media_url: Optional[str],              # absolute url or None
-    text_or_caption: Optional[str],
-    parse_mode: Optional[str],
-    disable_web_page_preview: Optional[bool],
-    disable_notification: bool,
-    targets: List[int],
-):
-    token = _ensure_bot_token()
-    base = _tg_api_base(token)
-    with httpx.Client(base_url=base, timeout=httpx.Timeout(30, connect=10)) as client:
-        for chat_id in targets:
-            data: Dict[str, Any] = {"chat_id": chat_id, "disable_notification": disable_notification}
-            if method == "sendMessage":
-                data["text"] = text_or_caption or ""
-                if parse_mode:
-                    data["parse_mode"] = parse_mode
-                if disable_web_page_preview is not None:
-                    data["disable_web_page_preview"] = disable_web_page_preview
-            else:
-                if media_field and media_url:
-                    data[media_field] = media_url
-                if text_or_caption:
-                    data["caption"] = text_or_caption
-                if parse_mode:
-                    data["parse_mode"] = parse_mode
-            _post_telegram(client, method, data)
-            time.sleep(0.05)  # avoid flood
-
-
-def _broadcast_sequence_sync(
-    jobs: List[Dict[str, Any]],   # each: {method, media_field, media_url, text_or_caption, parse_mode, disable_web_page_preview}
+    media_field: Optional[str] = None,        # "audio" | "voice" | "video" | "photo" | "document" | None
+    media_url: Optional[str] = None,          # absolute url or None
+    text_or_caption: Optional[str] = None,
+    parse_mode: Optional[str] = None,
+    disable_web_page_preview: Optional[bool] = None,
+) -> Dict[str, Any]:
+    return {
+        "method": method,
+        "media_field": media_field,
+        "media_url": media_url,
+        "text_or_caption": text_or_caption,
+        "parse_mode": parse_mode,
+        "disable_web_page_preview": disable_web_page_preview,
+        "cache_key": _media_cache_key(media_url) if media_field else None,
+    }
+
+
+ALBUM_MAX = 10        # sendMediaGroup: 2..10 element
+CAPTION_MAX = 1024
+
+_SEND_METHODS = {
+    "photo": "sendPhoto",
+    "video": "sendVideo",
+    "audio": "sendAudio",
+    "voice": "sendVoice",
+    "document": "sendDocument",
+}
+
+
+def _single_media_job(item: Dict[str, Any], caption: Optional[str], parse_mode: Optional[str]) -> Dict[str, Any]:
+    field = item["media_field"]
+    return _job(_SEND_METHODS[field], field, item["media_url"], caption, parse_mode)
+
+
+def _album_jobs(items: List[Dict[str, Any]], caption: Optional[str], parse_mode: Optional[str]) -> List[Dict[str, Any]]:
+    """Bir turdagi (albomga sig'adigan) elementlarni 10 tadan albomlarga bo'ladi; yolg'iz qolgani oddiy yuboriladi."""
+    out = []
+    for i in range(0, len(items), ALBUM_MAX):
+        chunk = items[i:i + ALBUM_MAX]
+        if len(chunk) == 1:
+            out.append(_single_media_job(chunk[0], caption, parse_mode))
+        else:
+            out.append({
+                "method": "sendMediaGroup",
+                "media": chunk,
+                "text_or_caption": caption,
+                "parse_mode": parse_mode,
+            })
+    return out
+
+
+def _schedule_form(
+    not_before: Optional[datetime] = Form(None),   # ISO; tz'siz bo'lsa BROADCAST_TZ (Asia/Tashkent)
+    max_rate: Optional[float] = Form(None),        # msg/s
+    quiet_hours: Optional[str] = Form(None),       # "23:00-08:00"
+) -> Dict[str, Any]:
+    """/notify/* uchun umumiy jadval parametrlari."""
+    if max_rate is not None and max_rate <= 0:
+        raise HTTPException(400, detail="max_rate must be positive")
+    try:
+        parse_quiet_hours(quiet_hours)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    return {
+        "not_before": to_utc_naive(not_before) if not_before else None,
+        "max_rate": max_rate,
+        "quiet_hours": (quiet_hours or "").strip() or None,
+    }
+
+
+def _enqueue(
+    kind: str,
+    jobs: List[Dict[str, Any]],
     disable_notification: bool,
-    targets: List[int],
-):
-    token = _ensure_bot_token()
-    base = _tg_api_base(token)
-    with httpx.Client(base_url=base, timeout=httpx.Timeout(30, connect=10)) as client:
-        for chat_id in targets:
-            for j in jobs:
-                data: Dict[str, Any] = {"chat_id": chat_id, "disable_notification": disable_notification}
-                method = j["method"]
-                if method == "sendMessage":
-                    data["text"] = j.get("text_or_caption") or ""
-                    if j.get("parse_mode"):
-                        data["parse_mode"] = j["parse_mode"]
-                    if "disable_web_page_preview" in j and j["disable_web_page_preview"] is not None:
-                        data["disable_web_page_preview"] = j["disable_web_page_preview"]
-                else:
-                    mf = j.get("media_field")
-                    mu = j.get("media_url")
-                    if mf and mu:
-                        data[mf] = mu
-                    if j.get("text_or_caption"):
-                        data["caption"] = j["text_or_caption"]
-                    if j.get("parse_mode"):
-                        data["parse_mode"] = j["parse_mode"]
-                _post_telegram(client, method, data)
-                time.sleep(0.05)
-            time.sleep(0.05)
+    target_filter: Dict[str, Any],
+    estimate: int,
+    schedule: Dict[str, Any],
+) -> int:
+    """Broadcast'ni filter bilan saqlaydi; ledger'ni to'ldirish va yuborishni broadcast_worker.py bajaradi."""
+    with Session(engine) as s:
+        job = BroadcastJob(
+            kind=kind,
+            payload=json.dumps(jobs, ensure_ascii=False),
+            disable_notification=disable_notification,
+            target_filter=json.dumps(target_filter),
+            total=estimate,
+            **schedule,
+        )
+        s.add(job)
+        s.commit()
+        return job.id
 
 # ---- TEXT ----
 @app.post("/notify/text", dependencies=[Depends(require_api_key)])
 def notify_text(
     request: Request,
-    background: BackgroundTasks,
     text: str = Form(...),
     tg_id: Optional[int] = Form(None),
     role: Optional[UserRole] = Form(None),
     include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
     parse_mode: Optional[str] = Form("HTML"),
     disable_web_page_preview: bool = Form(False),
     disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
     to_all: bool = Form(False),
 ):
     _ensure_bot_token()
-    targets = _select_targets(
-        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
     )
-    if not targets:
+    if not estimate:
         return {"scheduled": 0, "method": "sendMessage", "to_all": to_all}
-    background.add_task(
-        _broadcast_sync,
-        "sendMessage",
-        None, None,
-        text,
-        parse_mode,
-        disable_web_page_preview,
-        disable_notification,
-        targets,
-    )
-    return {"scheduled": len(targets), "method": "sendMessage", "to_all": to_all}
+    jobs = [_job("sendMessage", text_or_caption=text, parse_mode=parse_mode,
+                 disable_web_page_preview=disable_web_page_preview)]
+    job_id = _enqueue("text", jobs, disable_notification, target_filter, estimate, schedule)
+    return {"job_id": job_id, "scheduled": estimate, "method": "sendMessage", "to_all": to_all}
 
 # ---- AUDIO/VOICE ----
 @app.post("/notify/audio", dependencies=[Depends(require_api_key)])
 def notify_audio(
     request: Request,
-    background: BackgroundTasks,
     media_url: str = Form(...),                 # /static/audios/xxx.mp3 yoki http(s) url
     caption: Optional[str] = Form(None),
     as_voice: bool = Form(False),               # True -> sendVoice, False -> sendAudio
     tg_id: Optional[int] = Form(None),
     role: Optional[UserRole] = Form(None),
     include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
     parse_mode: Optional[str] = Form("HTML"),
     disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
     to_all: bool = Form(False),
 ):
     _ensure_bot_token()
     absolute = _abs_url_from_req(request, media_url)
     method = "sendVoice" if as_voice else "sendAudio"
     field_name = "voice" if as_voice else "audio"
-    targets = _select_targets(
-        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
     )
-    if not targets:
+    if not estimate:
         return {"scheduled": 0, "method": method, "media": absolute, "to_all": to_all}
-    background.add_task(
-        _broadcast_sync,
-        method,
-        field_name,
-        absolute,
-        caption,
-        parse_mode,
-        None,
-        disable_notification,
-        targets,
-    )
-    return {"scheduled": len(targets), "method": method, "media": absolute, "to_all": to_all}
+    job_id = _enqueue("audio", [_job(method, field_name, absolute, caption, parse_mode)], disable_notification, target_filter, estimate, schedule)
+    return {"job_id": job_id, "scheduled": estimate, "method": method, "media": absolute, "to_all": to_all}
 
 # ---- VIDEO ----
 @app.post("/notify/video", dependencies=[Depends(require_api_key)])
 def notify_video(
     request: Request,
-    background: BackgroundTasks,
     media_url: str = Form(...),                # /static/videos/xxx.mp4 yoki http(s) url
     caption: Optional[str] = Form(None),
     tg_id: Optional[int] = Form(None),
     role: Optional[UserRole] = Form(None),
     include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
     parse_mode: Optional[str] = Form("HTML"),
     disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
     to_all: bool = Form(False),
 ):
     _ensure_bot_token()
     absolute = _abs_url_from_req(request, media_url)
-    targets = _select_targets(
-        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
     )
-    if not targets:
+    if not estimate:
         return {"scheduled": 0, "method": "sendVideo", "media": absolute, "to_all": to_all}
-    background.add_task(
-        _broadcast_sync,
-        "sendVideo",
-        "video",
-        absolute,
-        caption,
-        parse_mode,
-        None,
-        disable_notification,
-        targets,
-    )
-    return {"scheduled": len(targets), "method": "sendVideo", "media": absolute, "to_all": to_all}
+    job_id = _enqueue("video", [_job("sendVideo", "video", absolute, caption, parse_mode)], disable_notification, target_filter, estimate, schedule)
+    return {"job_id": job_id, "scheduled": estimate, "method": "sendVideo", "media": absolute, "to_all": to_all}
 
 # ---- PHOTO ----
 @app.post("/notify/photo", dependencies=[Depends(require_api_key)])
 def notify_photo(
     request: Request,
-    background: BackgroundTasks,
     media_url: str = Form(...),                # /static/images/xxx.png|jpg|webp yoki http(s) url
     caption: Optional[str] = Form(None),
     tg_id: Optional[int] = Form(None),
     role: Optional[UserRole] = Form(None),
     include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
     parse_mode: Optional[str] = Form("HTML"),
     disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
     to_all: bool = Form(False),
 ):
     _ensure_bot_token()
     absolute = _abs_url_from_req(request, media_url)
-    targets = _select_targets(
-        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
     )
-    if not targets:
+    if not estimate:
         return {"scheduled": 0, "method": "sendPhoto", "media": absolute, "to_all": to_all}
-    background.add_task(
-        _broadcast_sync,
-        "sendPhoto",
-        "photo",
-        absolute,
-        caption,
-        parse_mode,
-        None,
-        disable_notification,
-        targets,
-    )
-    return {"scheduled": len(targets), "method": "sendPhoto", "media": absolute, "to_all": to_all}
+    job_id = _enqueue("photo", [_job("sendPhoto", "photo", absolute, caption, parse_mode)], disable_notification, target_filter, estimate, schedule)
+    return {"job_id": job_id, "scheduled": estimate, "method": "sendPhoto", "media": absolute, "to_all": to_all}
 
 # ---- DOCUMENT (any other file) ----
 @app.post("/notify/document", dependencies=[Depends(require_api_key)])
 def notify_document(
     request: Request,
-    background: BackgroundTasks,
     media_url: str = Form(...),                # /static/pdfs/xxx.pdf yoki har qanday http(s) url
     caption: Optional[str] = Form(None),
     tg_id: Optional[int] = Form(None),
     role: Optional[UserRole] = Form(None),
     include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
     parse_mode: Optional[str] = Form("HTML"),
     disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
     to_all: bool = Form(False),
 ):
     _ensure_bot_token()
     absolute = _abs_url_from_req(request, media_url)
-    targets = _select_targets(
-        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
     )
-    if not targets:
+    if not estimate:
         return {"scheduled": 0, "method": "sendDocument", "media": absolute, "to_all": to_all}
-    background.add_task(
-        _broadcast_sync,
-        "sendDocument",
-        "document",
-        absolute,
-        caption,
-        parse_mode,
-        None,
-        disable_notification,
-        targets,
-    )
-    return {"scheduled": len(targets), "method": "sendDocument", "media": absolute, "to_all": to_all}
+    job_id = _enqueue("document", [_job("sendDocument", "document", absolute, caption, parse_mode)], disable_notification, target_filter, estimate, schedule)
+    return {"job_id": job_id, "scheduled": estimate, "method": "sendDocument", "media": absolute, "to_all": to_all}
 
 # ---- MIXED (NEW): text + many photos/videos/audios/voices/documents in one go ----
 @app.post("/notify/mixed", dependencies=[Depends(require_api_key)])
 def notify_mixed(
     request: Request,
-    background: BackgroundTasks,
     # Text
     text: Optional[str] = Form(None),
     parse_mode: Optional[str] = Form("HTML"),
@@ -1007,89 +2099,233 @@ def notify_mixed(
     voices: Optional[List[str]] = Form(None),     # field name: voices
     documents: Optional[List[str]] = Form(None),  # field name: documents
 
-    # Captions (applies to each media item, optional)
+    # Caption (har bir albom/yakka media uchun, optional)
     caption: Optional[str] = Form(None),
 
     # Targeting
     tg_id: Optional[int] = Form(None),
     role: Optional[UserRole] = Form(None),
     include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
     to_all: bool = Form(False),
 
     # Delivery
     disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
 ):
     """
     Aralash yuborish:
       - text (ixtiyoriy)
       - bir nechta rasm/video/audio/voice/document URL'lari (relative yoki absolute)
     Ketma-ketlik: text -> photos -> videos -> audios -> voices -> documents
+
+    Mos keladigan media sendMediaGroup albomlariga (<= 10 ta) yig'iladi:
+    rasm+video bitta albomda, audio va document — alohida albomlarda; voice albomga
+    kirmaydi. Caption albomning birinchi elementida. Text sig'sa (1024 belgi)
+    birinchi media caption'iga qo'shiladi va alohida xabar yuborilmaydi.
     """
     _ensure_bot_token()
-    targets = _select_targets(tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all)
-    if not targets:
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
+    )
+    if not estimate:
         return {"scheduled": 0, "jobs": 0, "to_all": to_all}
 
+    def items(lst: Optional[List[str]], field: str) -> List[Dict[str, Any]]:
+        return [
+            {"media_field": field, "media_url": u, "cache_key": _media_cache_key(u)}
+            for u in _abs_all(request, lst)
+        ]
+
+    media_jobs: List[Dict[str, Any]] = []
+    media_jobs += _album_jobs(items(photos, "photo") + items(videos, "video"), caption, parse_mode)
+    media_jobs += _album_jobs(items(audios, "audio"), caption, parse_mode)
+    media_jobs += [_single_media_job(it, caption, parse_mode) for it in items(voices, "voice")]
+    media_jobs += _album_jobs(items(documents, "document"), caption, parse_mode)
+
     jobs: List[Dict[str, Any]] = []
-    # text
     if text:
-        jobs.append({
-            "method": "sendMessage",
-            "media_field": None,
-            "media_url": None,
-            "text_or_caption": text,
+        merged = f"{text}\n\n{caption}" if caption else text
+        if media_jobs and len(merged) <= CAPTION_MAX:
+            media_jobs[0] = {**media_jobs[0], "text_or_caption": merged}
+        else:
+            jobs.append(_job("sendMessage", text_or_caption=text, parse_mode=parse_mode,
+                             disable_web_page_preview=disable_web_page_preview))
+    jobs += media_jobs
+
+    if not jobs:
+        raise HTTPException(400, detail="Nothing to send: provide text and/or at least one media url.")
+
+    job_id = _enqueue("mixed", jobs, disable_notification, target_filter, estimate, schedule)
+    albums = sum(1 for j in jobs if j["method"] == "sendMediaGroup")
+    return {"job_id": job_id, "scheduled": estimate, "jobs": len(jobs), "albums": albums, "to_all": to_all}
+
+# ---- COPY: kanal/chatdagi mavjud xabar(lar)ni nusxalash ----
+COPY_BATCH_MAX = 100  # copyMessages: bitta chaqiruvda 1..100 xabar
+
+
+@app.post("/notify/copy", dependencies=[Depends(require_api_key)])
+def notify_copy(
+    request: Request,
+    from_chat_id: str = Form(...),              # -100123... yoki @kanal (bot u yerda a'zo bo'lishi kerak)
+    message_ids: List[int] = Form(...),         # field name: message_ids (takrorlash mumkin)
+    caption: Optional[str] = Form(None),        # faqat bitta xabar uchun: caption'ni almashtiradi
+    remove_caption: bool = Form(False),         # bir nechta xabar uchun
+    parse_mode: Optional[str] = Form("HTML"),
+    tg_id: Optional[int] = Form(None),
+    role: Optional[UserRole] = Form(None),
+    include_blocked: bool = Form(False),
+    include_unreachable: bool = Form(False),
+    disable_notification: bool = Form(False),
+    schedule: Dict[str, Any] = Depends(_schedule_form),
+    to_all: bool = Form(False),
+):
+    """
+    copyMessage / copyMessages orqali yuborish: media qayta yuklanmaydi,
+    bir nechta xabar (albomlar ham) bitta chaqiruvda ketadi.
+    """
+    _ensure_bot_token()
+    ids = sorted(set(message_ids))  # copyMessages o'sish tartibini talab qiladi
+    if not ids:
+        raise HTTPException(400, detail="message_ids is required")
+    target_filter, estimate = _select_targets(
+        tg_id=tg_id, role=role, include_blocked=include_blocked, to_all=to_all,
+        include_unreachable=include_unreachable,
+    )
+    method = "copyMessage" if len(ids) == 1 else "copyMessages"
+    if not estimate:
+        return {"scheduled": 0, "method": method, "messages": len(ids), "to_all": to_all}
+
+    if len(ids) == 1:
+        jobs = [{
+            "method": "copyMessage",
+            "from_chat_id": from_chat_id,
+            "message_id": ids[0],
+            "text_or_caption": caption,
             "parse_mode": parse_mode,
-            "disable_web_page_preview": disable_web_page_preview,
-        })
+        }]
+    else:
+        jobs = [
+            {
+                "method": "copyMessages",
+                "from_chat_id": from_chat_id,
+                "message_ids": ids[i:i + COPY_BATCH_MAX],
+                "remove_caption": remove_caption,
+            }
+            for i in range(0, len(ids), COPY_BATCH_MAX)
+        ]
+    job_id = _enqueue("copy", jobs, disable_notification, target_filter, estimate, schedule)
+    return {"job_id": job_id, "scheduled": estimate, "method": method, "messages": len(ids), "to_all": to_all}
+
+
+# ===================== Broadcast jobs (status / pause / resume / cancel) =====================
+def _job_progress(s: Session, job: BroadcastJob) -> Dict[str, Any]:
+    counts: Dict[str, int] = {st.value: 0 for st in RecipientStatus}
+    rows = s.exec(
+        select(BroadcastRecipient.status, func.count())
+        .where(BroadcastRecipient.job_id == job.id)
+        .group_by(BroadcastRecipient.status)
+    ).all()
+    for st, n in rows:
+        counts[st.value if isinstance(st, Enum) else st] = n
+    errors = s.exec(
+        select(BroadcastRecipient.error, func.count())
+        .where(BroadcastRecipient.job_id == job.id, BroadcastRecipient.error != "")
+        .group_by(BroadcastRecipient.error)
+        .order_by(func.count().desc())
+        .limit(10)
+    ).all()
+    done = sum(counts.values()) - counts["pending"]
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "total": job.total,
+        "total_estimated": not job.targets_ready,
+        "counts": counts,
+        "progress": min(round(done / job.total, 4), 1.0) if job.total else 1.0,
+        "top_errors": [{"error": e, "count": n} for e, n in errors],
+        "not_before": job.not_before,
+        "max_rate": job.max_rate,
+        "quiet_hours": job.quiet_hours,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
 
-    # helpers to add media jobs
-    def add_media_jobs(lst: List[str], method: str, field: str):
-        for u in lst:
-            jobs.append({
-                "method": method,
-                "media_field": field,
-                "media_url": _abs_url_from_req(request, u),
-                "text_or_caption": caption,
-                "parse_mode": parse_mode,
-                "disable_web_page_preview": None,
-            })
 
-    # convert & append
-    if photos:
-        add_media_jobs(_abs_all(request, photos), "sendPhoto", "photo")
-    if videos:
-        add_media_jobs(_abs_all(request, videos), "sendVideo", "video")
-    if audios:
-        add_media_jobs(_abs_all(request, audios), "sendAudio", "audio")
-    if voices:
-        add_media_jobs(_abs_all(request, voices), "sendVoice", "voice")
-    if documents:
-        add_media_jobs(_abs_all(request, documents), "sendDocument", "document")
+@app.get("/notify/jobs", dependencies=[Depends(require_api_key)])
+def list_broadcast_jobs(status: Optional[JobStatus] = None, limit: int = 20):
+    with Session(engine) as s:
+        q = select(BroadcastJob).order_by(BroadcastJob.id.desc()).limit(min(limit, 200))
+        if status is not None:
+            q = q.where(BroadcastJob.status == status)
+        return [_job_progress(s, j) for j in s.exec(q).all()]
 
-    if not jobs:
-        raise HTTPException(400, detail="Nothing to send: provide text and/or at least one media url.")
 
-    background.add_task(_broadcast_sequence_sync, jobs, disable_notification, targets)
-    return {"scheduled": len(targets), "jobs": len(jobs), "to_all": to_all}
+@app.get("/notify/jobs/{job_id}", dependencies=[Depends(require_api_key)])
+def get_broadcast_job(job_id: int):
+    with Session(engine) as s:
+        job = s.get(BroadcastJob, job_id)
+        if not job:
+            raise HTTPException(404, detail="job not found")
+        return _job_progress(s, job)
+
+
+def _set_job_status(job_id: int, allowed_from: List[JobStatus], to: JobStatus) -> Dict[str, Any]:
+    with Session(engine) as s:
+        job = s.get(BroadcastJob, job_id)
+        if not job:
+            raise HTTPException(404, detail="job not found")
+        if job.status not in allowed_from:
+            raise HTTPException(409, detail=f"job is {job.status.value}")
+        job.status = to
+        if to == JobStatus.cancelled:
+            job.finished_at = datetime.utcnow()
+        s.add(job)
+        s.commit()
+        s.refresh(job)
+        return _job_progress(s, job)
+
+
+@app.post("/notify/jobs/{job_id}/pause", dependencies=[Depends(require_api_key)])
+def pause_broadcast_job(job_id: int):
+    return _set_job_status(job_id, [JobStatus.queued, JobStatus.running], JobStatus.paused)
+
+
+@app.post("/notify/jobs/{job_id}/resume", dependencies=[Depends(require_api_key)])
+def resume_broadcast_job(job_id: int):
+    return _set_job_status(job_id, [JobStatus.paused], JobStatus.queued)
+
+
+@app.post("/notify/jobs/{job_id}/cancel", dependencies=[Depends(require_api_key)])
+def cancel_broadcast_job(job_id: int):
+    return _set_job_status(job_id, [JobStatus.queued, JobStatus.running, JobStatus.paused], JobStatus.cancelled)
 # ===================== HayvonQuestion CRUD =====================
 from sqlmodel import col
 
 @app.get("/hayvonq")
-def list_hayvonq(enabled: Optional[bool] = None, group: Optional[HayGroup] = None):
-    with Session(engine) as s:
-        q = select(HayvonQuestion).order_by(HayvonQuestion.group, HayvonQuestion.sort_order)
-        if enabled is not None:
-            q = q.where(HayvonQuestion.enabled == enabled)
-        if group is not None:
-            q = q.where(HayvonQuestion.group == group)
-        return s.exec(q).all()
+async def list_hayvonq(
+    request: Request,
+    enabled: Optional[bool] = None,
+    group: Optional[HayGroup] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    where = []
+    if enabled is not None:
+        where.append(HayvonQuestion.enabled == enabled)
+    if group is not None:
+        where.append(HayvonQuestion.group == group)
+    return await list_page(
+        request, HayvonQuestion, ["group", "sort_order"], where=where, fields=fields, cursor=cursor, limit=limit
+    )
 
 @app.post("/hayvonq", dependencies=[Depends(require_api_key)])
 def create_hayvonq(item: HayvonQuestion):
     with Session(engine) as s:
-        exists = s.exec(select(HayvonQuestion).where(HayvonQuestion.key == item.key)).first()
-        if exists:
-            raise HTTPException(409, detail="key already exists")
         s.add(item)
         s.commit()
         s.refresh(item)
@@ -1101,10 +2337,6 @@ def update_hayvonq(qid: int, data: HayvonQuestion):
         obj = s.get(HayvonQuestion, qid)
         if not obj:
             raise HTTPException(404)
-        if data.key != obj.key:
-            dupe = s.exec(select(HayvonQuestion).where(HayvonQuestion.key == data.key)).first()
-            if dupe:
-                raise HTTPException(409, detail="key already exists")
         for f in ["key","title","group","audio_path","enabled","sort_order"]:
             setattr(obj, f, getattr(data, f))
         s.add(obj)
@@ -1140,15 +2372,7 @@ def create_hayvonq_option(qid: int, opt: HayvonOption):
         qobj = s.get(HayvonQuestion, qid)
         if not qobj:
             raise HTTPException(404, detail="question not found")
-        # bir savolda opt_key yagona bo‘lsin
-        dupe = s.exec(
-            select(HayvonOption).where(
-                HayvonOption.question_id == qid,
-                HayvonOption.opt_key == opt.opt_key
-            )
-        ).first()
-        if dupe:
-            raise HTTPException(409, detail="opt_key already exists")
+        # bir savolda opt_key yagona — ux_hayvonoption_question_opt
         opt.question_id = qid
         s.add(opt)
         s.commit()
@@ -1161,16 +2385,6 @@ def update_hayvonq_option(opt_id: int, data: HayvonOption):
         obj = s.get(HayvonOption, opt_id)
         if not obj:
             raise HTTPException(404)
-        # opt_key uniqueness per question
-        if data.opt_key != obj.opt_key:
-            dupe = s.exec(
-                select(HayvonOption).where(
-                    HayvonOption.question_id == obj.question_id,
-                    HayvonOption.opt_key == data.opt_key
-                )
-            ).first()
-            if dupe:
-                raise HTTPException(409, detail="opt_key already exists")
         for f in ["opt_key","image_path","is_correct","sort_order"]:
             setattr(obj, f, getattr(data, f))
         s.add(obj)
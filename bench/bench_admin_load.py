@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Benchmark: admin_app o'qish endpoint'lari (/export/*, /darslik, /users, /stats) yuk ostida.
+
+Har bir --concurrency darajasi uchun --requests ta so'rov bir vaqtda shuncha
+parallel mijoz bilan yuboriladi. Shu paytda alohida "probe" mijoz har --probe-ms da
+sync yozish endpoint'ini (POST /users/upsert — threadpool'da ishlaydi) chaqiradi:
+eksport yuki threadpool'ni band qilsa, aynan shu kechikish o'sadi.
+
+Standart rejimda ilova shu jarayonda httpx.ASGITransport orqali chaqiriladi
+(vaqtinchalik DB, soxta ma'lumotlar bilan). --url berilsa, ishlab turgan serverga
+(masalan `uvicorn admin_app:app --workers 1`) so'rov yuboriladi, DB to'ldirilmaydi.
+
+Hisobot: har daraja uchun req/s, p50/p99 (jami va endpoint bo'yicha), probe p50/p99, xatolar.
+
+Ishga tushirish:
+  python bench/bench_admin_load.py --concurrency 10,100,500 --requests 3000
+  python bench/bench_admin_load.py --url http://127.0.0.1:8099 --api-key changeme
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ENDPOINTS = [
+    # (yo'l, ulush)
+    ("/export/diagnostika", 3),
+    ("/export/hayvon", 2),
+    ("/export/hayvonq", 2),
+    ("/export/darslik/{code}", 3),
+    ("/darslik", 1),
+    ("/users?role=admin", 1),
+    ("/stats", 1),
+]
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", default="10,100,500")
+    ap.add_argument("--requests", type=int, default=3000, help="har bir daraja uchun")
+    ap.add_argument("--users", type=int, default=5000)
+    ap.add_argument("--lessons", type=int, default=200)
+    ap.add_argument("--questions", type=int, default=100)
+    ap.add_argument("--probe-ms", type=float, default=20)
+    ap.add_argument("--url", default="", help="tashqi server; bo'sh — shu jarayonda ASGI")
+    ap.add_argument("--api-key", default="bench")
+    return ap.parse_args()
+
+
+def pct(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def seed(admin_app, args: argparse.Namespace) -> None:
+    admin_app.init_db()
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, '', ?, 0, '', '2024-01-01 00:00:00', 0)",
+            [(1_000_000 + i, f"user{i}", "admin" if i % 100 == 0 else "user") for i in range(args.users)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO darslik (code, title, text, pdf_path, enabled, created_at) "
+            "VALUES (?, ?, ?, '/static/pdfs/x.pdf', 1, '2024-01-01 00:00:00')",
+            [(f"L{i}", f"Dars {i}", "matn " * 200) for i in range(args.lessons)],
+        )
+        for i in range(args.questions):
+            conn.exec_driver_sql(
+                "INSERT INTO hayvonquestion (key, title, \"group\", audio_path, enabled, sort_order) "
+                "VALUES (?, ?, 'animal', '/static/audios/a.mp3', 1, ?)",
+                (f"q{i}", f"Savol {i}", i),
+            )
+            qid = conn.exec_driver_sql("SELECT last_insert_rowid()").scalar()
+            conn.exec_driver_sql(
+                "INSERT INTO hayvonoption (question_id, opt_key, image_path, is_correct, sort_order) "
+                "VALUES (?, ?, '/static/images/o.png', ?, ?)",
+                [(qid, f"o{j}", int(j == 0), j) for j in range(4)],
+            )
+        conn.exec_driver_sql(
+            "INSERT INTO hayvonitem (key, title, \"group\", image_path, audio_path, enabled, sort_order) "
+            "VALUES (?, ?, 'animal', '/static/images/h.png', '/static/audios/h.mp3', 1, ?)",
+            [(f"h{i}", f"Hayvon {i}", i) for i in range(50)],
+        )
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, args: argparse.Namespace) -> dict:
+    rnd = random.Random(concurrency)
+    paths = [p for p, w in ENDPOINTS for _ in range(w)]
+    queue = [rnd.choice(paths).format(code=f"L{rnd.randrange(args.lessons)}") for _ in range(args.requests)]
+    lat = defaultdict(list)
+    errors = 0
+    probe_lat = []
+    done = asyncio.Event()
+
+    async def worker() -> None:
+        nonlocal errors
+        while queue:
+            path = queue.pop()
+            t = time.perf_counter()
+            try:
+                r = await client.get(path)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if not ok:
+                errors += 1
+                continue
+            lat[path.split("?")[0].rsplit("/L", 1)[0]].append(time.perf_counter() - t)
+
+    async def probe() -> None:
+        nonlocal errors
+        i = 0
+        while not done.is_set():
+            t = time.perf_counter()
+            try:
+                r = await client.post("/users/upsert", data={"tg_id": 9_000_000 + i % 100, "username": "probe"})
+                if r.status_code == 200:
+                    probe_lat.append(time.perf_counter() - t)
+                else:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            i += 1
+            await asyncio.sleep(args.probe_ms / 1000)
+
+    probe_task = asyncio.create_task(probe())
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    done.set()
+    await probe_task
+
+    everything = [x for v in lat.values() for x in v]
+    return {
+        "concurrency": concurrency,
+        "rps": len(everything) / elapsed,
+        "p50": pct(everything, 0.50),
+        "p99": pct(everything, 0.99),
+        "by_path": {k: (pct(v, 0.50), pct(v, 0.99)) for k, v in sorted(lat.items())},
+        "probe": (pct(probe_lat, 0.50), pct(probe_lat, 0.99), len(probe_lat)),
+        "errors": errors,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    headers = {"X-API-Key": args.api_key}
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, headers=headers, timeout=120,
+                                   limits=httpx.Limits(max_connections=None))
+    else:
+        import admin_app
+
+        seed(admin_app, args)
+        transport = httpx.ASGITransport(app=admin_app.app)
+        client = httpx.AsyncClient(transport=transport, base_url="http://admin.local", headers=headers, timeout=120)
+        print(f"seeded users={args.users} lessons={args.lessons} questions={args.questions} (in-process ASGI)")
+
+    async with client:
+        for level in [int(x) for x in args.concurrency.split(",")]:
+            r = await run_level(client, level, args)
+            print(
+                f"c={r['concurrency']:<4d} {r['rps']:7,.0f} req/s  p50={r['p50']:7.1f}ms  p99={r['p99']:7.1f}ms  "
+                f"| probe upsert p50={r['probe'][0]:6.1f}ms p99={r['probe'][1]:7.1f}ms (n={r['probe'][2]})  "
+                f"errors={r['errors']}"
+            )
+            for path, (p50, p99) in r["by_path"].items():
+                print(f"    {path:22s} p50={p50:7.1f}ms  p99={p99:7.1f}ms")
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("ADMIN_DB_PATH", str(Path(tmp) / "app.db"))
+        os.environ.setdefault("ADMIN_API_KEY", ARGS.api_key)
+        sys.path.insert(0, str(ROOT))
+        asyncio.run(main(ARGS))
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Benchmark: broadcast throughput (admin_app /notify/* -> broadcast_worker) soxta Bot API'ga qarshi.
+
+Soxta server (alohida jarayonda, aiohttp — uning CPU/xotirasi natijaga qo'shilmaydi):
+  - har bir so'rovga --latency-ms (+-50%) kechikish
+  - --tg-limit msg/s dan oshsa (1 s sirpanuvchi oyna) 429 retry_after=1 — bu "violation"
+  - --p429 ehtimol bilan tasodifiy 429 (retry_after=--retry-after)
+  - chat_id % --blocked-every == 0 bo'lganlarga 403 (bot bloklangan)
+
+BotUser jadvali --users ta qator bilan (vaqtinchalik DB) to'ldiriladi, so'ng
+/notify/text, /notify/photo, /notify/mixed navbat bilan yuboriladi va job tugaguncha
+worker (run_job) shu jarayonda ishlaydi.
+
+Hisobot: msg/s (Telegram qabul qilgan xabarlar, albom elementlari alohida),
+yakunlash vaqti, API chaqiruvlar, limit buzilishlari, max RSS va (--trace-memory)
+Python heap peak.
+
+Ishga tushirish:
+  python bench/bench_broadcast.py --users 100000 --tg-limit 3000
+  python bench/bench_broadcast.py --users 20000 --scenarios text,mixed --latency-ms 40
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing as mp
+from collections import Counter, deque
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20000)
+    ap.add_argument("--scenarios", default="text,photo,mixed")
+    ap.add_argument("--tg-limit", type=float, default=2000, help="soxta server limiti va TELEGRAM_RATE_BUDGET, msg/s")
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--p429", type=float, default=0.0002)
+    ap.add_argument("--retry-after", type=float, default=1)
+    ap.add_argument("--blocked-every", type=int, default=50)
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--trace-memory", action="store_true", help="tracemalloc peak (sekinlashtiradi ~2x)")
+    return ap.parse_args()
+
+
+def configure_env(args: argparse.Namespace, tmp: str) -> None:
+    """admin_app / broadcast modul darajasida o'qiydigan sozlamalar — importdan oldin."""
+    os.environ.update({
+        "ADMIN_DB_PATH": str(Path(tmp) / "app.db"),
+        "TG_RATELIMIT_DB": str(Path(tmp) / "tg_ratelimit.sqlite3"),
+        "TELEGRAM_BOT_TOKEN": "1:bench",
+        "ADMIN_API_KEY": "bench",
+        "TELEGRAM_RATE_BUDGET": str(args.tg_limit),
+        "BROADCAST_WORKERS": str(args.workers),
+        "BROADCAST_PER_CHAT_INTERVAL": "0",
+        "BROADCAST_ACK_INTERVAL": "0.5",
+    })
+
+
+sys.path.insert(0, str(ROOT))
+
+import httpx  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+
+# ---------- soxta Bot API ----------
+class FakeBotApi:
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.window: deque = deque()
+        self.calls: Counter = Counter()
+        self.delivered = 0
+        self.violations = 0
+        self.random_429 = 0
+        self.blocked = 0
+        self.rng = random.Random(42)
+
+    def reset(self) -> None:
+        self.window.clear()
+        self.calls.clear()
+        self.delivered = self.violations = self.random_429 = self.blocked = 0
+
+    def _over_limit(self, n: int) -> bool:
+        now = time.monotonic()
+        while self.window and now - self.window[0] > 1.0:
+            self.window.popleft()
+        if len(self.window) + n > self.args.tg_limit:
+            return True
+        self.window.extend([now] * n)
+        return False
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        data = await request.post()
+        self.calls[method] += 1
+        await asyncio.sleep(self.args.latency_ms / 1000 * self.rng.uniform(0.5, 1.5))
+
+        n = 1
+        if method == "sendMediaGroup":
+            n = len(json.loads(data["media"]))
+        if self._over_limit(n):
+            self.violations += 1
+            return web.json_response({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                      "parameters": {"retry_after": 1}})
+        if self.rng.random() < self.args.p429:
+            self.random_429 += 1
+            return web.json_response({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                                      "parameters": {"retry_after": self.args.retry_after}})
+        if int(data["chat_id"]) % self.args.blocked_every == 0:
+            self.blocked += 1
+            return web.json_response({"ok": False, "error_code": 403,
+                                      "description": "Forbidden: bot was blocked by the user"})
+        self.delivered += n
+        if method == "sendMediaGroup":
+            return web.json_response({"ok": True, "result": [
+                {"message_id": 1, "photo": [{"file_id": f"fid-{i}"}]} for i in range(n)
+            ]})
+        return web.json_response({"ok": True, "result": {
+            "message_id": 1, "photo": [{"file_id": "fid"}], "document": {"file_id": "fid-doc"},
+        }})
+
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "calls": sum(self.calls.values()),
+            "delivered": self.delivered,
+            "violations": self.violations,
+            "random_429": self.random_429,
+            "blocked": self.blocked,
+        })
+
+    async def reset_handler(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+
+def serve_fake(args: argparse.Namespace, port: int) -> None:
+    fake = FakeBotApi(args)
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", fake.handle)
+    app.router.add_get("/_stats", fake.stats)
+    app.router.add_post("/_reset", fake.reset_handler)
+    web.run_app(app, host="127.0.0.1", port=port, access_log=None, print=None)
+
+
+SCENARIOS = {
+    "text": ("/notify/text", {"text": "Assalomu alaykum! Yangi dars chiqdi."}),
+    "photo": ("/notify/photo", {"media_url": "/static/images/bench.jpg", "caption": "Yangi rasm"}),
+    "mixed": ("/notify/mixed", {
+        "text": "Yangi darslar",
+        "photos": [f"/static/images/bench{i}.jpg" for i in range(4)],
+        "documents": ["/static/pdfs/bench.pdf"],
+    }),
+}
+
+
+def seed_users(admin_app, n: int) -> None:
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, '', '', 'user', 0, '', '2024-01-01 00:00:00', 0)",
+            [(1_000_000 + i,) for i in range(n)],
+        )
+
+
+async def run_scenario(name: str, fake: httpx.AsyncClient, admin_app, worker) -> dict:
+    path, form = SCENARIOS[name]
+    with admin_app.engine.begin() as conn:
+        # oldingi ssenariyda 403 olganlarni qaytaramiz — har safar bir xil auditoriya
+        conn.exec_driver_sql("UPDATE botuser SET unreachable = 0, unreachable_at = NULL")
+        conn.exec_driver_sql("DELETE FROM mediafileid")
+    await fake.post("/_reset")
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+    transport = httpx.ASGITransport(app=admin_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://admin.local") as c:
+        t0 = time.perf_counter()
+        r = await c.post(path, data={**form, "to_all": "true"}, headers={"X-API-Key": "bench"})
+        accept_ms = (time.perf_counter() - t0) * 1000
+        r.raise_for_status()
+
+    claimed = await asyncio.to_thread(worker._claim_next_job)
+    await worker.run_job(claimed)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    st = (await fake.get("/_stats")).json()
+    return {
+        "scenario": name,
+        "accept_ms": accept_ms,
+        "elapsed": elapsed,
+        "msg_per_sec": st["delivered"] / elapsed,
+        "peak_mb": peak / 2**20,
+        **st,
+    }
+
+
+def free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def main(args: argparse.Namespace) -> None:
+    port = free_port()
+    proc = mp.get_context("spawn").Process(target=serve_fake, args=(args, port), daemon=True)
+    proc.start()
+    fake = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}")
+    for _ in range(100):
+        try:
+            await fake.get("/_stats")
+            break
+        except httpx.HTTPError:
+            await asyncio.sleep(0.05)
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{port}"
+
+    import admin_app  # noqa: E402
+    import broadcast_worker  # noqa: E402
+
+    admin_app.init_db()
+    t = time.perf_counter()
+    seed_users(admin_app, args.users)
+    print(f"seeded {args.users} users in {time.perf_counter() - t:.1f}s; budget={args.tg_limit:.0f}/s "
+          f"latency={args.latency_ms:.0f}ms p429={args.p429} workers={args.workers}")
+
+    if args.trace_memory:
+        tracemalloc.start()
+    try:
+        for name in args.scenarios.split(","):
+            r = await run_scenario(name.strip(), fake, admin_app, broadcast_worker)
+            print(
+                f"{r['scenario']:6s} accept={r['accept_ms']:6.1f}ms  done={r['elapsed']:7.2f}s  "
+                f"{r['msg_per_sec']:8,.0f} msg/s  delivered={r['delivered']} calls={r['calls']} "
+                f"violations={r['violations']} random_429={r['random_429']} blocked={r['blocked']} "
+                f"peak_py={r['peak_mb']:.1f}MB"
+            )
+    finally:
+        tracemalloc.stop()
+        await fake.aclose()
+        proc.terminate()
+    print(f"max RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB")
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        configure_env(ARGS, tmp)
+        asyncio.run(main(ARGS))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Load test: bot/cluster.py throughput vs worker jarayonlar soni.
+
+Webhook ingress'ga HTTP orqali soxta update'lar yuboriladi; worker'dagi handler
+har update uchun CPU ish (JSON + hash, ~FSM/matn tahlili kabi) va qisqa I/O
+kutishni simulyatsiya qiladi. Har foydalanuvchi update'lari tartibi ham tekshiriladi.
+
+Ishga tushirish:
+  python bench/bench_cluster.py --updates 4000 --users 200 --workers 1,2,4
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "bot"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import aiohttp  # noqa: E402
+from aiohttp import web  # noqa: E402
+from cluster import Cluster  # noqa: E402
+
+CPU_ROUNDS = int(os.getenv("BENCH_CPU_ROUNDS", "300"))
+IO_WAIT = float(os.getenv("BENCH_IO_WAIT", "0.002"))
+
+
+# ---------- worker tomoni (spawn qilingan jarayonda import qilinadi) ----------
+async def fake_worker():
+    out_dir = Path(os.environ["BENCH_RESULTS_DIR"])
+    pid = os.getpid()
+    (out_dir / f"{pid}.ready").touch()
+    last_seq: dict = {}
+    stats = {"handled": 0, "order_violations": 0}
+
+    async def handle(update: dict) -> None:
+        msg = update["message"]
+        uid, seq = msg["from"]["id"], msg["message_id"]
+        blob = json.dumps(update).encode()
+        for _ in range(CPU_ROUNDS):
+            blob = hashlib.sha256(blob).digest() + blob[:256]
+        await asyncio.sleep(IO_WAIT)
+        if seq < last_seq.get(uid, -1):
+            stats["order_violations"] += 1
+        last_seq[uid] = seq
+        stats["handled"] += 1
+
+    async def shutdown() -> None:
+        (out_dir / f"{pid}.json").write_text(json.dumps(stats))
+
+    return handle, shutdown
+
+
+# ---------- yuk generatori ----------
+def make_update(i: int, users: int) -> bytes:
+    uid = 1000 + i % users
+    return json.dumps({
+        "update_id": i,
+        "message": {
+            "message_id": i,
+            "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": {"id": uid, "is_bot": False, "first_name": "u"},
+            "text": "Boshlash",
+        },
+    }).encode()
+
+
+async def run_once(workers: int, updates: int, users: int, concurrency: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BENCH_RESULTS_DIR"] = tmp
+        cluster = Cluster(workers, factory_path="bench_cluster:fake_worker")
+        cluster.start()
+        while len(list(Path(tmp).glob("*.ready"))) < workers:
+            await asyncio.sleep(0.05)
+
+        runner = web.AppRunner(cluster.make_app(path="/hook", secret=""))
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"http://127.0.0.1:{port}/hook"
+
+        payloads = [make_update(i, users) for i in range(updates)]
+        t0 = time.perf_counter()
+        async with aiohttp.ClientSession() as s:
+            # bitta foydalanuvchi update'lari ketma-ket keladi (Telegram ham shunday yuboradi)
+            async def sender(k: int) -> None:
+                for i in range(k, updates, concurrency):
+                    async with s.post(url, data=payloads[i]) as r:
+                        await r.read()
+            await asyncio.gather(*(sender(k) for k in range(concurrency)))
+        await asyncio.get_running_loop().run_in_executor(None, cluster.stop)
+        elapsed = time.perf_counter() - t0
+        await runner.cleanup()
+
+        results = [json.loads(p.read_text()) for p in Path(tmp).glob("*.json")]
+    return {
+        "workers": workers,
+        "elapsed": elapsed,
+        "rate": updates / elapsed,
+        "handled": sum(r["handled"] for r in results),
+        "order_violations": sum(r["order_violations"] for r in results),
+    }
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--updates", type=int, default=4000)
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--concurrency", type=int, default=50)
+    args = ap.parse_args()
+
+    base = None
+    for n in [int(x) for x in args.workers.split(",")]:
+        r = await run_once(n, args.updates, args.users, args.concurrency)
+        base = base or r["rate"]
+        print(
+            f"workers={r['workers']:2d}  {r['rate']:8,.0f} upd/s  x{r['rate'] / base:4.2f}  "
+            f"elapsed={r['elapsed']:.2f}s handled={r['handled']} order_violations={r['order_violations']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: FSM update_data throughput — MemoryStorage vs BoundedMemoryStorage vs SQLiteStorage.
+
+Diagnostika sessiyasiga o'xshash yuk: har bir foydalanuvchida _items ro'yxati,
+har bir update'da _idx/_passed o'zgaradi (update_data = get_data + set_data).
+
+Ishga tushirish:
+  python bench/bench_fsm_storage.py --users 1000 --updates 50
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bot"))
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from utils.fsm_storage import BoundedMemoryStorage, SQLiteStorage  # noqa: E402
+
+ITEMS = [(f"So'z{i} Ikkinchi{i} Uchinchi{i}", f"http://admin/static/images/{i}.png") for i in range(10)]
+
+
+async def run(storage, users: int, updates: int) -> tuple[float, float, dict]:
+    keys = [StorageKey(bot_id=1, chat_id=u, user_id=u) for u in range(users)]
+    for k in keys:
+        await storage.set_state(k, "Diagnostika:running")
+        await storage.update_data(k, {"_items": ITEMS, "_idx": 0, "_passed": []})
+
+    t0 = time.perf_counter()
+    for step in range(updates):
+        for k in keys:
+            await storage.update_data(k, {"_idx": step, "_passed": list(range(step % 10))})
+    elapsed = time.perf_counter() - t0
+    stats = storage.stats() if hasattr(storage, "stats") else {}
+    await storage.close()  # write-behind: qolgan o'zgarishlar shu yerda diskka yoziladi
+    elapsed_total = time.perf_counter() - t0
+    if "flushes" in stats:
+        # SQLiteStorage: flush/yozuv hisoblagichlari faqat close'dan keyin to'liq
+        # (xotiradagi storage'lar esa close'da tozalanadi — ularniki close'dan oldin)
+        stats = storage.stats()
+    return users * updates / elapsed, users * updates / elapsed_total, stats
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1000)
+    ap.add_argument("--updates", type=int, default=50)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("MemoryStorage", MemoryStorage()),
+            ("BoundedMemoryStorage", BoundedMemoryStorage()),
+            ("SQLiteStorage", SQLiteStorage(Path(tmp) / "fsm.sqlite3")),
+        ]
+        print(f"users={args.users} updates/user={args.updates}")
+        for name, storage in cases:
+            ops, ops_total, stats = await run(storage, args.users, args.updates)
+            print(f"{name:22s} {ops:12,.0f} update_data/s  (close bilan {ops_total:10,.0f}/s)  {stats or ''}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
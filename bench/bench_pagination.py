@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /users sahifalash — jadval o'sganda sahifa narxi o'zgarmasligi kerak.
+
+Har bir --sizes o'lchami uchun vaqtinchalik DB shuncha BotUser bilan to'ldiriladi
+va httpx.ASGITransport orqali o'lchanadi:
+  - first  — birinchi sahifa (?limit=--limit)
+  - deep   — jadval o'rtasidagi sahifa (cursor bilan; OFFSET'siz)
+  - admins — ?role=admin birinchi sahifa
+  - fields — ?fields=id,tg_id,username
+  - all    — sahifalashdan oldingi xatti-harakat: hamma qator bitta javobda (faqat <= --all-max)
+
+Hisobot: har so'rov turi uchun p50 (ms) va javob hajmi (bayt).
+
+Ishga tushirish:
+  python bench/bench_pagination.py --sizes 10000,100000,1000000 --limit 100
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10000,100000,1000000")
+    ap.add_argument("--limit", type=int, default=100)
+    ap.add_argument("--repeat", type=int, default=30)
+    ap.add_argument("--all-max", type=int, default=100000, help="'all' o'lchovi shu hajmgacha")
+    return ap.parse_args()
+
+
+def seed(admin_app, eng, n: int) -> None:
+    admin_app.SQLModel.metadata.create_all(eng)
+    admin_app.run_migrations(eng.url.database)
+    with eng.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, '', ?, 0, '', ?, 0)",
+            [
+                (1_000_000 + i, f"user{i}", "admin" if i % 100 == 0 else "user",
+                 f"2024-01-{1 + i % 28:02d} {i % 24:02d}:00:00.{i % 1000000:06d}")
+                for i in range(n)
+            ],
+        )
+
+
+async def p50(client: httpx.AsyncClient, path: str, params: dict, repeat: int) -> tuple:
+    samples = []
+    size = 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = await client.get(path, params=params)
+        r.raise_for_status()
+        samples.append(time.perf_counter() - t)
+        size = len(r.content)
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, size
+
+
+async def run_size(admin_app, n: int, args: argparse.Namespace) -> None:
+    transport = httpx.ASGITransport(app=admin_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://admin.local", timeout=600) as c:
+        # o'rtadagi sahifa cursor'i: limit=ADMIN_PAGE_MAX bilan yurib chiqamiz
+        params = {"limit": admin_app.ADMIN_PAGE_MAX, "fields": "id"}
+        walked = 0
+        while walked < n // 2:
+            r = await c.get("/users", params=params)
+            walked += len(r.json())
+            params["cursor"] = r.headers["X-Next-Cursor"]
+        deep_cursor = params["cursor"]
+
+        cases = [
+            ("first", {"limit": args.limit}),
+            ("deep", {"limit": args.limit, "cursor": deep_cursor}),
+            ("admins", {"limit": args.limit, "role": "admin"}),
+            ("fields", {"limit": args.limit, "fields": "id,tg_id,username"}),
+        ]
+        line = [f"users={n:>9,}"]
+        for name, params in cases:
+            ms, size = await p50(c, "/users", params, args.repeat)
+            line.append(f"{name} p50={ms:6.2f}ms {size:>7,}B")
+        if n <= args.all_max:
+            # sahifalashdan oldingi /users: bitta so'rovda hammasi
+            q = admin_app.select(admin_app.BotUser).order_by(admin_app.BotUser.created_at.desc())
+            t = time.perf_counter()
+            body = admin_app.dumps(await admin_app.fetch_rows(q))
+            line.append(f"all={(time.perf_counter() - t) * 1000:8.1f}ms {len(body):>11,}B")
+        print(" | ".join(line))
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ADMIN_DB_PATH"] = str(Path(tmp) / "unused.db")
+        sys.path.insert(0, str(ROOT))
+        import admin_app
+
+        print(f"limit={args.limit} repeat={args.repeat}")
+        for n in [int(x) for x in args.sizes.split(",")]:
+            path = Path(tmp) / f"users_{n}.db"
+            admin_app.engine = admin_app.make_engine(path)  # endpoint'lar modul engine'larini ishlatadi
+            admin_app.async_engine = admin_app.make_async_engine(path)
+            seed(admin_app, admin_app.engine, n)
+            asyncio.run(run_size(admin_app, n, args))
+            admin_app.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Benchmark: foydalanuvchi qidiruvi — LIKE '%x%' (eski /users?username=) va FTS5.
+
+Vaqtinchalik DB --users ta BotUser bilan (tasodifiy o'zbekcha username/ism) to'ldiriladi,
+so'ng migratsiyalar (FTS indeks "rebuild" bilan) qo'llanadi. Har bir so'rov --repeat marta:
+  - like   — /users?username=q: ro'yxat filtri (LIKE '%q%' — substring, sahifalangan)
+  - search — /users/search?q=q (bm25 bo'yicha tartiblangan)
+So'rovlar: bitta aniq username, keng prefikslar (2-3 harf), ism+familiya boshlari.
+
+Darsliklar (--lessons ta, matn bilan): bot "Qidirish" yo'li — /darslik/search?q= (birinchi
+so'rov, keshdan, If-None-Match -> 304) va eski yo'l — butun katalogni sahifalab olib
+bot tomonida qidirish.
+
+Hisobot: har so'rov uchun p50 (ms) va topilgan qatorlar soni.
+
+Ishga tushirish:
+  python bench/bench_search.py --users 1000000 --lessons 2000
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SYLLABLES = ["a", "li", "va", "ot", "bek", "jon", "gul", "nar", "sha", "xo", "ra", "di", "mir",
+             "zo", "ka", "ma", "lo", "ti", "yu", "sur", "dil", "fa", "ru", "na", "sa", "ev", "ov"]
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=1_000_000)
+    ap.add_argument("--limit", type=int, default=20)
+    ap.add_argument("--lessons", type=int, default=2000)
+    ap.add_argument("--repeat", type=int, default=20)
+    return ap.parse_args()
+
+
+def word(rnd: random.Random) -> str:
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+
+def seed_lessons(admin_app, n: int) -> None:
+    rnd = random.Random(2)
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO darslik (code, title, text, pdf_path, enabled, created_at) "
+            "VALUES (?, ?, ?, '', 1, ?)",
+            [
+                (f"L{i}", f"{word(rnd).title()} {word(rnd)}",
+                 " ".join(word(rnd) for _ in range(400)), f"2024-01-01 00:00:{i % 60:02d}.{i:06d}")
+                for i in range(n)
+            ],
+        )
+
+
+def seed(admin_app, n: int, lessons: int) -> list:
+    rnd = random.Random(1)
+    admin_app.SQLModel.metadata.create_all(admin_app.engine)
+    rows = [
+        (1_000_000 + i, f"{word(rnd)}_{rnd.randint(1, 9999)}", f"{word(rnd).title()} {word(rnd).title()}",
+         f"2024-01-{1 + i % 28:02d} {i % 24:02d}:00:00.{i % 1000000:06d}")
+        for i in range(n)
+    ]
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, ?, 'user', 0, '', ?, 0)",
+            rows,
+        )
+    if lessons:
+        seed_lessons(admin_app, lessons)
+    t = time.perf_counter()
+    admin_app.run_migrations(admin_app.engine.url.database)   # FTS indeks shu yerda quriladi
+    print(f"seeded users={n:,}; migrations (FTS rebuild) {time.perf_counter() - t:.1f}s")
+    sample = rows[rnd.randrange(n)]
+    first, last = sample[2].split()
+    return [
+        sample[1],                              # aniq username
+        sample[1].split("_")[0][:5],            # username boshi
+        "dil", "bek", "ra",                     # keng prefikslar
+        f"{first[:3]} {last[:3]}",              # ism + familiya boshlari
+    ]
+
+
+async def p50(client: httpx.AsyncClient, path: str, params: dict, repeat: int) -> tuple:
+    samples = []
+    found = 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        r = await client.get(path, params=params)
+        r.raise_for_status()
+        samples.append(time.perf_counter() - t)
+        found = len(r.json())
+    samples.sort()
+    return samples[len(samples) // 2] * 1000, found
+
+
+async def main(args: argparse.Namespace) -> None:
+    import admin_app
+
+    queries = seed(admin_app, args.users, args.lessons)
+
+    transport = httpx.ASGITransport(app=admin_app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://admin.local", timeout=600) as c:
+        for q in queries:
+            like = await p50(c, "/users", {"username": q, "limit": args.limit}, max(3, args.repeat // 5))
+            srch = await p50(c, "/users/search", {"q": q, "limit": args.limit}, args.repeat)
+            print(
+                f"{q!r:22s} like p50={like[0]:8.2f}ms n={like[1]:<3d} | search p50={srch[0]:6.2f}ms n={srch[1]}"
+            )
+        if args.lessons:
+            await bench_lessons(c, args)
+
+
+async def bench_lessons(c: httpx.AsyncClient, args: argparse.Namespace) -> None:
+    # eski yo'l: katalogning hammasi (bot list_lessons kabi), qidiruv bot tomonida
+    t = time.perf_counter()
+    params = {"enabled": "true", "limit": 1000}
+    catalog, trips = [], 0
+    while True:
+        r = await c.get("/darslik", params=params)
+        catalog += r.json()
+        trips += 1
+        if not r.headers.get("X-Next-Cursor"):
+            break
+        params["cursor"] = r.headers["X-Next-Cursor"]
+    full = (time.perf_counter() - t) * 1000
+    print(f"lessons={args.lessons:,}: full catalog {full:.1f}ms, {trips} request(s)")
+
+    rnd = random.Random(3)
+    for q in [catalog[rnd.randrange(len(catalog))]["title"].split()[0][:4], "dil", "zosur bek"]:
+        params = {"q": q, "enabled": "true", "fields": "code,title", "limit": 8}
+        t = time.perf_counter()
+        r = await c.get("/darslik/search", params=params)          # birinchi: FTS + snippet
+        cold = (time.perf_counter() - t) * 1000
+        warm = await p50(c, "/darslik/search", params, args.repeat)  # katalog o'zgarmagan: keshdan
+        etag = r.headers["ETag"]
+        t = time.perf_counter()
+        r304 = await c.get("/darslik/search", params=params, headers={"If-None-Match": etag})
+        not_modified = (time.perf_counter() - t) * 1000
+        print(
+            f"    search {q!r:12s} cold={cold:6.2f}ms cached p50={warm[0]:5.2f}ms "
+            f"304={not_modified:5.2f}ms ({r304.status_code}) n={len(r.json())}"
+        )
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("ADMIN_DB_PATH", str(Path(tmp) / "app.db"))
+        sys.path.insert(0, str(ROOT))
+        asyncio.run(main(ARGS))
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ro'yxat/eksport javoblarini serializatsiya qilish — eski yo'l va fast_json.
+
+Eski yo'l shu jarayonda /_legacy/... route'lari sifatida qayta yaratiladi: ORM obyektlari,
+response_model bo'yicha validatsiya va FastAPI'ning standart JSONResponse'i, siqishsiz.
+Yangi yo'l — admin_app'ning haqiqiy endpoint'lari (Core qatorlar -> orjson, gzip, snapshot).
+
+Vaqtinchalik DB --users ta foydalanuvchi, --lessons ta (to'liq matnli) darslik va
+--questions ta savol (4 variant) bilan to'ldiriladi; har bir endpoint --repeat marta
+httpx.ASGITransport orqali chaqiriladi.
+
+Hisobot: so'rov boshiga CPU vaqti (ms) va simdagi baytlar (identity / gzip).
+
+Ishga tushirish:
+  python bench/bench_serialization.py --users 20000 --lessons 300 --repeat 20
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import List
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20000)
+    ap.add_argument("--lessons", type=int, default=300)
+    ap.add_argument("--questions", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=20)
+    return ap.parse_args()
+
+
+def seed(admin_app, args: argparse.Namespace) -> None:
+    admin_app.init_db()
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, ?, 'user', 0, '', '2024-01-01 00:00:00', 0)",
+            [(1_000_000 + i, f"user{i}", f"Foydalanuvchi {i}") for i in range(args.users)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO darslik (code, title, text, pdf_path, enabled, created_at) "
+            "VALUES (?, ?, ?, '/static/pdfs/x.pdf', 1, '2024-01-01 00:00:00')",
+            [(f"L{i}", f"Dars {i}", "O‘zbek tilidagi dars matni. " * 150) for i in range(args.lessons)],
+        )
+        for i in range(args.questions):
+            conn.exec_driver_sql(
+                "INSERT INTO hayvonquestion (key, title, \"group\", audio_path, enabled, sort_order) "
+                "VALUES (?, ?, 'animal', '/static/audios/a.mp3', 1, ?)",
+                (f"q{i}", f"Savol {i}", i),
+            )
+            qid = conn.exec_driver_sql("SELECT last_insert_rowid()").scalar()
+            conn.exec_driver_sql(
+                "INSERT INTO hayvonoption (question_id, opt_key, image_path, is_correct, sort_order) "
+                "VALUES (?, ?, '/static/images/o.png', ?, ?)",
+                [(qid, f"q{i}_o{j}", int(j == 0), j) for j in range(4)],
+            )
+
+
+def add_legacy_routes(admin_app) -> None:
+    a = admin_app
+
+    @a.app.get("/_legacy/users", response_model=List[a.BotUser])
+    async def legacy_users():
+        async with a.AsyncSession(a.async_engine) as s:
+            q = a.select(a.BotUser).order_by(a.BotUser.created_at.desc(), a.BotUser.id.desc())
+            return (await s.exec(q.limit(a.ADMIN_PAGE_MAX))).all()
+
+    @a.app.get("/_legacy/darslik", response_model=List[a.Darslik])
+    async def legacy_darslik():
+        async with a.AsyncSession(a.async_engine) as s:
+            q = a.select(a.Darslik).order_by(a.Darslik.created_at.desc(), a.Darslik.id.desc())
+            return (await s.exec(q.limit(a.ADMIN_PAGE_MAX))).all()
+
+    @a.app.get("/_legacy/export/hayvonq")
+    async def legacy_export_hayvonq():
+        return await a._build_export_hayvonq(True, None)
+
+
+async def measure(client: httpx.AsyncClient, path: str, repeat: int, gzip: bool) -> tuple:
+    headers = {"Accept-Encoding": "gzip" if gzip else "identity"}
+    await client.get(path, headers=headers)  # isitish (snapshot/kesh)
+    cpu0 = time.process_time()
+    wire = 0
+    for _ in range(repeat):
+        r = await client.get(path, headers=headers)
+        r.raise_for_status()
+        wire = r.num_bytes_downloaded
+    return (time.process_time() - cpu0) / repeat * 1000, wire
+
+
+async def main(args: argparse.Namespace) -> None:
+    import admin_app
+
+    seed(admin_app, args)
+    add_legacy_routes(admin_app)
+    transport = httpx.ASGITransport(app=admin_app.app)
+    print(f"users={args.users} lessons={args.lessons} questions={args.questions} repeat={args.repeat} "
+          f"orjson={'yes' if admin_app.orjson is not None else 'no'}")
+    cases = [
+        # ro'yxatlar sahifalangan: eng katta sahifa (ADMIN_PAGE_MAX) taqqoslanadi
+        ("/users", "/_legacy/users", f"/users?limit={admin_app.ADMIN_PAGE_MAX}"),
+        ("/darslik", "/_legacy/darslik", f"/darslik?limit={admin_app.ADMIN_PAGE_MAX}"),
+        ("/export/hayvonq", "/_legacy/export/hayvonq", "/export/hayvonq"),
+    ]
+    async with httpx.AsyncClient(transport=transport, base_url="http://admin.local") as c:
+        for name, legacy, new in cases:
+            old_cpu, old_bytes = await measure(c, legacy, args.repeat, gzip=False)
+            new_cpu, new_bytes = await measure(c, new, args.repeat, gzip=False)
+            gz_cpu, gz_bytes = await measure(c, new, args.repeat, gzip=True)
+            print(
+                f"{name:16s} legacy cpu={old_cpu:7.1f}ms wire={old_bytes:>10,}B | "
+                f"fast cpu={new_cpu:7.1f}ms wire={new_bytes:>10,}B | "
+                f"fast+gzip cpu={gz_cpu:7.1f}ms wire={gz_bytes:>9,}B"
+            )
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("ADMIN_DB_PATH", str(Path(tmp) / "app.db"))
+        sys.path.insert(0, str(ROOT))
+        asyncio.run(main(ARGS))
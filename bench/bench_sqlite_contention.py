@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Benchmark: admin_app SQLite — parallel o'quvchi va yozuvchilar, profil bo'yicha.
+
+Har bir profil (ADMIN_SQLITE_PROFILE: default, tuned) uchun alohida DB fayl
+yaratiladi, --users ta BotUser bilan to'ldiriladi, so'ng --duration soniya davomida
+threadpool'da (FastAPI sync endpoint'lari kabi) bir vaqtda:
+  - --readers ta o'quvchi: /users?username=... so'rovi va BotUser'ni id bo'yicha o'qish
+  - --writers ta yozuvchi: upsert_user (bot /start) va darslik qo'shish
+ishlaydi. Endpoint funksiyalari to'g'ridan-to'g'ri chaqiriladi (HTTP qatlamisiz).
+
+Hisobot: ops/s, p50/p99 kechikish (o'qish va yozish alohida), "database is locked" xatolari.
+
+Ishga tushirish:
+  python bench/bench_sqlite_contention.py --readers 16 --writers 4 --duration 10
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=20000)
+    ap.add_argument("--readers", type=int, default=16)
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--profiles", default="default,tuned")
+    return ap.parse_args()
+
+
+def pct(values, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def seed(admin_app, eng, n: int) -> None:
+    admin_app.SQLModel.metadata.create_all(eng)
+    with eng.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, '', 'user', 0, '', '2024-01-01 00:00:00', 0)",
+            [(1_000_000 + i, f"user{i}") for i in range(n)],
+        )
+
+
+def run_profile(admin_app, profile: str, path: Path, args: argparse.Namespace) -> dict:
+    eng = admin_app.make_engine(path, profile, "")
+    seed(admin_app, eng, args.users)
+    admin_app.engine = eng  # endpoint'lar modul darajasidagi engine'ni ishlatadi
+
+    lat = {"read": [], "write": []}
+    errors = {"locked": 0, "other": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def reader(seed_: int) -> None:
+        rnd = random.Random(seed_)
+        while time.perf_counter() < stop_at:
+            t = time.perf_counter()
+            try:
+                with admin_app.Session(admin_app.engine) as s:
+                    if rnd.random() < 0.2:
+                        # GET /users?username=... bilan bir xil so'rov (sync engine orqali)
+                        s.exec(
+                            admin_app.select(admin_app.BotUser)
+                            .where(admin_app.BotUser.username.contains(f"user{rnd.randrange(100)}7"))
+                            .order_by(admin_app.BotUser.created_at.desc())
+                        ).all()
+                    else:
+                        s.get(admin_app.BotUser, rnd.randrange(1, args.users))
+            except Exception as e:  # noqa: BLE001
+                with lock:
+                    errors["locked" if "locked" in str(e) else "other"] += 1
+                continue
+            with lock:
+                lat["read"].append(time.perf_counter() - t)
+
+    def writer(seed_: int) -> None:
+        rnd = random.Random(seed_)
+        while time.perf_counter() < stop_at:
+            t = time.perf_counter()
+            try:
+                if rnd.random() < 0.8:
+                    admin_app.upsert_user(
+                        tg_id=1_000_000 + rnd.randrange(args.users * 2), username=f"user{rnd.randrange(10**6)}",
+                        full_name="Bench", role=admin_app.UserRole.user, notes=None,
+                    )
+                else:
+                    with admin_app.Session(admin_app.engine) as s:
+                        s.add(admin_app.Darslik(code=f"b{rnd.randrange(10**9)}", title="t", text="x" * 2000))
+                        s.commit()
+            except Exception as e:  # noqa: BLE001
+                with lock:
+                    errors["locked" if "locked" in str(e) else "other"] += 1
+                continue
+            with lock:
+                lat["write"].append(time.perf_counter() - t)
+
+    with ThreadPoolExecutor(args.readers + args.writers) as pool:
+        futures = [pool.submit(reader, i) for i in range(args.readers)]
+        futures += [pool.submit(writer, 1000 + i) for i in range(args.writers)]
+        for f in futures:
+            f.result()
+    eng.dispose()
+
+    return {
+        "profile": profile,
+        "reads": len(lat["read"]) / args.duration,
+        "writes": len(lat["write"]) / args.duration,
+        "r50": pct(lat["read"], 0.50), "r99": pct(lat["read"], 0.99),
+        "w50": pct(lat["write"], 0.50), "w99": pct(lat["write"], 0.99),
+        **errors,
+    }
+
+
+def main() -> None:
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["ADMIN_DB_PATH"] = str(Path(tmp) / "unused.db")
+        sys.path.insert(0, str(ROOT))
+        import admin_app
+
+        print(f"users={args.users} readers={args.readers} writers={args.writers} duration={args.duration:.0f}s")
+        for profile in args.profiles.split(","):
+            r = run_profile(admin_app, profile.strip(), Path(tmp) / f"{profile.strip()}.db", args)
+            print(
+                f"{r['profile']:8s} read {r['reads']:8,.0f}/s p50={r['r50']:6.1f}ms p99={r['r99']:7.1f}ms | "
+                f"write {r['writes']:6,.0f}/s p50={r['w50']:6.1f}ms p99={r['w99']:7.1f}ms | "
+                f"locked={r['locked']} other_errors={r['other']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
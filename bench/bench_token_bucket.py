@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark/tekshiruv: narxi capacity'dan katta ruxsatlar (albom, copyMessages) limitni buzmasligi.
+
+Uch bucket --duration soniya davomida --rate tezlik bilan ishlatiladi, narxlar
+--costs ro'yxatidan navbat bilan olinadi (standartda 10 va 100 — capacity'dan katta):
+  - broadcast.TokenBucket (jarayon ichidagi)
+  - tg_ratelimit.RateLimitCoordinator, BULK (umumiy SQLite bucket, zaxira bilan)
+  - tg_ratelimit.RateLimitCoordinator, INTERACTIVE
+Har birida yechilgan tokenlar yig'indisi rate * vaqt + capacity + max narx dan
+oshmasligi kerak (boshlang'ich burst va oxirgi qarz). Oshsa — "FAIL" va exit 1.
+
+Ishga tushirish:
+  python bench/bench_token_bucket.py --rate 30 --duration 10
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from itertools import cycle
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rate", type=float, default=30)
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--costs", default="1,10,100,3", help="vergul bilan; capacity = rate")
+    return ap.parse_args()
+
+
+async def drive(acquire, costs, duration: float) -> tuple:
+    spent = 0.0
+    t0 = time.monotonic()
+    for cost in cycle(costs):
+        await acquire(cost)
+        if time.monotonic() - t0 >= duration:
+            break
+        spent += cost
+    return spent, time.monotonic() - t0
+
+
+async def main(args: argparse.Namespace, tmp: Path) -> int:
+    from broadcast import TokenBucket
+    from tg_ratelimit import BULK, INTERACTIVE, RateLimitCoordinator
+
+    costs = [int(x) for x in args.costs.split(",")]
+    capacity = max(1.0, args.rate)
+    cases = [
+        ("TokenBucket", TokenBucket(args.rate).acquire, 0.0),
+        ("shared BULK", None, 20.0),
+        ("shared INTERACTIVE", None, 0.0),
+    ]
+    failed = False
+    print(f"rate={args.rate}/s capacity={capacity:.0f} costs={costs} duration={args.duration:.0f}s")
+    for i, (name, acquire, reserve) in enumerate(cases):
+        limiter = None
+        if acquire is None:
+            limiter = RateLimitCoordinator(str(tmp / f"rl{i}.sqlite3"), rate=args.rate, reserve_percent=reserve)
+            priority = BULK if "BULK" in name else INTERACTIVE
+
+            async def acquire(n, limiter=limiter, priority=priority):
+                await limiter.acquire(priority, n)
+
+        spent, elapsed = await drive(acquire, costs, args.duration)
+        allowed = args.rate * elapsed + capacity + max(costs)
+        ok = spent <= allowed
+        failed |= not ok
+        print(f"{name:20s} spent={spent:8.0f} allowed<={allowed:8.0f} "
+              f"effective={spent / elapsed:6.1f}/s  {'ok' if ok else 'FAIL'}")
+        if limiter is not None:
+            limiter.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.path.insert(0, str(ROOT))
+        sys.exit(asyncio.run(main(ARGS, Path(tmp))))
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /upload/video — parallel katta fayllar, xotira va event loop kechikishi.
+
+--parallel ta --size-mb hajmli fayl bir vaqtda httpx.ASGITransport orqali yuklanadi:
+  - legacy — eski handler (file.file.read() + sinxron write), shu jarayonda /_legacy/upload'da
+  - stream — joriy /upload/video (bo'laklab oqizish, sha256, atomik joylash)
+Fayllar vaqtinchalik papkaga yoziladi (VID_DIR almashtiriladi).
+
+Hisobot: tracemalloc peak (Python ajratgan xotira), umumiy vaqt, event loop'ning eng katta
+kechikishi (10 ms'lik probe qancha kech uyg'ongani).
+
+Ishga tushirish:
+  python bench/bench_upload.py --parallel 4 --size-mb 100
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args() -> argparse.Namespace:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parallel", type=int, default=4)
+    ap.add_argument("--size-mb", type=int, default=100)
+    ap.add_argument("--api-key", default="bench")
+    return ap.parse_args()
+
+
+def add_legacy_route(admin_app) -> None:
+    a = admin_app
+
+    @a.app.post("/_legacy/upload")
+    def legacy_upload(file: a.UploadFile = a.File(...)):
+        fname = file.filename or "video.bin"
+        dest = a.VID_DIR / fname
+        i = 1
+        while dest.exists():
+            stem, suf = Path(fname).stem, Path(fname).suffix
+            dest = a.VID_DIR / f"{stem}_{i}{suf}"
+            i += 1
+        with dest.open("wb") as f:
+            f.write(file.file.read())
+        return {"url": f"/static/videos/{dest.name}", "path": str(dest)}
+
+
+async def run(client: httpx.AsyncClient, path: str, source: Path, parallel: int) -> dict:
+    lag = 0.0
+    done = asyncio.Event()
+
+    async def probe() -> None:
+        nonlocal lag
+        while not done.is_set():
+            t = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lag = max(lag, time.perf_counter() - t - 0.01)
+
+    async def upload(i: int) -> None:
+        with source.open("rb") as f:
+            r = await client.post(path, files={"file": (f"bench_{i}.mp4", f)})
+        r.raise_for_status()
+
+    probe_task = asyncio.create_task(probe())
+    tracemalloc.start()
+    t = time.perf_counter()
+    await asyncio.gather(*(upload(i) for i in range(parallel)))
+    elapsed = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    done.set()
+    await probe_task
+    return {"elapsed": elapsed, "peak": peak, "lag": lag}
+
+
+async def main(args: argparse.Namespace, tmp: Path) -> None:
+    import admin_app
+
+    admin_app.init_db()
+    admin_app.VID_DIR = tmp / "videos"
+    admin_app.VID_DIR.mkdir()
+    admin_app.UPLOAD_KINDS["video"] = (admin_app.VID_DIR, "videos", "video.bin")
+    admin_app.UPLOAD_LIMITS["video"] = max(admin_app.UPLOAD_LIMITS["video"], (args.size_mb + 1) * 1024 * 1024)
+    add_legacy_route(admin_app)
+
+    source = tmp / "source.bin"
+    with source.open("wb") as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    transport = httpx.ASGITransport(app=admin_app.app)
+    headers = {"X-API-Key": args.api_key}
+    print(f"parallel={args.parallel} size={args.size_mb}MiB")
+    async with httpx.AsyncClient(transport=transport, base_url="http://admin.local", headers=headers, timeout=600) as c:
+        for name, path in (("legacy", "/_legacy/upload"), ("stream", "/upload/video")):
+            r = await run(c, path, source, args.parallel)
+            print(
+                f"{name:7s} {r['elapsed']:6.2f}s  peak={r['peak'] / 2**20:8.1f}MiB  "
+                f"max loop lag={r['lag'] * 1000:7.1f}ms"
+            )
+            for p in admin_app.VID_DIR.iterdir():
+                p.unlink()
+
+
+if __name__ == "__main__":
+    ARGS = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("ADMIN_DB_PATH", str(Path(tmp) / "app.db"))
+        os.environ.setdefault("ADMIN_API_KEY", ARGS.api_key)
+        sys.path.insert(0, str(ROOT))
+        asyncio.run(main(ARGS, Path(tmp)))
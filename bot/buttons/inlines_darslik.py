@@ -8,6 +8,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 #   lesson:view:<code>         — bitta darslikni ko'rish
 #   lesson:page:<page>         — ro'yxatda sahifa
 #   lesson:openbycode          — "Kod orqali ochish" modaliga o'tish (handlerga matn yuborish)
+#   lesson:search              — "Qidirish": so'z yuboriladi, natijalar lesson:view:<code> tugmalari
 
 
 def lessons_list_markup(items: List[Dict], page: int, per_page: int, total: int) -> InlineKeyboardMarkup:
@@ -28,12 +29,26 @@ def lessons_list_markup(items: List[Dict], page: int, per_page: int, total: int)
     rows.append(nav)
 
     rows.append([
-        InlineKeyboardButton(text="🔎 Kod orqali ochish", callback_data="lesson:openbycode")
+        InlineKeyboardButton(text="🔎 Kod orqali ochish", callback_data="lesson:openbycode"),
+        InlineKeyboardButton(text="🔍 Qidirish", callback_data="lesson:search"),
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+def lesson_search_results_markup(items: List[Dict]) -> InlineKeyboardMarkup:
+    rows: list[list[InlineKeyboardButton]] = []
+    for d in items:
+        code = d.get("code", "")
+        title = d.get("title", code)
+        rows.append([InlineKeyboardButton(text=f"📘 {title}  ({code})", callback_data=f"lesson:view:{code}")])
+    rows.append([
+        InlineKeyboardButton(text="🔍 Yana qidirish", callback_data="lesson:search"),
+        InlineKeyboardButton(text="⬅️ Ro'yxatga qaytish", callback_data="lesson:page:1"),
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
 def lesson_view_back_markup() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="⬅️ Ro'yxatga qaytish", callback_data="lesson:page:1")]
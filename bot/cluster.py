@@ -0,0 +1,381 @@
+"""
+Multi-instance rejim: webhook ingress + N ta worker jarayon.
+
+  Telegram --webhook--> ingress (aiohttp) --user_id % N--> worker[i] (aiogram dispatcher)
+
+- Ingress update'ni faqat JSON sifatida o'qiydi, foydalanuvchi id'si bo'yicha
+  bo'limni (partition) aniqlaydi va xom baytlarni shu worker navbatiga qo'yadi.
+  Telegram'ga darhol 200 qaytaradi. Navbat to'lsa yoki bo'lim worker'i ishlamasa
+  503 qaytaradi — Telegram update'ni keyinroq qayta yuboradi, yo'qolmaydi.
+- Ingress worker'larni kuzatib turadi: o'lgan jarayon o'z navbati bilan qayta
+  ishga tushiriladi; CLUSTER_MAX_RESTARTS dan ko'p ketma-ket qulasa bo'lim
+  "failed" deb belgilanadi va GET /healthz 503 qaytaradi.
+- Bitta foydalanuvchining barcha update'lari doim bitta worker'ga tushadi (affinity),
+  worker ichida esa ular kelgan tartibida ketma-ket bajariladi. Shuning uchun
+  FSM, obuna natijalari va boshqa per-user holatga faqat bitta jarayon tegadi.
+- Umumiy holat: FSM_STORAGE=sqlite bo'lsa barcha worker'lar bitta WAL fayldan
+  foydalanadi (har bir kalit faqat o'z worker'ida yoziladi), restartdan keyin ham
+  sessiyalar saqlanadi.
+
+Ishga tushirish (polling o'rniga, bot/main.py emas):
+  export WEBHOOK_URL=https://bot.example.uz/tg/webhook   # yoki .env da (WEBHOOK_SECRET ham)
+  export WEBHOOK_SECRET=uzun-tasodifiy-satr
+  export CLUSTER_WORKERS=4 FSM_STORAGE=sqlite
+  python bot/cluster.py
+
+pm2 orqali: ecosystem.config.json dagi "logosmart-bot-cluster" ro'yxatga olinadi,
+lekin autostart=false — polling (logosmart-bot) va cluster bir vaqtda ishlay olmaydi.
+Almashtirish (WEBHOOK_URL/WEBHOOK_SECRET .env da):
+  pm2 stop logosmart-bot && pm2 start logosmart-bot-cluster && pm2 save
+Orqaga qaytish: pm2 stop logosmart-bot-cluster && pm2 start logosmart-bot && pm2 save
+(bot/main.py polling boshlashdan oldin webhook'ni o'chiradi, kutayotgan update'lar saqlanadi.)
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import logging
+import importlib
+import multiprocessing as mp
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+log = logging.getLogger("cluster")
+
+load_dotenv()  # WEBHOOK_* / CLUSTER_* ni .env'dan ham o'qish uchun (sirlar ecosystem faylida turmasin)
+
+BOT_DIR = Path(__file__).resolve().parent
+
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", str(os.cpu_count() or 2)))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "64"))  # bitta worker'da parallel update'lar
+CLUSTER_QUEUE_MAX = int(os.getenv("CLUSTER_QUEUE_MAX", "10000"))  # bitta bo'lim navbatining chegarasi
+CLUSTER_MAX_RESTARTS = int(os.getenv("CLUSTER_MAX_RESTARTS", "5"))  # ketma-ket qulashlar (pm2 max_restarts kabi)
+CLUSTER_RESTART_WINDOW = float(os.getenv("CLUSTER_RESTART_WINDOW", "60"))  # shuncha yashagan worker "barqaror"
+CLUSTER_SUPERVISE_SEC = float(os.getenv("CLUSTER_SUPERVISE_SEC", "1"))
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+ALLOWED_UPDATES = [u.strip() for u in os.getenv("ALLOWED_UPDATES", "message,callback_query").split(",") if u.strip()]
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+# ===================== Partitioning =====================
+def partition_key(update: Dict[str, Any]) -> int:
+    """
+    Update'ning egasi: from.id (message, callback_query, ...), bo'lmasa chat.id,
+    u ham bo'lmasa update_id. Bir foydalanuvchi -> doim bir xil kalit.
+    """
+    for name, payload in update.items():
+        if name == "update_id" or not isinstance(payload, dict):
+            continue
+        user = payload.get("from") or payload.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+        chat = payload.get("chat") or (payload.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+    return int(update.get("update_id", 0))
+
+
+# ===================== Worker =====================
+class UserSerialExecutor:
+    """
+    Har bir foydalanuvchi uchun update'larni kelgan tartibida bajaradi,
+    turli foydalanuvchilarnikini esa parallel.
+    """
+
+    def __init__(self) -> None:
+        self._tails: Dict[int, asyncio.Task] = {}
+
+    def submit(self, uid: int, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        prev = self._tails.get(uid)
+        task = asyncio.get_running_loop().create_task(self._run(uid, prev, fn))
+        self._tails[uid] = task
+        return task
+
+    async def _run(self, uid: int, prev: Optional[asyncio.Task], fn: Callable[[], Awaitable[Any]]) -> None:
+        if prev is not None:
+            await asyncio.wait([prev])  # oldingi xatosi bizga o'tmasin
+        try:
+            await fn()
+        except Exception as e:
+            log.exception("Update handler error: user=%s err=%s", uid, e)
+        finally:
+            if self._tails.get(uid) is asyncio.current_task():
+                del self._tails[uid]
+
+    async def drain(self) -> None:
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+
+def _load_factory(path: str) -> Callable[..., Awaitable[Any]]:
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+async def _worker_loop(index: int, queue: "mp.Queue", factory_path: str) -> None:
+    handle, shutdown = await _load_factory(factory_path)()
+    executor = UserSerialExecutor()
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    handled = 0
+    log.info("Worker %d ready (factory=%s)", index, factory_path)
+
+    while True:
+        await slots.acquire()
+        item = await loop.run_in_executor(None, queue.get)
+        if item is None:
+            slots.release()
+            break
+        uid, raw = item
+
+        async def process(raw: bytes = raw) -> None:
+            try:
+                await handle(json.loads(raw))
+            finally:
+                slots.release()
+
+        executor.submit(uid, process)
+        handled += 1
+
+    await executor.drain()
+    await shutdown()
+    log.info("Worker %d stopped: handled=%d", index, handled)
+
+
+def worker_main(index: int, queue: "mp.Queue", factory_path: str) -> None:
+    if str(BOT_DIR) not in sys.path:
+        sys.path.insert(0, str(BOT_DIR))
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f"%(asctime)s | %(levelname)s | w{index} %(name)s | %(message)s",
+    )
+    asyncio.run(_worker_loop(index, queue, factory_path))
+
+
+# ===================== Ingress =====================
+class PartitionUnavailable(RuntimeError):
+    """Bo'lim update qabul qila olmaydi (navbat to'la yoki worker ishlamayapti)."""
+
+
+class Cluster:
+    """N ta worker jarayonni boshqaradi va update'larni ular orasida bo'ladi."""
+
+    def __init__(
+        self,
+        workers: int,
+        factory_path: str = "main:cluster_worker",
+        queue_max: int = CLUSTER_QUEUE_MAX,
+        max_restarts: int = CLUSTER_MAX_RESTARTS,
+    ) -> None:
+        self.workers = max(1, int(workers))
+        self.factory_path = factory_path
+        self.queue_max = max(1, int(queue_max))
+        self.max_restarts = max(0, int(max_restarts))
+        self._ctx = mp.get_context("spawn")
+        self._queues: List["mp.Queue"] = [self._ctx.Queue(self.queue_max) for _ in range(self.workers)]
+        self._procs = [self._spawn(i) for i in range(self.workers)]
+        self._started_at = [0.0] * self.workers
+        self._stopping = False
+        self.dispatched = [0] * self.workers
+        self.restarts = [0] * self.workers  # ketma-ket qayta ishga tushirishlar
+        self.failed = [False] * self.workers
+
+    def _spawn(self, idx: int) -> "mp.Process":
+        return self._ctx.Process(
+            target=worker_main,
+            args=(idx, self._queues[idx], self.factory_path),
+            name=f"bot-worker-{idx}",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        for i, p in enumerate(self._procs):
+            p.start()
+            self._started_at[i] = time.monotonic()
+        log.info("Cluster started: workers=%d queue_max=%d", self.workers, self.queue_max)
+
+    def dispatch(self, raw: bytes, block: bool = False, timeout: Optional[float] = None) -> int:
+        update = json.loads(raw)
+        uid = partition_key(update)
+        idx = uid % self.workers
+        if self.failed[idx]:
+            raise PartitionUnavailable(f"worker {idx} failed")
+        try:
+            self._queues[idx].put((uid, raw), block, timeout)
+        except queue.Full:
+            raise PartitionUnavailable(f"worker {idx} queue full") from None
+        self.dispatched[idx] += 1
+        return idx
+
+    def _restart(self, idx: int) -> None:
+        # O'lgan jarayon navbat qulfini ushlab qolgan bo'lishi mumkin — yangi navbat
+        # ochamiz va eskisida qolgan update'larni unga ko'chiramiz.
+        old, fresh = self._queues[idx], self._ctx.Queue(self.queue_max)
+        moved = 0
+        while True:
+            try:
+                item = old.get_nowait()
+            except (queue.Empty, OSError, ValueError):
+                break
+            fresh.put_nowait(item)
+            moved += 1
+        old.close()
+        self._queues[idx] = fresh
+        self._procs[idx] = self._spawn(idx)
+        self._procs[idx].start()
+        self._started_at[idx] = time.monotonic()
+        log.warning("Worker %d restarted (#%d, moved=%d)", idx, self.restarts[idx], moved)
+
+    def supervise(self) -> List[int]:
+        """O'lgan worker'larni qayta ishga tushiradi; qayta tushirilgan indekslarni qaytaradi."""
+        restarted: List[int] = []
+        if self._stopping:
+            return restarted
+        now = time.monotonic()
+        for idx, p in enumerate(self._procs):
+            if self.failed[idx] or p.is_alive():
+                continue
+            log.error("Worker %d died: exitcode=%s", idx, p.exitcode)
+            if now - self._started_at[idx] >= CLUSTER_RESTART_WINDOW:
+                self.restarts[idx] = 0
+            if self.restarts[idx] >= self.max_restarts:
+                self.failed[idx] = True
+                log.error("Worker %d crashed %d times in a row, partition marked failed", idx, self.restarts[idx])
+                continue
+            self.restarts[idx] += 1
+            self._restart(idx)
+            restarted.append(idx)
+        return restarted
+
+    def healthy(self) -> bool:
+        return not any(self.failed) and all(p.is_alive() for p in self._procs)
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stopping = True
+        for q, p in zip(self._queues, self._procs):
+            try:
+                q.put(None, p.is_alive(), timeout)  # o'lik worker navbatida kutib qolmaymiz
+            except queue.Full:
+                pass
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                log.warning("Worker %s did not stop in %.0fs, terminating", p.name, timeout)
+                p.terminate()
+        log.info("Cluster stopped: dispatched=%s", self.dispatched)
+
+    def make_app(self, path: str = WEBHOOK_PATH, secret: str = WEBHOOK_SECRET) -> web.Application:
+        async def webhook(request: web.Request) -> web.Response:
+            if secret and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+                return web.Response(status=401)
+            raw = await request.read()
+            try:
+                self.dispatch(raw)
+            except PartitionUnavailable as e:
+                log.warning("Update rejected, Telegram will retry: %s", e)
+                return web.Response(status=503)
+            except (ValueError, TypeError) as e:
+                log.warning("Bad update skipped: %s", e)
+            return web.Response(status=200)
+
+        async def healthz(request: web.Request) -> web.Response:
+            body = {
+                "ok": self.healthy(),
+                "alive": [p.is_alive() for p in self._procs],
+                "failed": self.failed,
+                "restarts": self.restarts,
+                "dispatched": self.dispatched,
+            }
+            return web.json_response(body, status=200 if body["ok"] else 503)
+
+        async def supervisor() -> None:
+            while True:
+                await asyncio.sleep(CLUSTER_SUPERVISE_SEC)
+                self.supervise()
+
+        tasks: List[asyncio.Task] = []
+
+        async def on_startup(_app: web.Application) -> None:
+            tasks.append(asyncio.get_running_loop().create_task(supervisor()))
+
+        async def on_shutdown(_app: web.Application) -> None:
+            self._stopping = True
+            for task in tasks:
+                task.cancel()
+
+        app = web.Application()
+        app.router.add_post(path, webhook)
+        app.router.add_get("/healthz", healthz)
+        app.on_startup.append(on_startup)
+        app.on_shutdown.append(on_shutdown)
+        return app
+
+
+async def _prepare_webhook(cluster: Cluster) -> None:
+    """
+    Backlog'ni BACKLOG_POLICY bo'yicha saralab worker'larga beradi, so'ng webhook'ni o'rnatadi
+    ("all" da backlog'ga tegilmaydi — Telegram uni webhook orqali yuboradi).
+    """
+    from aiogram import Bot
+    from utils.backlog import drain_backlog
+
+    token = os.getenv("botToken")
+    if not token:
+        raise RuntimeError("botToken .env faylida topilmadi")
+    if not WEBHOOK_URL:
+        raise RuntimeError("WEBHOOK_URL sozlanmagan")
+    bot = Bot(token)
+    try:
+        # getUpdates faqat webhook yo'q paytda ishlaydi; pending update'lar saqlanadi
+        await bot.delete_webhook(drop_pending_updates=False)
+        loop = asyncio.get_running_loop()
+
+        async def handle(upd) -> None:
+            raw = upd.model_dump_json(by_alias=True, exclude_none=True).encode()
+            # navbat to'lsa worker'lar bo'shatguncha kutamiz (backlog yo'qolmasin)
+            await loop.run_in_executor(None, cluster.dispatch, raw, True, 60.0)
+
+        await drain_backlog(bot, handle, allowed_updates=ALLOWED_UPDATES)
+
+        await bot.set_webhook(
+            WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=ALLOWED_UPDATES,
+        )
+        log.info("Webhook set: %s (allowed=%s)", WEBHOOK_URL, ALLOWED_UPDATES)
+    finally:
+        await bot.session.close()
+
+
+def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    cluster = Cluster(CLUSTER_WORKERS)
+    cluster.start()
+    asyncio.run(_prepare_webhook(cluster))
+    app = cluster.make_app()
+
+    async def on_cleanup(_app: web.Application) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, cluster.stop)
+
+    app.on_cleanup.append(on_cleanup)
+    web.run_app(app, host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import html
 import math
 from typing import List, Dict
 
@@ -10,17 +11,19 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.types.input_file import BufferedInputFile
 
 from utils.admin_client import AdminClient
-from buttons.inlines_darslik import lessons_list_markup, lesson_view_back_markup
+from buttons.inlines_darslik import lessons_list_markup, lesson_view_back_markup, lesson_search_results_markup
 
 
 darsliklar = Router(name="darsliklar")
 client = AdminClient()
 
 PER_PAGE = 6  # bitta sahifada nechta darslik ko'rsatamiz
+SEARCH_LIMIT = 8  # qidiruvda nechta natija ko'rsatamiz
 
 
 class DarslikStates(StatesGroup):
     waiting_code = State()  # "Kod orqali ochish" uchun
+    waiting_query = State()  # "Qidirish" uchun
 
 
 # --------- Katalogga kirish: "📚 Darsliklar" tugmasi ---------
@@ -64,6 +67,25 @@ async def open_by_code(message: types.Message, state: FSMContext):
     await _send_single_lesson(message, code)
 
 
+# --------- Inline: "Qidirish" ---------
+@darsliklar.callback_query(F.data == "lesson:search")
+async def ask_query(cb: types.CallbackQuery, state: FSMContext):
+    await cb.answer()
+    await state.set_state(DarslikStates.waiting_query)
+    await cb.message.answer("🔍 Darslik nomi yoki matnidan so'z yuboring (masalan: <i>kasr</i>).", parse_mode=ParseMode.HTML)
+
+
+# --------- Qidiruv so'zi yuborildi ---------
+@darsliklar.message(DarslikStates.waiting_query)
+async def search_lessons(message: types.Message, state: FSMContext):
+    query = (message.text or "").strip()
+    if not query:
+        await message.answer("So'z bo'sh bo'lmasligi kerak.")
+        return
+    await state.clear()
+    await _send_search_results(message, query)
+
+
 # --------- Inline: bitta darslikni ko'rish ---------
 @darsliklar.callback_query(F.data.startswith("lesson:view:"))
 async def view_lesson_cb(cb: types.CallbackQuery):
@@ -114,6 +136,32 @@ async def _send_lessons_page(message: types.Message, page: int = 1, edit: bool =
         await message.answer(text, parse_mode=ParseMode.HTML, reply_markup=kb)
 
 
+async def _send_search_results(message: types.Message, query: str):
+    # bitta so'rov: server bm25 bo'yicha tartiblab, snippet bilan qaytaradi
+    try:
+        found: List[Dict] = await client.search_lessons(query, limit=SEARCH_LIMIT)
+    except Exception as e:
+        await message.answer(f"Xatolik: qidiruv bajarilmadi. {e}")
+        return
+
+    if not found:
+        await message.answer(
+            f"🔍 «{html.escape(query)}» bo'yicha darslik topilmadi.",
+            parse_mode=ParseMode.HTML,
+            reply_markup=lesson_search_results_markup([]),
+        )
+        return
+
+    lines = [f"🔍 <b>{html.escape(query)}</b> — {len(found)} ta natija\n"]
+    for d in found:
+        # snippet serverda HTML-escape qilingan, topilgan so'zlar <b>…</b>
+        lines.append(f"📘 <b>{html.escape(d.get('title', ''))}</b> (<code>{html.escape(d.get('code', ''))}</code>)")
+        if d.get("snippet"):
+            lines.append(f"<i>{d['snippet']}</i>")
+        lines.append("")
+    await message.answer("\n".join(lines), parse_mode=ParseMode.HTML, reply_markup=lesson_search_results_markup(found))
+
+
 async def _send_single_lesson(message: types.Message, code: str, edit: bool = False):
     try:
         data = await client.export_lesson(code)
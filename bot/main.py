@@ -1,8 +1,20 @@
 import os
+import sys
 import asyncio
 import logging
+from pathlib import Path
 from typing import Callable, Dict, Any, Awaitable, List
+
+# repo ildizidagi umumiy modullar (tg_ratelimit.py) uchun
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.append(str(ROOT_DIR))
+
 from user_service import upsert_user
+from utils.fsm_storage import BoundedMemoryStorage, SQLiteStorage
+from utils.backlog import drain_backlog
+from utils.rate_limit import CoordinatedRequestMiddleware
+from tg_ratelimit import RateLimitCoordinator
 
 from aiogram import Bot, Dispatcher, Router, F, BaseMiddleware
 from aiogram.types import (
@@ -24,6 +36,13 @@ log = logging.getLogger("bot")
 load_dotenv()
 BOT_TOKEN = os.getenv("botToken")
 REQUIRED_CHANNELS = [c.strip() for c in os.getenv("REQUIRED_CHANNELS", "").split(",") if c.strip()]
+# FSM: tashlab ketilgan sessiyalar shuncha soniyadan keyin o'chadi; umumiy hajm chegarasi (bayt)
+FSM_TTL_SECONDS = float(os.getenv("FSM_TTL_SECONDS", str(6 * 3600)))
+FSM_MAX_BYTES = int(os.getenv("FSM_MAX_BYTES", str(64 * 1024 * 1024)))
+# FSM_STORAGE=sqlite -> sessiyalar restartdan keyin ham saqlanadi (write-behind, WAL)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory").strip().lower()
+FSM_SQLITE_PATH = os.getenv("FSM_SQLITE_PATH", str(Path(__file__).resolve().parent / "data" / "fsm.sqlite3"))
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.5"))
 
 if not BOT_TOKEN:
     log.error("botToken .env faylida topilmadi")
@@ -218,7 +237,15 @@ async def recheck_subscription(cb: CallbackQuery):
 
 # ===================== Bot & Dispatcher =====================
 bot = Bot(BOT_TOKEN)
-dp = Dispatcher()
+# broadcast worker bilan umumiy Telegram limiti (interaktiv javoblar ustuvor)
+rate_limiter = RateLimitCoordinator()
+bot.session.middleware(CoordinatedRequestMiddleware(rate_limiter))
+if FSM_STORAGE == "sqlite":
+    storage = SQLiteStorage(FSM_SQLITE_PATH, flush_interval=FSM_FLUSH_INTERVAL, ttl=FSM_TTL_SECONDS)
+else:
+    storage = BoundedMemoryStorage(ttl=FSM_TTL_SECONDS, max_bytes=FSM_MAX_BYTES)
+log.info("FSM storage: %s", type(storage).__name__)
+dp = Dispatcher(storage=storage)
 
 # ===================== Handlers =====================
 
@@ -233,12 +260,9 @@ async def start(message: Message):
 async def start_alias(message: Message):
     await start(message)
 
-# ===================== Main =====================
-async def main():
-    # Bot ma'lumotini loglaymiz
-    me = await bot.get_me()
-    log.info("Bot starting: @%s (id=%s)", me.username, me.id)
-
+# ===================== Setup =====================
+def setup_dispatcher() -> None:
+    """Middleware va routerlarni ulaydi (polling ham, cluster worker ham shu yerdan)."""
     # Majburiy obuna middleware
     if REQUIRED_CHANNELS:
         log.info("REQUIRED_CHANNELS: %s", REQUIRED_CHANNELS)
@@ -267,12 +291,59 @@ async def main():
     except Exception as e:
         log.warning("Qo‘shimcha routerlar ulanmagan yoki xato: %s", e)
 
+
+async def cluster_worker():
+    """
+    cluster.py worker'i uchun factory: dispatcherni tayyorlab, update handler
+    va to'xtatish funksiyasini qaytaradi. Har bir worker o'z foydalanuvchilariga
+    egalik qiladi (user_id % N), shuning uchun FSM va boshqa per-user holat
+    faqat shu jarayonda o'zgaradi.
+    """
+    setup_dispatcher()
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    async def handle(update: Dict[str, Any]) -> None:
+        await dp.feed_raw_update(bot, update)
+
+    async def shutdown() -> None:
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)  # storage.close() shu yerda
+        await bot.session.close()
+
+    return handle, shutdown
+
+
+# ===================== Main =====================
+async def replay_backlog(allowed_updates) -> None:
+    """
+    Downtime'da yig'ilgan update'lar: BACKLOG_POLICY bo'yicha saralab qayta ishlaydi
+    ("all" — hech narsa qilmaydi, polling backlog'ni o'zi oladi). Xato polling'ni to'xtatmaydi.
+    """
+    try:
+        await drain_backlog(bot, lambda upd: dp.feed_update(bot, upd), allowed_updates=allowed_updates)
+    except Exception as e:
+        log.exception("Backlog o'qilmadi: %s", e)
+
+
+async def main():
+    # Bot ma'lumotini loglaymiz
+    me = await bot.get_me()
+    log.info("Bot starting: @%s (id=%s)", me.username, me.id)
+
+    setup_dispatcher()
+
+    allowed_updates = dp.resolve_used_update_types()
+    # cluster (webhook) rejimidan qaytilganda webhook qolgan bo'lsa getUpdates ishlamaydi
+    await bot.delete_webhook(drop_pending_updates=False)
+    await replay_backlog(allowed_updates)
+
     try:
         log.info("Start polling…")
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+        await dp.start_polling(bot, allowed_updates=allowed_updates)
     except Exception as e:
         log.exception("Pollingda xato: %s", e)
     finally:
+        # storage.close() ni dispatcher shutdown'da o'zi chaqiradi (sqlite: qolgan o'zgarishlar yoziladi)
+        log.info("FSM storage: %s", storage.stats())
         log.info("Bot to‘xtadi.")
 
 if __name__ == "__main__":
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
 import os
+import time
+from collections import OrderedDict
 from urllib.parse import urljoin
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 import aiohttp
 
 
 ADMIN_BASE = os.getenv("ADMIN_BASE", "http://185.217.131.39/")
+SEARCH_CACHE_SIZE = 256  # nechta turli qidiruv so'rovi natijasi eslab qolinadi
+SEARCH_VERSION_TTL = float(os.getenv("SEARCH_VERSION_TTL", "30"))  # /export/version ko'pi bilan shuncha soniyada bir
 
 
 class AdminClient:
@@ -15,6 +19,10 @@ class AdminClient:
         self.base = base or ADMIN_BASE
         self._timeout = aiohttp.ClientTimeout(total=25)
         self._headers = {"User-Agent": "bot-darslik-client/1.0"}
+        # (so'rov, limit, darslik versiyasi) -> natija; versiya o'zgarsa eski kalitlar ishlatilmaydi
+        self._search_cache: "OrderedDict[Tuple[str, int, int], List[Dict[str, Any]]]" = OrderedDict()
+        self._lessons_version: Optional[int] = None
+        self._version_checked = 0.0
 
     async def _get_json(self, path: str, params: dict | None = None) -> Any:
         url = urljoin(self.base, path)
@@ -23,6 +31,21 @@ class AdminClient:
                 r.raise_for_status()
                 return await r.json()
 
+    async def _get_all_pages(self, path: str, params: dict | None = None) -> List[Any]:
+        # ro'yxat endpoint'lari sahifalangan: davomi X-Next-Cursor header'ida
+        params = dict(params or {}, limit=1000)
+        url = urljoin(self.base, path)
+        items: List[Any] = []
+        async with aiohttp.ClientSession(timeout=self._timeout, headers=self._headers) as s:
+            while True:
+                async with s.get(url, params=params) as r:
+                    r.raise_for_status()
+                    items.extend(await r.json())
+                    cursor = r.headers.get("X-Next-Cursor")
+                if not cursor:
+                    return items
+                params["cursor"] = cursor
+
     async def _download_bytes(self, url: str) -> tuple[bytes, str]:
         async with aiohttp.ClientSession(timeout=self._timeout, headers=self._headers) as s:
             async with s.get(url) as r:
@@ -33,7 +56,7 @@ class AdminClient:
     async def list_lessons(self, enabled: bool = True) -> List[Dict[str, Any]]:
         # /darslik GET (public)
         params = {"enabled": str(enabled).lower()}
-        data = await self._get_json("/darslik", params=params)
+        data = await self._get_all_pages("/darslik", params=params)
         # normalizatsiya: pdf_url to'liq bo'lsin
         for d in data:
             pdf = (d.get("pdf_path") or "").strip()
@@ -42,6 +65,36 @@ class AdminClient:
                 d["pdf_url"] = urljoin(self.base, d["pdf_url"])
         return data
 
+    async def lessons_version(self) -> Optional[int]:
+        # darslik kolleksiyasi versiyasi; serverdan SEARCH_VERSION_TTL da bir martadan ko'p so'ralmaydi
+        now = time.monotonic()
+        if self._lessons_version is not None and now - self._version_checked < SEARCH_VERSION_TTL:
+            return self._lessons_version
+        try:
+            data = await self._get_json("/export/version")
+            version = int(data["versions"]["darslik"])
+        except (aiohttp.ClientError, KeyError, TypeError, ValueError):
+            return None  # versiyani bilmasak keshga ishonmaymiz
+        if version != self._lessons_version:
+            self._search_cache.clear()
+        self._lessons_version, self._version_checked = version, now
+        return version
+
+    async def search_lessons(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
+        # /darslik/search GET (public): code/title/text, bm25 tartibida, "snippet" — HTML parcha
+        version = await self.lessons_version()
+        key = (" ".join(query.lower().split()), limit, version)
+        if version is not None and key in self._search_cache:
+            self._search_cache.move_to_end(key)
+            return self._search_cache[key]
+        params = {"q": query, "enabled": "true", "fields": "code,title", "limit": limit}
+        data = await self._get_json("/darslik/search", params=params)
+        if version is not None:
+            self._search_cache[key] = data
+            while len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+        return data
+
     async def export_lesson(self, code: str) -> Dict[str, Any]:
         # /export/darslik/{code} GET (public, only enabled)
         data = await self._get_json(f"/export/darslik/{code}")
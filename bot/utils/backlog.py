@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram import Bot
+from aiogram.types import Update
+
+log = logging.getLogger("backlog")
+
+# Restartdan keyin yig'ilib qolgan update'lar bilan nima qilamiz:
+#   all        — hammasini qayta ishlash (eski xulq, standart): backlog'ga tegilmaydi,
+#                polling/webhook uni odatdagidek (parallel task'lar bilan) oladi
+#   drop       — hammasini tashlab yuborish
+#   start_only — faqat /start (har foydalanuvchidan oxirgisi, 100 talik paket ichida)
+#   recent     — faqat oxirgi BACKLOG_MAX_AGE_MIN daqiqadagilar (eskilari tashlanadi)
+# Standart "all" — mavjud deploy'lar xulqi o'zgarmaydi; saralash BACKLOG_POLICY bilan yoqiladi.
+BACKLOG_POLICY = os.getenv("BACKLOG_POLICY", "all").strip().lower()
+BACKLOG_MAX_AGE_MIN = float(os.getenv("BACKLOG_MAX_AGE_MIN", "10"))
+BACKLOG_CONCURRENCY = int(os.getenv("BACKLOG_CONCURRENCY", "16"))  # paket ichida parallel handler'lar
+BACKLOG_BATCH = 100  # getUpdates limiti
+
+POLICIES = ("all", "drop", "start_only", "recent")
+
+
+def _user_id(upd: Update) -> Optional[int]:
+    ev = upd.event
+    user = getattr(ev, "from_user", None)
+    return user.id if user else None
+
+
+def _event_date(upd: Update) -> Optional[float]:
+    """Update sanasi (faqat message turlarida bor; callback_query'da yo'q)."""
+    date = getattr(upd.event, "date", None)
+    return date.timestamp() if date is not None else None
+
+
+def _is_voice(upd: Update) -> bool:
+    msg = upd.message
+    return bool(msg and (msg.voice or msg.audio))
+
+
+def _is_start(upd: Update) -> bool:
+    msg = upd.message
+    return bool(msg and (msg.text or "").startswith("/start"))
+
+
+def _normalize_policy(policy: str) -> str:
+    if policy not in POLICIES:
+        log.warning("Unknown BACKLOG_POLICY=%r, using 'all'", policy)
+        return "all"
+    return policy
+
+
+def filter_backlog(
+    updates: List[Update],
+    policy: str = BACKLOG_POLICY,
+    max_age_min: float = BACKLOG_MAX_AGE_MIN,
+    now: Optional[float] = None,
+    last_seen: Optional[float] = None,
+) -> Tuple[List[Update], Dict[str, int]]:
+    """
+    Backlog'dan qayta ishlanadiganlarini tanlaydi.
+
+    callback_query'ning o'z sanasi yo'q: uning vaqti o'zidan oldingi (update_id
+    bo'yicha) sanali update'dan keyin ekanligi aniq, shuning uchun "recent" da
+    shu sana ishlatiladi; oldida sanali update bo'lmasa (last_seen — oldingi paketdagi
+    oxirgi sana) — eskirgan deb hisoblanadi.
+    Bitta foydalanuvchining bir xil tugmani qayta-qayta bosishi (user, message, data)
+    bo'yicha bitta — oxirgisiga birlashtiriladi.
+    """
+    policy = _normalize_policy(policy)
+    now = time.time() if now is None else now
+    cutoff = now - max_age_min * 60
+
+    kept: List[Update] = []
+    if policy == "all":
+        kept = list(updates)
+    elif policy == "start_only":
+        last_start: Dict[Any, Update] = {}
+        for u in updates:
+            if _is_start(u):
+                last_start[_user_id(u)] = u
+        kept = sorted(last_start.values(), key=lambda u: u.update_id)
+    elif policy == "recent":
+        for u in updates:
+            date = _event_date(u)
+            if date is not None:
+                last_seen = date
+            elif last_seen is not None:
+                date = last_seen
+            if date is not None and date >= cutoff:
+                kept.append(u)
+
+    # bir xil callback'larni birlashtirish: oxirgisi qoladi
+    seen_cb: set = set()
+    merged: List[Update] = []
+    duplicates = 0
+    for u in reversed(kept):
+        cb = u.callback_query
+        if cb is not None:
+            sig = (cb.from_user.id, cb.message.message_id if cb.message else None, cb.data)
+            if sig in seen_cb:
+                duplicates += 1
+                continue
+            seen_cb.add(sig)
+        merged.append(u)
+    merged.reverse()
+
+    kept_ids = {u.update_id for u in merged}
+    stats = {
+        "total": len(updates),
+        "kept": len(merged),
+        "dropped": len(updates) - len(merged),
+        "merged_callbacks": duplicates,
+        "stt_skipped": sum(1 for u in updates if _is_voice(u) and u.update_id not in kept_ids),
+    }
+    return merged, stats
+
+
+async def drain_backlog(
+    bot: Bot,
+    handle: Callable[[Update], Awaitable[Any]],
+    allowed_updates: Optional[List[str]] = None,
+    policy: str = BACKLOG_POLICY,
+    max_age_min: float = BACKLOG_MAX_AGE_MIN,
+    concurrency: int = BACKLOG_CONCURRENCY,
+) -> Dict[str, int]:
+    """
+    Telegram'da kutib turgan update'larni siyosat bo'yicha qayta ishlaydi (webhook o'chirilgan
+    bo'lishi kerak). "all" da hech narsa qilmaydi — polling/webhook backlog'ni o'zi oladi.
+
+    start_only/recent: BACKLOG_BATCH talik paketlar — saralanadi, qolganlari handle() bilan
+    (ko'pi bilan concurrency ta parallel) qayta ishlanadi; paket offset'i faqat paket tugagach
+    (keyingi getUpdates(offset=...) bilan) tasdiqlanadi. Jarayon paket o'rtasida qulasa,
+    tasdiqlanmagan paket keyingi ishga tushishda qayta keladi. handle() dagi xato loglanadi,
+    qolgan update'larni to'xtatmaydi.
+    """
+    policy = _normalize_policy(policy)
+    totals: Dict[str, int] = {}
+    if policy == "all":
+        return totals
+    t0 = time.monotonic()
+    if policy == "drop":
+        await bot.delete_webhook(drop_pending_updates=True)
+        log.info("Backlog: dropped all pending updates (policy=drop)")
+        return totals
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(upd: Update) -> None:
+        async with sem:
+            try:
+                await handle(upd)
+            except Exception as e:  # noqa: BLE001 — bitta update qolganlarini to'xtatmasin
+                log.exception("Backlog update %s failed: %s", upd.update_id, e)
+
+    offset: Optional[int] = None
+    last_seen: Optional[float] = None
+    now = time.time()
+    while True:
+        # offset — oldingi paket to'liq qayta ishlangandan keyingina tasdiqlanadi
+        batch = await bot.get_updates(
+            offset=offset, limit=BACKLOG_BATCH, timeout=0, allowed_updates=allowed_updates
+        )
+        if not batch:
+            break
+        kept, stats = filter_backlog(batch, policy=policy, max_age_min=max_age_min, now=now, last_seen=last_seen)
+        for u in batch:
+            last_seen = _event_date(u) or last_seen
+        for k, v in stats.items():
+            totals[k] = totals.get(k, 0) + v
+        await asyncio.gather(*(run(u) for u in kept))
+        offset = batch[-1].update_id + 1
+
+    log.info(
+        "Backlog: policy=%s max_age_min=%s %s in %.2fs",
+        policy, max_age_min, totals, time.monotonic() - t0,
+    )
+    return totals
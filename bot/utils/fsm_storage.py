@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+log = logging.getLogger("fsm_storage")
+
+
+def _dumps(data: Mapping[str, Any]) -> bytes:
+    # ixcham JSON: bo'sh joylarsiz, unicode escape qilmasdan
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(blob: bytes) -> Dict[str, Any]:
+    return json.loads(blob) if blob else {}
+
+
+class _Record:
+    """
+    Bitta sessiya. data dict sifatida emas, ixcham JSON bytes sifatida saqlanadi:
+    diagnostika/hayvon ro'yxatlari dict ko'rinishida bir necha barobar ko'p xotira oladi.
+    """
+    __slots__ = ("state", "blob", "touched")
+
+    def __init__(self) -> None:
+        self.state: Optional[str] = None
+        self.blob: bytes = b""
+        self.touched: float = 0.0
+
+    def size(self) -> int:
+        return len(self.blob) + len(self.state or "")
+
+
+class BoundedMemoryStorage(BaseStorage):
+    """
+    MemoryStorage o'rnini bosuvchi, chegaralangan FSM storage.
+
+    - ttl: shuncha soniya tegilmagan sessiya o'chiriladi (tashlab ketilgan diagnostika/hayvon)
+    - max_bytes: barcha sessiyalar hajmi chegarasi; oshsa, eng uzoq ishlatilmagan (LRU) o'chiriladi
+    - sweep_interval: muddati o'tganlarni tozalash oralig'i (yozish paytida, fon task'siz)
+
+    Sessiyalar oxirgi murojaat tartibida saqlanadi, shuning uchun TTL va LRU tozalash
+    ikkalasi ham ro'yxat boshidan ishlaydi va faqat o'chiriladigan yozuvlar soniga bog'liq.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 6 * 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+        sweep_interval: float = 60.0,
+    ) -> None:
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self.sweep_interval = float(sweep_interval)
+        self._records: "OrderedDict[StorageKey, _Record]" = OrderedDict()
+        self._bytes = 0
+        self._last_sweep = time.monotonic()
+        self._evicted_ttl = 0
+        self._evicted_lru = 0
+
+    # ---------- ichki yordamchilar ----------
+    def _expired(self, rec: _Record, now: float) -> bool:
+        return self.ttl > 0 and now - rec.touched > self.ttl
+
+    def _drop(self, key: StorageKey) -> None:
+        rec = self._records.pop(key, None)
+        if rec is not None:
+            self._bytes -= rec.size()
+
+    def _get(self, key: StorageKey) -> Optional[_Record]:
+        rec = self._records.get(key)
+        if rec is None:
+            return None
+        now = time.monotonic()
+        if self._expired(rec, now):
+            self._drop(key)
+            self._evicted_ttl += 1
+            return None
+        rec.touched = now
+        self._records.move_to_end(key)
+        return rec
+
+    def _put(self, key: StorageKey, state: Optional[str], blob: bytes) -> None:
+        old = self._records.get(key)
+        if old is not None:
+            self._bytes -= old.size()
+
+        # bo'sh sessiya (state.clear()) — umuman saqlamaymiz
+        if state is None and not blob:
+            if old is not None:
+                del self._records[key]
+            return
+
+        rec = old or _Record()
+        rec.state, rec.blob, rec.touched = state, blob, time.monotonic()
+        self._records[key] = rec
+        self._records.move_to_end(key)
+        self._bytes += rec.size()
+        self._maybe_sweep(rec.touched)
+        self._enforce_cap(keep=key)
+
+    def _maybe_sweep(self, now: float) -> None:
+        if self.ttl <= 0 or now - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = now
+        evicted = 0
+        while self._records:
+            key, rec = next(iter(self._records.items()))
+            if not self._expired(rec, now):
+                break
+            self._drop(key)
+            evicted += 1
+        if evicted:
+            self._evicted_ttl += evicted
+            log.info("FSM sweep: evicted=%d %s", evicted, self.stats())
+
+    def _enforce_cap(self, keep: StorageKey) -> None:
+        if self.max_bytes <= 0:
+            return
+        while self._bytes > self.max_bytes and len(self._records) > 1:
+            key = next(iter(self._records))
+            if key == keep:
+                break
+            self._drop(key)
+            self._evicted_lru += 1
+
+    # ---------- BaseStorage ----------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        rec = self._get(key)
+        self._put(key, state, rec.blob if rec else b"")
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        rec = self._get(key)
+        return rec.state if rec else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        rec = self._get(key)
+        self._put(key, rec.state if rec else None, _dumps(data) if data else b"")
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        rec = self._get(key)
+        return _loads(rec.blob) if rec else {}
+
+    async def close(self) -> None:
+        log.info("FSM storage closed: %s", self.stats())
+        self._records.clear()
+        self._bytes = 0
+
+    # ---------- Statistika ----------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._records),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "evicted_ttl": self._evicted_ttl,
+            "evicted_lru": self._evicted_lru,
+        }
+
+
+# ===================== SQLite (write-behind) =====================
+_Entry = Tuple[Optional[str], bytes]   # (state, data_blob)
+
+
+def _key_str(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:" \
+           f"{key.business_connection_id or ''}:{key.destiny}"
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Diskdagi SQLite (WAL) FSM storage: restart/crash'dan keyin ham diagnostika va
+    hayvon sessiyalari saqlanib qoladi.
+
+    Write-behind: set_state/set_data faqat xotiradagi ``_dirty`` ga yozadi va darhol
+    qaytadi; fon task har ``flush_interval`` soniyada (yoki ``max_pending`` ta
+    o'zgarish yig'ilsa, darrov) bitta tranzaksiyada diskka yozadi. Bitta kalitning
+    ketma-ket o'zgarishlari bitta yozuvga birlashadi. O'qish: dirty -> flushing ->
+    LRU kesh -> disk (diskka faqat keshda yo'q sessiya uchun, thread'da).
+
+    Crash-consistency kafolati:
+      - har bir flush — bitta tranzaksiya; WAL tufayli u yo to'liq yoziladi, yo umuman
+        yozilmaydi. Sessiyaning state va data qismi bitta qatorda, shuning uchun
+        hech qachon "yangi state + eski data" aralashmasi tiklanmaydi;
+      - jarayon qulasa, eng ko'pi bilan oxirgi ``flush_interval`` ichidagi
+        (va yozilayotgan paket) o'zgarishlar yo'qoladi — foydalanuvchi bir-ikki qadam
+        oldingi holatdan davom etadi;
+      - synchronous=NORMAL: OS/elektr uzilishida ham baza buzilmaydi, faqat oxirgi
+        commit'lar yo'qolishi mumkin; ``close()`` qolgan hammasini yozib chiqadi.
+
+    ttl > 0 bo'lsa, shuncha vaqt yangilanmagan qatorlar davriy ravishda o'chiriladi.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        flush_interval: float = 0.5,
+        max_pending: int = 1000,
+        cache_size: int = 10_000,
+        ttl: float = 0,
+    ) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = float(flush_interval)
+        self.max_pending = int(max_pending)
+        self.cache_size = int(cache_size)
+        self.ttl = float(ttl)
+
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fsm ("
+            " key TEXT PRIMARY KEY,"
+            " state TEXT,"
+            " data BLOB NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db_lock = threading.Lock()
+
+        self._dirty: Dict[str, _Entry] = {}
+        self._flushing: Dict[str, _Entry] = {}
+        self._cache: "OrderedDict[str, _Entry]" = OrderedDict()
+        # diskdan o'qilayotgan kalitlar: [o'quvchilar soni, yozuvlar avlodi]
+        self._reads: Dict[str, List[int]] = {}
+        self._wakeup = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        self._closed = False
+        self._flushes = 0
+        self._rows_written = 0
+        self._last_prune = time.time()
+
+    # ---------- disk (thread ichida) ----------
+    def _read_row(self, k: str) -> Optional[_Entry]:
+        with self._db_lock:
+            row = self._conn.execute("SELECT state, data FROM fsm WHERE key = ?", (k,)).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def _write_batch(self, batch: Dict[str, _Entry]) -> None:
+        now = time.time()
+        upserts = [(k, st, blob, now) for k, (st, blob) in batch.items() if st is not None or blob]
+        deletes = [(k,) for k, (st, blob) in batch.items() if st is None and not blob]
+        with self._db_lock:
+            # IMMEDIATE: bir nechta jarayon (cluster worker'lar) bitta faylga yozganda
+            # yozish qulfi darhol olinadi va busy_timeout ishlaydi
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        "INSERT INTO fsm (key, state, data, updated_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET state = excluded.state, "
+                        "data = excluded.data, updated_at = excluded.updated_at",
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM fsm WHERE key = ?", deletes)
+                if self.ttl > 0 and now - self._last_prune > 60:
+                    self._last_prune = now
+                    self._conn.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # ---------- flush ----------
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._dirty or self._flushing:
+            return
+        self._flushing, self._dirty = self._dirty, {}
+        try:
+            await asyncio.to_thread(self._write_batch, self._flushing)
+            self._flushes += 1
+            self._rows_written += len(self._flushing)
+        except Exception as e:
+            log.exception("FSM sqlite flush failed (rows=%d): %s", len(self._flushing), e)
+            # yo'qotmaymiz: keyingi flush'da qayta urinamiz (yangiroq yozuvlar ustun)
+            for k, v in self._flushing.items():
+                self._dirty.setdefault(k, v)
+        finally:
+            self._flushing = {}
+
+    # ---------- kesh ----------
+    async def _load(self, key: StorageKey) -> _Entry:
+        k = _key_str(key)
+        for layer in (self._dirty, self._flushing):
+            if k in layer:
+                return layer[k]
+        entry = self._cache.get(k)
+        if entry is not None:
+            self._cache.move_to_end(k)
+            return entry
+        reads = self._reads.setdefault(k, [0, 0])
+        reads[0] += 1
+        gen = reads[1]
+        try:
+            entry = await asyncio.to_thread(self._read_row, k) or (None, b"")
+        finally:
+            reads[0] -= 1
+            if not reads[0]:
+                del self._reads[k]
+        if reads[1] != gen:
+            # thread kutilayotganda yozuv kelgan (flush bo'lib ulgurgan bo'lishi ham mumkin):
+            # o'qilgan qator eski, keshga qo'ymaymiz — yangi qiymatni qatlamlardan olamiz
+            return await self._load(key)
+        self._remember(k, entry)
+        return entry
+
+    def _remember(self, k: str, entry: _Entry) -> None:
+        self._cache[k] = entry
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _store(self, key: StorageKey, entry: _Entry) -> None:
+        k = _key_str(key)
+        reads = self._reads.get(k)
+        if reads is not None:
+            reads[1] += 1
+        self._dirty[k] = entry
+        self._remember(k, entry)
+        self._ensure_flusher()
+        if len(self._dirty) >= self.max_pending:
+            self._wakeup.set()
+
+    # ---------- BaseStorage ----------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        _, blob = await self._load(key)
+        self._store(key, (state, blob))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        state, _ = await self._load(key)
+        self._store(key, (state, _dumps(data) if data else b""))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, blob = await self._load(key)
+        return _loads(blob)
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._flusher is not None:
+            self._wakeup.set()
+            try:
+                await self._flusher
+            except Exception:
+                pass
+        await self.flush()
+        log.info("FSM sqlite closed: %s", self.stats())
+        with self._db_lock:
+            self._conn.close()
+
+    # ---------- Statistika ----------
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "pending": len(self._dirty),
+            "cached": len(self._cache),
+            "flushes": self._flushes,
+            "rows_written": self._rows_written,
+        }
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+
+from tg_ratelimit import INTERACTIVE, RateLimitCoordinator
+
+log = logging.getLogger("rate_limit")
+
+# Telegram limiti faqat xabar yuborish/o'zgartirishga taalluqli;
+# getUpdates, getChatMember, answerCallbackQuery va h.k. ruxsat kutmaydi.
+_LIMITED_PREFIXES = ("send", "copy", "forward", "edit")
+
+
+class CoordinatedRequestMiddleware(BaseRequestMiddleware):
+    """
+    Bot so'rovlari broadcast worker bilan umumiy bucket'dan (INTERACTIVE ustuvorlikda)
+    ruxsat oladi; 429 kelsa pauza hammaga tarqatiladi.
+    """
+
+    def __init__(self, coordinator: RateLimitCoordinator, priority: str = INTERACTIVE):
+        self.coordinator = coordinator
+        self.priority = priority
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[Any],
+        bot: Bot,
+        method: TelegramMethod[Any],
+    ) -> Response[Any]:
+        if method.__api_method__.startswith(_LIMITED_PREFIXES):
+            await self.coordinator.acquire(self.priority)
+        try:
+            return await make_request(bot, method)
+        except TelegramRetryAfter as e:
+            log.warning("429 on %s: retry_after=%s", method.__api_method__, e.retry_after)
+            self.coordinator.pause(e.retry_after)
+            raise
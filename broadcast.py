@@ -0,0 +1,614 @@
+"""
+Async broadcast engine for /notify/* (admin_app.py).
+
+- bitta pooled httpx.AsyncClient (keep-alive) va N ta parallel worker
+- global token bucket: Telegram ~30 msg/s limitidan BROADCAST_RESERVE_PERCENT (20%)
+  interaktiv bot uchun zaxira qoldiriladi (default 24/s); job o'z max_rate'ini berishi mumkin
+- per-chat interval: bitta chatga ketma-ket xabarlar orasida pauza
+- 429: retry_after bo'yicha butun bucket to'xtaydi va tezlik pasayadi (AIMD),
+  muvaffaqiyatli yuborishlar bilan asta-sekin tiklanadi; bitta so'rovga BROADCAST_MAX_429 dan
+  ko'p 429 kelsa, qabul qiluvchi transient xato bilan yopiladi (worker cheksiz band bo'lmaydi)
+- 5xx / tarmoq xatolari: qisqa backoff bilan qayta urinish
+- coordinator berilsa, har bir so'rov bot bilan umumiy bucket'dan (tg_ratelimit, BULK) ruxsat oladi
+- media URL Telegram'ga bir marta beriladi, qolganlarga file_id yuboriladi; keshdagi
+  file_id'ni Telegram rad etsa, u keshdan o'chiriladi va media URL orqali qayta yuklanadi
+
+Job formati (admin_app bilan bir xil):
+  {"method": "sendPhoto", "media_field": "photo", "media_url": "https://...",
+   "text_or_caption": "...", "parse_mode": "HTML", "disable_web_page_preview": None,
+   "cache_key": "/static/uploads/x.jpg"}
+Mavjud xabarni nusxalash (fayllar Telegram serverida qayta ishlatiladi):
+  {"method": "copyMessage", "from_chat_id": "@kanal", "message_id": 42}
+  {"method": "copyMessages", "from_chat_id": "@kanal", "message_ids": [42, 43, 44]}
+Albom (sendMediaGroup): caption birinchi elementga qo'yiladi
+  {"method": "sendMediaGroup", "text_or_caption": "...", "parse_mode": "HTML",
+   "media": [{"media_field": "photo", "media_url": "...", "cache_key": "..."}, ...]}
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, time as dtime, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Protocol, Tuple, Union
+from zoneinfo import ZoneInfo
+
+import httpx
+
+from tg_ratelimit import BULK, BROADCAST_RESERVE_PERCENT, TELEGRAM_RATE_BUDGET, RateLimitCoordinator
+
+log = logging.getLogger("broadcast")
+
+TG_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
+# Bitta bot token'ining umumiy limiti (TELEGRAM_RATE_BUDGET, ~30 msg/s). Uning
+# BROADCAST_RESERVE_PERCENT qismi interaktiv bot uchun qoldiriladi (tg_ratelimit.py).
+BROADCAST_RATE = float(
+    os.getenv("BROADCAST_RATE") or TELEGRAM_RATE_BUDGET * (1 - BROADCAST_RESERVE_PERCENT / 100)
+)                                                                                 # msg/s (global)
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "16"))  # ko'p ulanishda httpx pool sekinlashadi
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1.0"))  # s
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+# bitta so'rovga ketma-ket shuncha 429 kelsa — qabul qiluvchi transient xato bilan yopiladi
+BROADCAST_MAX_429 = int(os.getenv("BROADCAST_MAX_429", "5"))
+# Media avval shu chatga (masalan, yopiq kanal/guruh) bir marta yuboriladi va file_id olinadi.
+# Bo'sh bo'lsa — birinchi qabul qiluvchiga yuborilgan xabardan olinadi.
+BROADCAST_CACHE_CHAT_ID = os.getenv("BROADCAST_CACHE_CHAT_ID", "").strip()
+PRIME_ATTEMPTS = 5  # file_id olish uchun nechta qabul qiluvchini sinab ko'ramiz
+
+
+# Jadval: "23:00-08:00" (BROADCAST_TZ bo'yicha) oralig'ida broadcast yuborilmaydi.
+BROADCAST_TZ = ZoneInfo(os.getenv("BROADCAST_TZ", "Asia/Tashkent"))
+BROADCAST_QUIET_HOURS = os.getenv("BROADCAST_QUIET_HOURS", "").strip()
+
+
+# ===================== Schedule =====================
+def parse_quiet_hours(spec: Optional[str]) -> Optional[Tuple[dtime, dtime]]:
+    """'HH:MM-HH:MM' -> (boshlanish, tugash); bo'sh bo'lsa None. Xato formatda ValueError."""
+    if not spec or not spec.strip():
+        return None
+    start, sep, end = spec.strip().partition("-")
+    if not sep:
+        raise ValueError(f"quiet hours must look like 23:00-08:00, got {spec!r}")
+    return dtime.fromisoformat(start.strip()), dtime.fromisoformat(end.strip())
+
+
+def in_quiet_hours(spec: Optional[str], now: Optional[datetime] = None) -> bool:
+    window = parse_quiet_hours(spec)
+    if window is None:
+        return False
+    start, end = window
+    t = (now or datetime.now(BROADCAST_TZ)).timetz().replace(tzinfo=None)
+    if start <= end:
+        return start <= t < end
+    return t >= start or t < end  # yarim tundan o'tadigan oyna
+
+
+def to_utc_naive(dt: datetime) -> datetime:
+    """DB'dagi vaqtlar naive UTC; tz'siz kiritilgan vaqt BROADCAST_TZ bo'yicha deb olinadi."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=BROADCAST_TZ)
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# ===================== Rate limiting =====================
+class TokenBucket:
+    """
+    Oddiy token bucket. acquire() navbat bilan (FIFO) token beradi.
+    Narx capacity'dan katta bo'lishi mumkin (albom, copyMessages): bucket to'lishi
+    kutiladi, narx to'liq yechiladi va balans qarzga (manfiy) ketadi — keyingi
+    yuborish qarz qoplanguncha kutadi, shuning uchun o'rtacha tezlik rate'dan oshmaydi.
+    pause() — 429 kelganda hamma worker'larni retry_after davomida to'xtatadi.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+        self._ts = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        need = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= need:
+                    self._tokens -= tokens  # capacity'dan ortig'i — qarz
+                    return
+                await asyncio.sleep((need - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        now = time.monotonic()
+        if now >= self._paused_until:
+            # multiplicative decrease — bitta pauza oynasida bir marta
+            # (parallel so'rovlarning 429 lari ketma-ket kelishi mumkin)
+            self.rate = max(1.0, self.rate * 0.7)
+        self._paused_until = max(self._paused_until, now + seconds)
+        self._tokens = min(self._tokens, 0.0)  # qarz (albom/copyMessages) pauzadan keyin ham qoladi
+        self._ts = self._paused_until
+
+    def reward(self) -> None:
+        # additive increase (har muvaffaqiyatli yuborishda juda oz)
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 0.05)
+
+
+# ===================== Payload =====================
+def build_payload(job: Dict[str, Any], chat_id: int, disable_notification: bool) -> Dict[str, Any]:
+    data: Dict[str, Any] = {"chat_id": chat_id, "disable_notification": disable_notification}
+    if job["method"] == "sendMessage":
+        data["text"] = job.get("text_or_caption") or ""
+        if job.get("parse_mode"):
+            data["parse_mode"] = job["parse_mode"]
+        if job.get("disable_web_page_preview") is not None:
+            data["disable_web_page_preview"] = job["disable_web_page_preview"]
+    elif job["method"] == "copyMessage":
+        data["from_chat_id"] = job["from_chat_id"]
+        data["message_id"] = job["message_id"]
+        if job.get("text_or_caption"):
+            data["caption"] = job["text_or_caption"]
+            if job.get("parse_mode"):
+                data["parse_mode"] = job["parse_mode"]
+    elif job["method"] == "copyMessages":
+        data["from_chat_id"] = job["from_chat_id"]
+        data["message_ids"] = json.dumps(job["message_ids"])
+        if job.get("remove_caption"):
+            data["remove_caption"] = True
+    elif job["method"] == "sendMediaGroup":
+        media = []
+        for i, item in enumerate(job["media"]):
+            m: Dict[str, Any] = {"type": item["media_field"], "media": item["media_url"]}
+            if i == 0 and job.get("text_or_caption"):
+                m["caption"] = job["text_or_caption"]
+                if job.get("parse_mode"):
+                    m["parse_mode"] = job["parse_mode"]
+            media.append(m)
+        data["media"] = json.dumps(media, ensure_ascii=False)
+    else:
+        mf, mu = job.get("media_field"), job.get("media_url")
+        if mf and mu:
+            data[mf] = mu
+        if job.get("text_or_caption"):
+            data["caption"] = job["text_or_caption"]
+        if job.get("parse_mode"):
+            data["parse_mode"] = job["parse_mode"]
+    return data
+
+
+# ===================== Media file_id =====================
+class MediaCache(Protocol):
+    """cache_key (static yo'l yoki URL) + media turi -> Telegram file_id."""
+
+    async def get(self, key: str, kind: str) -> Optional[str]: ...
+
+    async def put(self, key: str, kind: str, file_id: str) -> None: ...
+
+    async def delete(self, key: str, kind: str) -> None: ...
+
+
+def extract_file_id(kind: str, message: Any) -> Optional[str]:
+    """sendPhoto/sendVideo/... javobidagi Message'dan file_id."""
+    if not isinstance(message, dict):
+        return None
+    obj = message.get(kind)
+    if kind == "photo" and isinstance(obj, list) and obj:
+        return obj[-1].get("file_id")  # eng katta o'lcham
+    if obj is None and kind == "document":
+        obj = message.get("animation")  # gif'lar animation bo'lib qaytadi
+    return obj.get("file_id") if isinstance(obj, dict) else None
+
+
+def _is_album(job: Dict[str, Any]) -> bool:
+    return job["method"] == "sendMediaGroup"
+
+
+def _media_items(job: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Job'dagi media elementlari: albomda — media ro'yxati, oddiy job'da — o'zi."""
+    return job["media"] if _is_album(job) else [job]
+
+
+def _replace_items(job: Dict[str, Any], items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {**job, "media": items} if _is_album(job) else items[0]
+
+
+def _messages(job: Dict[str, Any], res: CallResult) -> List[Any]:
+    if _is_album(job):
+        return res.result if isinstance(res.result, list) else []
+    return [res.result]
+
+
+def job_cost(job: Dict[str, Any]) -> int:
+    """
+    Global limit bo'yicha narxi: albomdagi (va copyMessages'dagi) har bir element alohida xabar.
+    copyMessages'da 100 tagacha bo'lishi mumkin — bucket capacity'sidan katta, qarzga yechiladi
+    (TokenBucket; tekshiruv: bench/bench_token_bucket.py).
+    """
+    if _is_album(job):
+        return len(job["media"])
+    if job["method"] == "copyMessages":
+        return len(job["message_ids"])
+    return 1
+
+
+def _item_needs_upload(item: Dict[str, Any]) -> bool:
+    return bool(item.get("media_field") and item.get("media_url") and item.get("cache_key") and not item.get("file_id"))
+
+
+def _needs_upload(job: Dict[str, Any]) -> bool:
+    return any(_item_needs_upload(it) for it in _media_items(job))
+
+
+def _with_file_id(item: Dict[str, Any], file_id: str, cached: bool = False) -> Dict[str, Any]:
+    # source_url — file_id rad etilsa qayta yuklash uchun; cached — hali tekshirilmagan kesh qiymati
+    return {**item, "media_url": file_id, "file_id": True, "source_url": item["media_url"], "cached": cached}
+
+
+def _uses_cached(job: Dict[str, Any]) -> bool:
+    return any(it.get("cached") for it in _media_items(job))
+
+
+# ===================== Engine =====================
+@dataclass
+class CallResult:
+    ok: bool
+    status: int = 0
+    description: str = ""
+    result: Any = None
+
+
+# Telegram xato javoblarini tasniflash:
+#   blocked     — foydalanuvchi botni bloklagan (403)
+#   unreachable — chat topilmadi / akkaunt o'chirilgan: bu chatga endi yuborib bo'lmaydi
+#   transient   — 429 / 5xx / tarmoq: retry'lardan keyin ham o'tmagan, keyin o'tishi mumkin
+#   failed      — so'rovning o'zi xato (masalan, noto'g'ri fayl): qabul qiluvchi aybdor emas
+BLOCKED, UNREACHABLE, TRANSIENT, FAILED = "blocked", "unreachable", "transient", "failed"
+
+_UNREACHABLE_MARKERS = (
+    "chat not found",
+    "user not found",
+    "user is deactivated",
+    "peer_id_invalid",
+    "bot can't initiate conversation",
+    "bot was kicked",
+)
+
+
+def classify_error(res: CallResult) -> str:
+    desc = (res.description or "").lower()
+    if res.status == 403 and "blocked" in desc:
+        return BLOCKED
+    if res.status in (400, 403) and any(m in desc for m in _UNREACHABLE_MARKERS):
+        return UNREACHABLE
+    if res.status == 403:
+        return BLOCKED
+    if res.status == 0 or res.status == 429 or res.status >= 500:
+        return TRANSIENT
+    return FAILED
+
+
+_BAD_FILE_ID_MARKERS = (
+    "wrong file identifier",
+    "wrong remote file identifier",
+    "file reference expired",
+    "file_reference_expired",
+)
+
+
+def is_bad_file_id(res: CallResult) -> bool:
+    """Telegram file_id'ni qabul qilmadi (eskirgan / boshqa bot'niki / buzilgan)."""
+    desc = (res.description or "").lower()
+    return not res.ok and res.status == 400 and any(m in desc for m in _BAD_FILE_ID_MARKERS)
+
+
+def is_permanent(res: CallResult) -> bool:
+    """Qabul qiluvchi keyingi broadcast'lardan chiqarilishi kerakmi."""
+    return not res.ok and classify_error(res) in (BLOCKED, UNREACHABLE)
+
+
+@dataclass
+class BroadcastStats:
+    targets: int = 0
+    sent: int = 0
+    failed: int = 0
+    unreachable: int = 0
+    calls: int = 0
+    rate_limited: int = 0
+    media_uploads: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return {
+            "targets": self.targets,
+            "sent": self.sent,
+            "failed": self.failed,
+            "unreachable": self.unreachable,
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "media_uploads": self.media_uploads,
+            "elapsed": round(elapsed, 3),
+            "msg_per_sec": round(self.calls / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+class Broadcaster:
+    """
+    Foydalanish:
+        async with Broadcaster(token) as b:
+            stats = await b.run(targets, jobs, disable_notification=False)
+    """
+
+    def __init__(
+        self,
+        token: str,
+        *,
+        rate: float = BROADCAST_RATE,
+        workers: int = BROADCAST_WORKERS,
+        per_chat_interval: float = BROADCAST_PER_CHAT_INTERVAL,
+        max_retries: int = BROADCAST_MAX_RETRIES,
+        max_429: int = BROADCAST_MAX_429,
+        api_base: str = TG_API_BASE,
+        media_cache: Optional[MediaCache] = None,
+        cache_chat_id: Optional[str] = BROADCAST_CACHE_CHAT_ID or None,
+        coordinator: Optional[RateLimitCoordinator] = None,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.coordinator = coordinator
+        self.media_cache = media_cache
+        self.cache_chat_id = cache_chat_id
+        self.workers = max(1, int(workers))
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.max_429 = max_429
+        self._base_url = f"{api_base}/bot{token}/"
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = BroadcastStats()
+
+    async def __aenter__(self) -> "Broadcaster":
+        self._client = httpx.AsyncClient(
+            base_url=self._base_url,
+            timeout=httpx.Timeout(30, connect=10),
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ---------- bitta API chaqiruv ----------
+    async def call(self, method: str, data: Dict[str, Any], cost: int = 1) -> CallResult:
+        assert self._client is not None, "use 'async with Broadcaster(...)'"
+        attempt = 0
+        throttled = 0
+        while True:
+            await self.bucket.acquire(cost)
+            if self.coordinator is not None:
+                await self.coordinator.acquire(BULK, cost)
+            self.stats.calls += 1
+            try:
+                resp = await self._client.post(method, data=data)
+                body = resp.json()
+            except (httpx.HTTPError, ValueError) as e:
+                if attempt < self.max_retries:
+                    attempt += 1
+                    await asyncio.sleep(min(2 ** attempt, 10))
+                    continue
+                return CallResult(False, 0, f"network: {e}")
+
+            if body.get("ok"):
+                self.bucket.reward()
+                return CallResult(True, resp.status_code, "", body.get("result"))
+
+            code = int(body.get("error_code") or resp.status_code)
+            desc = body.get("description", "")
+            if code == 429:
+                self.stats.rate_limited += 1
+                retry_after = float((body.get("parameters") or {}).get("retry_after") or 1)
+                self.bucket.pause(retry_after)
+                if self.coordinator is not None:
+                    self.coordinator.pause(retry_after)
+                log.warning("Broadcast 429: retry_after=%s, rate -> %.1f/s", retry_after, self.bucket.rate)
+                throttled += 1
+                if throttled > self.max_429:
+                    # worker cheksiz band bo'lmasin: TRANSIENT (ledger'da failed, xato matni bilan)
+                    return CallResult(False, code, desc or "Too Many Requests")
+                continue  # 429 oddiy urinish hisoblanmaydi
+            if code >= 500 and attempt < self.max_retries:
+                attempt += 1
+                await asyncio.sleep(min(2 ** attempt, 10))
+                continue
+            return CallResult(False, code, desc)
+
+    # ---------- bitta qabul qiluvchi ----------
+    async def send_to_chat(self, chat_id: int, jobs: List[Dict[str, Any]], disable_notification: bool) -> List[CallResult]:
+        results: List[CallResult] = []
+        for i, job in enumerate(jobs):
+            if i and self.per_chat_interval > 0:
+                await asyncio.sleep(self.per_chat_interval)
+            res = await self.call(job["method"], build_payload(job, chat_id, disable_notification), job_cost(job))
+            results.append(res)
+            if is_permanent(res):
+                break  # qolgan xabarlar ham yetib bormaydi
+            if is_bad_file_id(res) and _uses_cached(job):
+                break  # run() keshni tozalab, shu xabardan boshlab qayta yuboradi
+        return results
+
+    # ---------- media: bir marta yuklash ----------
+    async def _apply_cached(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.media_cache is None:
+            return jobs
+        out = []
+        for job in jobs:
+            items = []
+            for item in _media_items(job):
+                if _item_needs_upload(item):
+                    file_id = await self.media_cache.get(item["cache_key"], item["media_field"])
+                    if file_id:
+                        item = _with_file_id(item, file_id, cached=True)
+                items.append(item)
+            out.append(_replace_items(job, items))
+        return out
+
+    async def _drop_cached(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rad etilgan keshdagi file_id'lar: keshdan o'chirib, media URL'ga qaytaramiz."""
+        out = []
+        for job in jobs:
+            items = []
+            for item in _media_items(job):
+                if item.get("cached"):
+                    log.warning("Cached file_id rejected, re-uploading: %s %s", item["media_field"], item["cache_key"])
+                    if self.media_cache is not None:
+                        await self.media_cache.delete(item["cache_key"], item["media_field"])
+                    source = item["source_url"]
+                    item = {k: v for k, v in item.items() if k not in ("file_id", "source_url", "cached")}
+                    item["media_url"] = source
+                items.append(item)
+            out.append(_replace_items(job, items))
+        return out
+
+    async def _capture(self, jobs: List[Dict[str, Any]], results: List[CallResult]) -> List[Dict[str, Any]]:
+        out = []
+        for job, res in zip(jobs, results):
+            if _uses_cached(job) and res.ok:
+                # Telegram qabul qildi: qolganlarga tekshirilgan file_id
+                job = _replace_items(job, [{**it, "cached": False} for it in _media_items(job)])
+            if _needs_upload(job) and res.ok:
+                items = _media_items(job)
+                for i, message in enumerate(_messages(job, res)[:len(items)]):
+                    item = items[i]
+                    file_id = extract_file_id(item["media_field"], message) if _item_needs_upload(item) else None
+                    if file_id:
+                        self.stats.media_uploads += 1
+                        if self.media_cache is not None:
+                            await self.media_cache.put(item["cache_key"], item["media_field"], file_id)
+                        items = items[:i] + [_with_file_id(item, file_id)] + items[i + 1:]
+                job = _replace_items(job, items)
+            out.append(job)
+        return out + jobs[len(out):]
+
+    async def _upload_to_cache_chat(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        out = []
+        for job in jobs:
+            if _needs_upload(job):
+                payload = build_payload({**job, "text_or_caption": None}, self.cache_chat_id, True)
+                res = await self.call(job["method"], payload, job_cost(job))
+                if not res.ok:
+                    log.warning("Cache chat upload failed: %s %s", res.status, res.description)
+                job = (await self._capture([job], [res]))[0]
+            out.append(job)
+        return out
+
+    # ---------- fan-out ----------
+    async def run(
+        self,
+        targets: Union[Iterable[int], AsyncIterable[int]],
+        jobs: List[Dict[str, Any]],
+        disable_notification: bool = False,
+        on_result: Optional[Callable[[int, List[CallResult]], Awaitable[None]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        targets — oddiy yoki async iterator (masalan, DB'dan chunk-chunk o'qiladigan ledger).
+        on_result(chat_id, results) — har bir qabul qiluvchi tugagach chaqiriladi (ack uchun).
+
+        Media (cache_key bor job'lar) Telegram'ga faqat bir marta URL orqali beriladi:
+        keshdagi file_id, yoki cache chatga / birinchi qabul qiluvchiga yuborilgan
+        xabardan olingan file_id qolgan hammaga ishlatiladi.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+
+        async def send(chat_id: int, jobs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[CallResult]]:
+            results = await self.send_to_chat(chat_id, jobs, disable_notification)
+            k = len(results) - 1
+            if results and is_bad_file_id(results[k]) and _uses_cached(jobs[k]):
+                # keshdagi file_id rad etildi: keshni tozalab, shu xabardan boshlab URL bilan qayta
+                jobs = jobs[:k] + await self._drop_cached(jobs[k:])
+                results = results[:k] + await self.send_to_chat(chat_id, jobs[k:], disable_notification)
+            return jobs, results
+
+        async def deliver(chat_id: int, jobs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[CallResult]]:
+            jobs, results = await send(chat_id, jobs)
+            if all(r.ok for r in results):
+                self.stats.sent += 1
+            else:
+                bad = next(r for r in results if not r.ok)
+                if is_permanent(bad):
+                    self.stats.unreachable += 1
+                else:
+                    self.stats.failed += 1
+                log.info("Broadcast failed: chat=%s code=%s %s", chat_id, bad.status, bad.description)
+            if on_result is not None:
+                await on_result(chat_id, results)
+            return jobs, results
+
+        async def worker() -> None:
+            while True:
+                chat_id = await queue.get()
+                try:
+                    if chat_id is None:
+                        return
+                    await deliver(chat_id, jobs)
+                except Exception as e:
+                    log.exception("Broadcast worker error: chat=%s err=%s", chat_id, e)
+                finally:
+                    queue.task_done()
+
+        async def iterate() -> AsyncIterator[int]:
+            if hasattr(targets, "__aiter__"):
+                async for chat_id in targets:  # type: ignore[union-attr]
+                    yield chat_id
+            else:
+                for chat_id in targets:  # type: ignore[union-attr]
+                    yield chat_id
+
+        it = iterate()
+        jobs = await self._apply_cached(jobs)
+        if any(_needs_upload(j) for j in jobs) and self.cache_chat_id:
+            jobs = await self._upload_to_cache_chat(jobs)
+        # cache chat yo'q (yoki xato): birinchi qabul qiluvchilar orqali file_id olamiz;
+        # keshdagi file_id'lar ham shu yerda birinchi yuborishda tekshiriladi
+        attempts = 0
+        while any(_needs_upload(j) or _uses_cached(j) for j in jobs) and attempts < PRIME_ATTEMPTS:
+            try:
+                chat_id = await it.__anext__()
+            except StopAsyncIteration:
+                break
+            self.stats.targets += 1
+            attempts += 1
+            try:
+                jobs = await self._capture(*await deliver(chat_id, jobs))
+            except Exception as e:
+                # worker'dagidek: bitta qabul qiluvchi (yoki ack/kesh yozuvi) xatosi job'ni to'xtatmaydi
+                log.exception("Broadcast worker error: chat=%s err=%s", chat_id, e)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            async for chat_id in it:
+                self.stats.targets += 1
+                await queue.put(chat_id)
+            for _ in tasks:
+                await queue.put(None)
+            await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+        self.stats.finished = time.monotonic()
+        summary = self.stats.as_dict()
+        log.info("Broadcast done: %s", summary)
+        return summary
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Broadcast worker: admin_app.py navbatga qo'ygan BroadcastJob'larni yuboradi.
+
+- API server (uvicorn) yuborishda qatnashmaydi: /notify/* faqat job + ledger yozadi.
+- Qabul qiluvchilar ro'yxati oldindan yig'ilmaydi: job'dagi filter bo'yicha BotUser
+  id tartibida chunk-chunk (keyset) o'qiladi va ledger'ga qo'shiladi; kursor
+  (BroadcastJob.cursor) shu tranzaksiyada saqlanadi.
+- Har bir qabul qiluvchi natijasi BroadcastRecipient ledger'iga yoziladi
+  (pending -> sent | failed | blocked | unreachable), paket-paket bitta tranzaksiyada.
+- blocked/unreachable bo'lganlar shu tranzaksiyada BotUser.unreachable deb belgilanadi
+  va keyingi broadcast'larga kirmaydi (foydalanuvchi /start bossa, upsert tiklaydi).
+- Crash/restart: status=running qolgan job qayta olinadi va faqat hali
+  'pending' bo'lganlarga yuboriladi, ya'ni oxirgi tasdiqlangan (ack) joydan davom etadi.
+  Kafolat at-least-once: yuborilgan, lekin ack'i diskka yetmagan
+  oxirgi paket (ACK_BATCH / ACK_INTERVAL) qayta yuborilishi mumkin.
+- pause/cancel (API orqali) bir soniya ichida seziladi.
+- Jadval: not_before kelmagan yoki quiet_hours (job'niki, bo'lmasa BROADCAST_QUIET_HOURS)
+  ichidagi job olinmaydi; yuborish paytida tinch soat boshlansa job to'xtab turadi
+  va oyna tugagach o'sha joydan davom etadi. Tezlik: min(BROADCAST_RATE, job.max_rate).
+- Har bir so'rov bot bilan umumiy limitdan (tg_ratelimit.py, BULK) ruxsat oladi:
+  interaktiv javoblar doim oldinda.
+- Media fayl Telegram'ga bir marta yuklanadi; olingan file_id MediaFileId jadvalida
+  saqlanadi va keyingi broadcast'larda ham qayta ishlatiladi (kalitda fayl sha256'i bor;
+  Telegram rad etgan file_id jadvaldan o'chiriladi va fayl qayta yuklanadi).
+
+Faqat BITTA worker ishga tushiring.
+
+Run:
+  export TELEGRAM_BOT_TOKEN="12345:ABCDE"
+  python broadcast_worker.py
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlmodel import Session, select, func, or_
+
+from admin_app import (
+    engine, init_db, target_query,
+    BotUser, BroadcastJob, BroadcastRecipient, JobStatus, RecipientStatus, MediaFileId,
+    PREF_BOT_TOKEN_ENV, ALT_BOT_TOKEN_ENV,
+)
+from tg_ratelimit import RateLimitCoordinator
+from broadcast import (
+    Broadcaster, CallResult, classify_error, in_quiet_hours,
+    BLOCKED, UNREACHABLE, BROADCAST_QUIET_HOURS, BROADCAST_RATE,
+)
+
+log = logging.getLogger("broadcast_worker")
+
+POLL_INTERVAL = float(os.getenv("BROADCAST_POLL_INTERVAL", "2"))   # bo'sh navbatda kutish
+CHUNK = int(os.getenv("BROADCAST_CHUNK", "500"))                   # ledger'dan bir martada o'qish
+ACK_BATCH = int(os.getenv("BROADCAST_ACK_BATCH", "200"))
+ACK_INTERVAL = float(os.getenv("BROADCAST_ACK_INTERVAL", "1.0"))
+STATUS_CHECK_INTERVAL = 1.0
+
+
+def _bot_token() -> str:
+    token = os.getenv(PREF_BOT_TOKEN_ENV, "").strip() or os.getenv(ALT_BOT_TOKEN_ENV, "").strip()
+    if not token:
+        raise RuntimeError(f"{PREF_BOT_TOKEN_ENV} is not set (also checked {ALT_BOT_TOKEN_ENV})")
+    return token
+
+
+# ===================== DB (sync, thread ichida chaqiriladi) =====================
+@dataclass
+class ClaimedJob:
+    id: int
+    jobs: List[Dict[str, Any]]
+    disable_notification: bool
+    rate: float
+    quiet_hours: Optional[str]
+
+
+def _claim_next_job() -> Optional[ClaimedJob]:
+    """
+    Avval uzilib qolgan (running), keyin eng eski queued job — vaqti kelgan
+    (not_before) va hozir tinch soat bo'lmaganlari orasidan.
+    """
+    with Session(engine) as s:
+        candidates = s.exec(
+            select(BroadcastJob)
+            .where(
+                BroadcastJob.status.in_([JobStatus.running, JobStatus.queued]),
+                or_(BroadcastJob.not_before.is_(None), BroadcastJob.not_before <= datetime.utcnow()),
+            )
+            .order_by((BroadcastJob.status == JobStatus.running).desc(), BroadcastJob.id)
+        ).all()
+        job = next((j for j in candidates if not in_quiet_hours(j.quiet_hours or BROADCAST_QUIET_HOURS)), None)
+        if not job:
+            return None
+        if job.status == JobStatus.queued:
+            job.status = JobStatus.running
+            job.started_at = job.started_at or datetime.utcnow()
+            s.add(job)
+            s.commit()
+        else:
+            log.info("Resuming interrupted job %s", job.id)
+        rate = min(BROADCAST_RATE, job.max_rate) if job.max_rate else BROADCAST_RATE
+        return ClaimedJob(
+            job.id, json.loads(job.payload), job.disable_notification,
+            rate, job.quiet_hours or BROADCAST_QUIET_HOURS,
+        )
+
+
+def _job_status(job_id: int) -> Optional[JobStatus]:
+    with Session(engine) as s:
+        job = s.get(BroadcastJob, job_id)
+        return job.status if job else None
+
+
+def _expand_chunk(job_id: int, limit: int) -> int:
+    """Filter bo'yicha navbatdagi BotUser'larni ledger'ga qo'shadi; qo'shilganlar soni."""
+    with Session(engine) as s:
+        job = s.get(BroadcastJob, job_id)
+        if not job or job.targets_ready:
+            return 0
+        rows = s.exec(
+            target_query(json.loads(job.target_filter or "{}"))
+            .where(BotUser.id > job.cursor)
+            .order_by(BotUser.id)
+            .limit(limit)
+        ).all()
+        if rows:
+            s.connection().exec_driver_sql(
+                "INSERT INTO broadcastrecipient (job_id, chat_id, status, error) VALUES (?, ?, 'pending', '')",
+                [(job_id, tg_id) for _, tg_id in rows],
+            )
+            job.cursor = rows[-1][0]
+        else:
+            job.targets_ready = True
+            job.total = s.exec(
+                select(func.count()).select_from(BroadcastRecipient).where(BroadcastRecipient.job_id == job_id)
+            ).one()
+        s.add(job)
+        s.commit()
+        return len(rows)
+
+
+def _pending_chunk(job_id: int, after_id: int, limit: int) -> List[Tuple[int, int]]:
+    with Session(engine) as s:
+        return list(s.exec(
+            select(BroadcastRecipient.id, BroadcastRecipient.chat_id)
+            .where(
+                BroadcastRecipient.job_id == job_id,
+                BroadcastRecipient.status == RecipientStatus.pending,
+                BroadcastRecipient.id > after_id,
+            )
+            .order_by(BroadcastRecipient.id)
+            .limit(limit)
+        ).all())
+
+
+def _write_acks(rows: List[Tuple[str, str, str, int]], dead: List[Tuple[str, int]]) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE broadcastrecipient SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            rows,
+        )
+        if dead:
+            conn.exec_driver_sql(
+                "UPDATE botuser SET unreachable = 1, unreachable_at = ? WHERE tg_id = ? AND unreachable = 0",
+                dead,
+            )
+
+
+def _finish_job(job_id: int) -> None:
+    with Session(engine) as s:
+        job = s.get(BroadcastJob, job_id)
+        if not job or job.status != JobStatus.running or not job.targets_ready:
+            return  # pause/cancel qilingan
+        pending = s.exec(
+            select(func.count()).select_from(BroadcastRecipient).where(
+                BroadcastRecipient.job_id == job_id,
+                BroadcastRecipient.status == RecipientStatus.pending,
+            )
+        ).one()
+        if pending == 0:
+            job.status = JobStatus.done
+            job.finished_at = datetime.utcnow()
+            s.add(job)
+            s.commit()
+
+
+def _get_file_id(cache_key: str, kind: str) -> Optional[str]:
+    with Session(engine) as s:
+        return s.exec(
+            select(MediaFileId.file_id).where(MediaFileId.cache_key == cache_key, MediaFileId.kind == kind)
+        ).first()
+
+
+def _put_file_id(cache_key: str, kind: str, file_id: str) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO mediafileid (cache_key, kind, file_id, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (cache_key, kind) DO UPDATE SET file_id = excluded.file_id, created_at = excluded.created_at",
+            (cache_key, kind, file_id, datetime.utcnow().isoformat(" ")),
+        )
+
+
+def _delete_file_id(cache_key: str, kind: str) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM mediafileid WHERE cache_key = ? AND kind = ?", (cache_key, kind))
+
+
+class DbMediaCache:
+    """broadcast.MediaCache: MediaFileId jadvali."""
+
+    async def get(self, key: str, kind: str) -> Optional[str]:
+        return await asyncio.to_thread(_get_file_id, key, kind)
+
+    async def put(self, key: str, kind: str, file_id: str) -> None:
+        await asyncio.to_thread(_put_file_id, key, kind, file_id)
+        log.info("Cached file_id: %s %s", kind, key)
+
+    async def delete(self, key: str, kind: str) -> None:
+        await asyncio.to_thread(_delete_file_id, key, kind)
+        log.info("Dropped cached file_id: %s %s", kind, key)
+
+
+# ===================== Ledger =====================
+def classify(results: List[CallResult]) -> Tuple[RecipientStatus, str]:
+    bad = next((r for r in results if not r.ok), None)
+    if bad is None:
+        return RecipientStatus.sent, ""
+    error = f"{bad.status}: {bad.description}"[:300]
+    kind = classify_error(bad)
+    if kind == BLOCKED:
+        return RecipientStatus.blocked, error
+    if kind == UNREACHABLE:
+        return RecipientStatus.unreachable, error
+    return RecipientStatus.failed, error
+
+
+class Ledger:
+    """Bitta job uchun: pending'larni oqim qilib beradi va natijalarni paket-paket yozadi."""
+
+    def __init__(self, job_id: int, quiet_hours: Optional[str] = None):
+        self.job_id = job_id
+        self.quiet_hours = quiet_hours
+        self._rid_by_chat: Dict[int, int] = {}
+        self._acks: List[Tuple[str, str, str, int]] = []
+        self._dead: List[Tuple[str, int]] = []
+        self._last_flush = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.stopped_by: Optional[str] = None
+
+    async def targets(self) -> AsyncIterator[int]:
+        after_id = 0
+        last_check = 0.0
+        while True:
+            rows = await asyncio.to_thread(_pending_chunk, self.job_id, after_id, CHUNK)
+            if not rows:
+                # ledger'dagi pending'lar tugadi — filter bo'yicha keyingi chunk
+                if await asyncio.to_thread(_expand_chunk, self.job_id, CHUNK):
+                    continue
+                return
+            for rid, chat_id in rows:
+                now = time.monotonic()
+                if now - last_check >= STATUS_CHECK_INTERVAL:
+                    last_check = now
+                    status = await asyncio.to_thread(_job_status, self.job_id)
+                    if status != JobStatus.running:
+                        self.stopped_by = status
+                        log.info("Job %s stopped: %s", self.job_id, status)
+                        return
+                    if in_quiet_hours(self.quiet_hours):
+                        self.stopped_by = "quiet_hours"
+                        log.info("Job %s paused for quiet hours (%s)", self.job_id, self.quiet_hours)
+                        return
+                self._rid_by_chat[chat_id] = rid
+                yield chat_id
+                after_id = rid
+
+    async def on_result(self, chat_id: int, results: List[CallResult]) -> None:
+        status, error = classify(results)
+        rid = self._rid_by_chat.pop(chat_id)
+        now = datetime.utcnow().isoformat(" ")
+        self._acks.append((status.value, error, now, rid))
+        if status in (RecipientStatus.blocked, RecipientStatus.unreachable):
+            self._dead.append((now, chat_id))
+        if len(self._acks) >= ACK_BATCH or time.monotonic() - self._last_flush >= ACK_INTERVAL:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._acks:
+                return
+            batch, self._acks = self._acks, []
+            dead, self._dead = self._dead, []
+            self._last_flush = time.monotonic()
+            await asyncio.to_thread(_write_acks, batch, dead)
+
+
+# ===================== Main loop =====================
+_coordinator: Optional[RateLimitCoordinator] = None
+
+
+def _get_coordinator() -> RateLimitCoordinator:
+    global _coordinator
+    if _coordinator is None:
+        _coordinator = RateLimitCoordinator()
+    return _coordinator
+
+
+async def run_job(claimed: ClaimedJob) -> None:
+    ledger = Ledger(claimed.id, claimed.quiet_hours)
+    log.info("Job %s started: rate=%.1f/s", claimed.id, claimed.rate)
+    try:
+        async with Broadcaster(
+            _bot_token(), rate=claimed.rate, media_cache=DbMediaCache(), coordinator=_get_coordinator()
+        ) as b:
+            summary = await b.run(
+                ledger.targets(), claimed.jobs, claimed.disable_notification, on_result=ledger.on_result
+            )
+    finally:
+        await ledger.flush()
+    await asyncio.to_thread(_finish_job, claimed.id)
+    log.info("Job %s: %s", claimed.id, summary)
+
+
+async def main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # har bir so'rovni loglamasin
+    init_db()
+    _bot_token()
+    log.info("Broadcast worker started")
+    while True:
+        claimed = await asyncio.to_thread(_claim_next_job)
+        if claimed is None:
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+        try:
+            await run_job(claimed)
+        except Exception as e:
+            log.exception("Job %s crashed: %s", claimed.id, e)
+            await asyncio.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+"""
+Umumiy fixture'lar. admin_app sozlamalarni import paytida o'qiydi — env shu yerda,
+import'dan oldin: baza vaqtinchalik papkada, repo'dagi data/app.db'ga tegilmaydi.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+API_KEY = "test-key"
+
+_tmp = tempfile.TemporaryDirectory(prefix="admin-tests-")
+os.environ["ADMIN_DB_PATH"] = str(Path(_tmp.name) / "app.db")
+os.environ["ADMIN_API_KEY"] = API_KEY
+
+for path in (ROOT, ROOT / "bot"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(scope="session")
+def admin_app():
+    import admin_app
+
+    admin_app.init_db()
+    return admin_app
+
+
+@pytest.fixture
+async def client(admin_app):
+    # ASGITransport startup/shutdown chaqirmaydi: baza admin_app fixture'da tayyorlangan
+    transport = httpx.ASGITransport(app=admin_app.app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://admin.test", headers={"X-API-Key": API_KEY}
+    ) as c:
+        yield c
+    # aiosqlite ulanishlari va change feed shu test'ning event loop'iga bog'langan
+    await admin_app.change_feed.stop()
+    await admin_app.async_engine.dispose()
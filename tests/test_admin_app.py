@@ -0,0 +1,305 @@
+import json
+import time
+import types
+import zlib
+import asyncio
+from datetime import datetime
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+def lesson(code: str, **extra):
+    return {"code": code, "title": f"Dars {code}", "text": "", "pdf_path": "", "enabled": True, **extra}
+
+
+# ===================== /stats =====================
+async def test_stats_invalidated_by_writes(client):
+    before = (await client.get("/stats")).json()
+    created = (await client.post("/darslik", json=lesson("ST-1", enabled=False))).json()
+    user = (await client.post("/users", json={"tg_id": 880001, "username": "st_user"})).json()
+    await client.post(f"/users/{user['id']}/block")
+
+    after = (await client.get("/stats")).json()  # TTL tugashini kutmasdan
+    assert after["totals"]["darslik"] == before["totals"]["darslik"] + 1
+    assert after["totals"]["darslik_enabled"] == before["totals"]["darslik_enabled"]
+    assert after["totals"]["users"] == before["totals"]["users"] + 1
+    assert after["totals"]["users_blocked"] == before["totals"]["users_blocked"] + 1
+    assert after["users_by_role"]["user"] == before["users_by_role"]["user"] + 1
+
+    await client.delete(f"/darslik/{created['id']}")
+    assert (await client.get("/stats")).json()["totals"]["darslik"] == before["totals"]["darslik"]
+
+
+async def test_stats_cached_between_writes(client, admin_app, monkeypatch):
+    await client.get("/stats")
+    calls = 0
+    real = admin_app._compute_stats
+
+    async def counting():
+        nonlocal calls
+        calls += 1
+        return await real()
+
+    monkeypatch.setattr(admin_app, "_compute_stats", counting)
+    for _ in range(3):
+        await client.get("/stats")
+    assert calls == 0
+
+
+async def test_stats_computed_during_write_is_not_cached(client, admin_app, monkeypatch):
+    admin_app.invalidate_stats()
+    real = admin_app._compute_stats
+
+    async def racing():
+        value = await real()
+        admin_app.invalidate_stats()  # hisob paytida boshqa so'rov commit qildi
+        return value
+
+    monkeypatch.setattr(admin_app, "_compute_stats", racing)
+    await client.get("/stats")
+    assert admin_app._stats_cache["value"] is None
+
+
+# ===================== Export snapshots: ETag / 304 =====================
+async def test_export_etag_and_304(client):
+    first = await client.get("/export/diagnostika", headers={"Accept-Encoding": "identity"})
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    again = await client.get(
+        "/export/diagnostika", headers={"If-None-Match": etag, "Accept-Encoding": "identity"}
+    )
+    assert again.status_code == 304 and again.content == b""
+    weak = await client.get(
+        "/export/diagnostika", headers={"If-None-Match": f'"x", W/{etag}', "Accept-Encoding": "identity"}
+    )
+    assert weak.status_code == 304
+
+    await client.post(
+        "/diagnostika", json={"phrase": "Olma Anor Uzum", "image_path": "/static/images/olma.png", "sort_order": 99}
+    )
+    changed = await client.get(
+        "/export/diagnostika", headers={"If-None-Match": etag, "Accept-Encoding": "identity"}
+    )
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert int(changed.headers["X-Content-Version"]) > int(first.headers["X-Content-Version"])
+    assert {"phrase": "Olma Anor Uzum", "image_url": "/static/images/olma.png"} in changed.json()
+
+
+
+# ===================== /export/version, /export/changes =====================
+async def test_changes_long_poll_wakes_on_commit(client):
+    start = (await client.get("/export/version")).json()
+    since = start["last_change"]
+
+    idle = (await client.get("/export/changes", params={"since": since, "timeout": 0})).json()
+    assert idle["changes"] == [] and idle["last_change"] == since and not idle["reset"]
+
+    waiter = asyncio.create_task(client.get("/export/changes", params={"since": since, "timeout": 10}))
+    await asyncio.sleep(0.2)
+    assert not waiter.done()
+    t0 = time.monotonic()
+    await client.post("/darslik", json=lesson("CF-1"))
+    feed = (await asyncio.wait_for(waiter, 5)).json()
+    assert time.monotonic() - t0 < 2  # EXPORT_CHANGES_POLL ni emas, commit'ni kutadi
+
+    assert [c["collection"] for c in feed["changes"]] == ["darslik"]
+    assert feed["last_change"] == feed["changes"][-1]["id"] > since
+    assert feed["versions"]["darslik"] == start["versions"]["darslik"] + 1
+
+
+async def test_changes_one_entry_per_collection_per_commit(client):
+    since = (await client.get("/export/version")).json()["last_change"]
+    q = (await client.post("/hayvonq", json={"key": "cf_q1", "title": "Mushuk", "audio_path": "a.mp3"})).json()
+    await client.post(
+        f"/hayvonq/{q['id']}/options", json={"opt_key": "cf_A", "image_path": "a.png", "is_correct": True}
+    )
+    feed = (await client.get("/export/changes", params={"since": since, "timeout": 0})).json()
+    assert [c["collection"] for c in feed["changes"]] == ["hayvonq", "hayvonq"]
+    assert [c["version"] for c in feed["changes"]] == sorted(c["version"] for c in feed["changes"])
+
+
+async def test_changes_reset_when_cursor_is_ahead(client):
+    last = (await client.get("/export/version")).json()["last_change"]
+    feed = (await client.get("/export/changes", params={"since": last + 1000, "timeout": 5})).json()
+    assert feed["reset"] is True
+    assert feed["last_change"] == last
+
+
+async def test_export_gzip_variant_has_own_etag(client):
+    for i in range(40):  # gzip chegarasidan (1 KiB) katta bo'lsin
+        await client.post("/diagnostika", json={"phrase": f"Gz {i} " * 5, "image_path": f"g{i}.png"})
+    plain = await client.get("/export/diagnostika", headers={"Accept-Encoding": "identity"})
+    gz = await client.get("/export/diagnostika", headers={"Accept-Encoding": "gzip"})
+    assert gz.headers["Content-Encoding"] == "gzip"
+    assert gz.headers["ETag"] != plain.headers["ETag"]
+    assert gz.json() == plain.json()
+    r = await client.get(
+        "/export/diagnostika", headers={"If-None-Match": plain.headers["ETag"], "Accept-Encoding": "gzip"}
+    )
+    assert r.status_code == 200
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip", True),
+        ("br, gzip;q=0.5", True),
+        ("gzip;q=0", False),
+        ("*", True),
+        ("identity", False),
+        ("", False),
+        ("gzip;q=abc", False),
+    ],
+)
+def test_accepts_gzip(admin_app, header, expected):
+    request = types.SimpleNamespace(headers={"accept-encoding": header})
+    assert admin_app.accepts_gzip(request) is expected
+
+
+def test_dumps_handles_datetime_and_enum(admin_app):
+    at = datetime(2024, 5, 1, 12, 0, 0, 123456)
+    body = admin_app.dumps({"at": at, "role": admin_app.UserRole.admin, "s": "o‘zbek"})
+    assert json.loads(body) == {"at": "2024-05-01T12:00:00.123456", "role": "admin", "s": "o‘zbek"}
+
+
+# ===================== Keyset pagination =====================
+def seed_users(admin_app, prefix: str, n: int, created_at: str = "2024-02-02 10:00:00.000000", start: int = 0):
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, '', 'user', 0, '', ?, 0)",
+            [(zlib.crc32(prefix.encode()) * 1000 + i, f"{prefix}{i:03d}", created_at) for i in range(start, start + n)],
+        )
+
+
+async def all_pages(client, path, params):
+    items, pages, params = [], 0, dict(params)
+    while True:
+        r = await client.get(path, params=params)
+        assert r.status_code == 200
+        items += r.json()
+        pages += 1
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            return items, pages
+        assert f"cursor={cursor}" in r.headers["Link"]
+        params["cursor"] = cursor
+
+
+async def test_cursor_pages_cover_ties_exactly_once(client, admin_app):
+    seed_users(admin_app, "pg47a_", 25)  # hammasining created_at bir xil — id hal qiladi
+    items, pages = await all_pages(client, "/users", {"username": "pg47a_", "limit": 10})
+    assert pages == 3
+    ids = [u["id"] for u in items]
+    assert ids == sorted(ids, reverse=True) and len(set(ids)) == 25
+
+
+async def test_cursor_is_stable_under_inserts(client, admin_app):
+    seed_users(admin_app, "pg47b_", 20)
+    first = await client.get("/users", params={"username": "pg47b_", "limit": 10})
+    seed_users(admin_app, "pg47b_", 5, created_at="2030-01-01 00:00:00.000000", start=100)  # yangi, boshiga
+    rest, _ = await all_pages(
+        client, "/users", {"username": "pg47b_", "limit": 10, "cursor": first.headers["X-Next-Cursor"]}
+    )
+    names = [u["username"] for u in first.json() + rest]
+    assert sorted(names) == [f"pg47b_{i:03d}" for i in range(20)]  # tushib qolgan ham, takror ham yo'q
+
+
+async def test_unpaged_request_returns_everything(client, admin_app):
+    seed_users(admin_app, "pg47c_", 15)
+    r = await client.get("/users", params={"username": "pg47c_"})
+    assert len(r.json()) == 15
+    assert "X-Next-Cursor" not in r.headers
+
+
+async def test_field_projection_and_bad_input(client, admin_app):
+    seed_users(admin_app, "pg47d_", 3)
+    r = await client.get("/users", params={"username": "pg47d_", "fields": "id,username", "limit": 2})
+    assert [set(u) for u in r.json()] == [{"id", "username"}] * 2
+    assert (await client.get("/users", params={"fields": "id,password"})).status_code == 400
+    assert (await client.get("/users", params={"cursor": "not-a-cursor"})).status_code == 400
+    assert (await client.get("/users", params={"cursor": admin_app.encode_cursor([1])})).status_code == 400
+
+
+# ===================== List filters / FTS search =====================
+def insert_users(admin_app, rows):
+    """rows: (tg_id, username, full_name, role, created_at)"""
+    with admin_app.engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+            "VALUES (?, ?, ?, ?, 0, '', ?, 0)",
+            rows,
+        )
+
+
+async def test_list_filters_keep_substring_semantics(client, admin_app):
+    insert_users(admin_app, [
+        (480001, "x_alice48", "", "user", "2024-03-01 00:00:00"),
+        (480002, "malice48", "", "user", "2024-03-01 00:00:01"),
+        (480003, "alice48", "", "user", "2024-03-01 00:00:02"),
+        (480004, "bob48", "", "user", "2024-03-01 00:00:03"),
+    ])
+    r = await client.get("/users", params={"username": "lice48"})
+    assert sorted(u["username"] for u in r.json()) == ["alice48", "malice48", "x_alice48"]
+
+    await client.post("/darslik", json=lesson("MAT-48-7", title="Algebra asoslari"))
+    assert [d["code"] for d in (await client.get("/darslik", params={"code": "48-7"})).json()] == ["MAT-48-7"]
+    assert [d["code"] for d in (await client.get("/darslik", params={"title": "gebra as"})).json()] == ["MAT-48-7"]
+
+
+async def test_search_ranks_by_bm25_over_all_matches(client, admin_app):
+    # eng mos qator — eng eskisi: LIMIT tartiblashdan oldin qo'llansa tushib qolardi
+    insert_users(admin_app, [(481000, "qodir48", "Qodir48 Qodirov48", "user", "2020-01-01 00:00:00")])
+    insert_users(admin_app, [
+        (481001 + i, f"u48_{i}", f"Qodir48 Ismoilov{i}", "user", f"2024-04-01 00:{i // 60:02d}:{i % 60:02d}")
+        for i in range(300)
+    ])
+    insert_users(admin_app, [(481999, "t48", "Qodir48 Teacher", "teacher", "2019-01-01 00:00:00")])
+
+    r = await client.get("/users/search", params={"q": "qodir48", "limit": 5})
+    assert r.status_code == 200 and len(r.json()) == 5
+    assert r.json()[0]["username"] == "qodir48"
+
+    # role filtri tartiblash ichida: mos kelgan yagona o'qituvchi limitdan tashqarida qolmaydi
+    teachers = (await client.get("/users/search", params={"q": "qodir48", "role": "teacher", "limit": 5})).json()
+    assert [u["username"] for u in teachers] == ["t48"]
+
+
+async def test_search_prefix_words_and_odd_input(client, admin_app):
+    insert_users(admin_app, [(482001, "gulnora48", "Gulnora Karimova48", "user", "2024-05-01 00:00:00")])
+    found = (await client.get("/users/search", params={"q": "gul kari", "fields": "username"})).json()
+    assert {"username": "gulnora48"} in found
+    for q in ['"', "***", 'gul"nora', "a OR b", "NEAR(x y)"]:
+        r = await client.get("/users/search", params={"q": q})
+        assert r.status_code == 200, q
+    assert (await client.get("/users/search", params={"q": "  "})).json() == []
+
+
+# ===================== /darslik/search =====================
+async def test_lesson_search_snippet_and_version_cache(client):
+    await client.post("/darslik", json=lesson(
+        "FIZ-49", title="Optika", text="Yorug'lik sinishi <script>alert(1)</script> linzalar49 orqali o'rganiladi",
+    ))
+    await client.post("/darslik", json=lesson("FIZ-49-OFF", title="Linzalar49 yopiq", enabled=False))
+    params = {"q": "linzalar49", "enabled": "true", "fields": "code,title"}
+
+    r = await client.get("/darslik/search", params=params)
+    assert [d["code"] for d in r.json()] == ["FIZ-49"]
+    snippet = r.json()[0]["snippet"]
+    assert "<b>linzalar49</b>" in snippet
+    assert "<script>" not in snippet and "&lt;script&gt;" in snippet
+    assert set(r.json()[0]) == {"code", "title", "snippet"}
+
+    etag = r.headers["ETag"]
+    assert (await client.get("/darslik/search", params=params, headers={"If-None-Match": etag})).status_code == 304
+
+    await client.post("/darslik", json=lesson("FIZ-49-2", title="Linzalar49 turlari"))
+    r = await client.get("/darslik/search", params=params, headers={"If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()[0]["code"] == "FIZ-49-2"  # title og'irligi text'dan katta
+    assert {d["code"] for d in r.json()} == {"FIZ-49", "FIZ-49-2"}
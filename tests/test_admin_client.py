@@ -0,0 +1,59 @@
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils import admin_client
+from utils.admin_client import AdminClient
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def admin_api():
+    """/export/version va /darslik/search o'rnida: chaqiruvlar sanaladi."""
+    state = {"version": 1, "version_calls": 0, "search_calls": 0, "down": False}
+
+    async def version(request):
+        state["version_calls"] += 1
+        if state["down"]:
+            return web.Response(status=503)
+        return web.json_response({"versions": {"darslik": state["version"]}, "last_change": 1})
+
+    async def search(request):
+        state["search_calls"] += 1
+        return web.json_response([{"code": request.query["q"], "v": state["version"]}])
+
+    app = web.Application()
+    app.router.add_get("/export/version", version)
+    app.router.add_get("/darslik/search", search)
+    server = TestServer(app)
+    await server.start_server()
+    state["base"] = str(server.make_url("/"))
+    yield state
+    await server.close()
+
+
+async def test_search_served_from_cache_until_version_changes(admin_api, monkeypatch):
+    monkeypatch.setattr(admin_client, "SEARCH_VERSION_TTL", 60.0)
+    client = AdminClient(admin_api["base"])
+    for q in ("Algebra", "algebra ", "ALGEBRA"):
+        assert await client.search_lessons(q) == [{"code": "Algebra", "v": 1}]
+    assert (admin_api["version_calls"], admin_api["search_calls"]) == (1, 1)
+
+    admin_api["version"] = 2
+    await client.search_lessons("algebra")
+    assert admin_api["search_calls"] == 1  # TTL ichida versiya qayta so'ralmaydi
+
+    monkeypatch.setattr(admin_client, "SEARCH_VERSION_TTL", 0.0)
+    assert await client.search_lessons("algebra") == [{"code": "algebra", "v": 2}]
+    assert (admin_api["version_calls"], admin_api["search_calls"]) == (2, 2)
+
+
+async def test_search_bypasses_cache_when_version_unknown(admin_api, monkeypatch):
+    monkeypatch.setattr(admin_client, "SEARCH_VERSION_TTL", 0.0)
+    admin_api["down"] = True
+    client = AdminClient(admin_api["base"])
+    await client.search_lessons("fizika")
+    await client.search_lessons("fizika")
+    assert admin_api["search_calls"] == 2
+    assert client._search_cache == {}
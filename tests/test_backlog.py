@@ -0,0 +1,177 @@
+import time
+import types
+import asyncio
+
+import pytest
+from aiogram.types import Update
+
+from utils import backlog
+from utils.backlog import drain_backlog, filter_backlog
+
+pytestmark = pytest.mark.anyio
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    monkeypatch.setattr(backlog, "time", types.SimpleNamespace(time=lambda: NOW, monotonic=time.monotonic))
+
+
+def message(update_id: int, user_id: int, text: str = "salom", age_min: float = 0, **extra) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(NOW - age_min * 60),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "U"},
+            "text": text,
+            **extra,
+        },
+    })
+
+
+def callback(update_id: int, user_id: int, data: str = "ok", message_id: int = 1) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "U"},
+            "chat_instance": "ci",
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": NOW,
+                "chat": {"id": user_id, "type": "private"},
+                "text": "savol",
+            },
+        },
+    })
+
+
+def ids(updates):
+    return [u.update_id for u in updates]
+
+
+# ===================== filter_backlog =====================
+def test_all_keeps_everything_but_merges_repeated_taps():
+    updates = [message(1, 10), callback(2, 10), callback(3, 10), callback(4, 11), message(5, 11)]
+    kept, stats = filter_backlog(updates, policy="all", now=NOW)
+    assert ids(kept) == [1, 3, 4, 5]  # bir xil tugma — oxirgisi qoladi
+    assert stats["merged_callbacks"] == 1
+    assert stats["dropped"] == 1
+
+
+def test_drop_keeps_nothing():
+    kept, stats = filter_backlog([message(1, 10), callback(2, 10)], policy="drop", now=NOW)
+    assert kept == []
+    assert stats["dropped"] == 2
+
+
+def test_start_only_keeps_last_start_per_user():
+    updates = [
+        message(1, 10, "/start"), message(2, 10, "salom"), message(3, 11, "/start ref"),
+        message(4, 10, "/start"), callback(5, 10),
+    ]
+    kept, _ = filter_backlog(updates, policy="start_only", now=NOW)
+    assert ids(kept) == [3, 4]
+
+
+def test_recent_drops_old_and_dates_callbacks_by_preceding_update():
+    updates = [
+        callback(1, 10, "a"),                  # oldida sanali update yo'q — eskirgan
+        message(2, 10, age_min=30),
+        callback(3, 10, "b"),                  # 30 daqiqa oldingi message'dan keyin — eski
+        message(4, 11, age_min=2),
+        callback(5, 11, "c"),                  # yangi
+    ]
+    kept, stats = filter_backlog(updates, policy="recent", max_age_min=10, now=NOW)
+    assert ids(kept) == [4, 5]
+    assert stats["kept"] == 2
+
+
+def test_recent_uses_last_seen_from_previous_batch():
+    kept, _ = filter_backlog([callback(7, 10)], policy="recent", max_age_min=10, now=NOW, last_seen=NOW - 60)
+    assert ids(kept) == [7]
+
+
+def test_voice_counted_as_skipped_stt():
+    voice = message(1, 10, age_min=60, voice={"file_id": "v", "file_unique_id": "u", "duration": 2})
+    _, stats = filter_backlog([voice, message(2, 10)], policy="recent", max_age_min=10, now=NOW)
+    assert stats["stt_skipped"] == 1
+
+
+def test_unknown_policy_falls_back_to_all():
+    kept, _ = filter_backlog([message(1, 10)], policy="everything", now=NOW)
+    assert ids(kept) == [1]
+
+
+# ===================== drain_backlog =====================
+class FakeBot:
+    def __init__(self, updates):
+        self.pending = list(updates)
+        self.offsets = []
+        self.dropped = False
+
+    async def get_updates(self, offset=None, limit=100, timeout=0, allowed_updates=None):
+        self.offsets.append(offset)
+        if offset is not None:
+            self.pending = [u for u in self.pending if u.update_id >= offset]  # tasdiqlandi
+        return self.pending[:limit]
+
+    async def delete_webhook(self, drop_pending_updates=False):
+        self.dropped = drop_pending_updates
+        self.pending = []
+
+
+async def test_drain_all_does_not_touch_backlog():
+    bot = FakeBot([message(1, 10)])
+    assert await drain_backlog(bot, None, policy="all") == {}
+    assert bot.offsets == [] and len(bot.pending) == 1
+
+
+async def test_drain_drop_drops_pending():
+    bot = FakeBot([message(1, 10)])
+    await drain_backlog(bot, None, policy="drop")
+    assert bot.dropped and bot.pending == []
+
+
+async def test_drain_recent_handles_kept_in_batches_with_bounded_concurrency(frozen_now):
+    updates = [message(i, 1000 + i, age_min=0 if i % 2 else 60) for i in range(1, 251)]
+    bot = FakeBot(updates)
+    handled, running, peak = [], 0, 0
+
+    async def handle(upd):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        if upd.update_id == 3:
+            raise RuntimeError("handler xatosi")  # qolganlarini to'xtatmaydi
+        handled.append(upd.update_id)
+
+    totals = await drain_backlog(bot, handle, policy="recent", max_age_min=10, concurrency=8)
+    assert totals["total"] == 250 and totals["kept"] == 125
+    assert sorted(handled) == [i for i in range(1, 251, 2) if i != 3]
+    assert peak == 8
+    assert bot.offsets == [None, 101, 201, 251]
+    assert bot.pending == []
+
+
+async def test_drain_crash_leaves_batch_unconfirmed(frozen_now):
+    class Crash(BaseException):
+        """Jarayon qulashi: Exception emas, handler xatosi sifatida yutilmaydi."""
+
+    bot = FakeBot([message(i, 1000 + i) for i in range(1, 251)])
+
+    async def handle(upd):
+        if upd.update_id >= 150:
+            raise Crash
+
+    with pytest.raises(Crash):
+        await drain_backlog(bot, handle, policy="recent", max_age_min=10)
+    # birinchi paket tasdiqlangan, ikkinchisi keyingi ishga tushishda qayta keladi
+    assert bot.offsets == [None, 101]
+    assert ids(bot.pending)[0] == 101
@@ -0,0 +1,204 @@
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from urllib.parse import parse_qs
+
+import httpx
+import pytest
+
+import broadcast
+from broadcast import Broadcaster
+
+pytestmark = pytest.mark.anyio
+
+TEXT_JOB = {"method": "sendMessage", "text_or_caption": "Salom"}
+
+
+class FakeTelegram:
+    """Bot API o'rnida: chat_id bo'yicha javob; har bir chaqiruv yoziladi."""
+
+    def __init__(self, replies=None):
+        self.replies = replies or {}
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        form = {k: v[0] for k, v in parse_qs(request.content.decode()).items()}
+        chat_id = int(form["chat_id"])
+        self.calls.append(chat_id)
+        reply = self.replies.get(chat_id)
+        if callable(reply):
+            reply = reply()
+        if reply is None:
+            return httpx.Response(200, json={"ok": True, "result": {"message_id": len(self.calls)}})
+        status, body = reply
+        return httpx.Response(status, json={"ok": False, **body})
+
+
+def too_many(retry_after: float = 0.01):
+    return 429, {"error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": retry_after}}
+
+
+def _no_sleep(real_sleep):
+    # 5xx backoff (2 s) kutilmasin
+    async def sleep(delay, *args, **kwargs):
+        await real_sleep(0)
+    return sleep
+
+
+@pytest.fixture
+async def make_broadcaster():
+    opened = []
+
+    async def factory(api: FakeTelegram, **kwargs) -> Broadcaster:
+        kwargs = {"rate": 1000, "per_chat_interval": 0, **kwargs}
+        b = Broadcaster("T", api_base="http://tg.test", **kwargs)
+        b._client = httpx.AsyncClient(base_url=b._base_url, transport=httpx.MockTransport(api))
+        opened.append(b)
+        return b
+
+    yield factory
+    for b in opened:
+        await b.__aexit__(None, None, None)
+
+
+async def test_run_counts_sent_blocked_and_failed(make_broadcaster):
+    api = FakeTelegram({
+        2: (403, {"error_code": 403, "description": "Forbidden: bot was blocked by the user"}),
+        3: (400, {"error_code": 400, "description": "Bad Request: chat not found"}),
+        4: (400, {"error_code": 400, "description": "Bad Request: message is too long"}),
+    })
+    b = await make_broadcaster(api)
+    seen = {}
+
+    async def on_result(chat_id, results):
+        seen[chat_id] = results
+
+    stats = await b.run([1, 2, 3, 4, 5], [TEXT_JOB, TEXT_JOB], on_result=on_result)
+    assert (stats["sent"], stats["unreachable"], stats["failed"]) == (2, 2, 1)
+    assert len(seen) == 5
+    assert len(seen[2]) == 1  # bloklagan foydalanuvchiga ikkinchi xabar yuborilmaydi
+    assert api.calls.count(1) == 2
+
+
+async def test_5xx_is_retried(make_broadcaster, monkeypatch):
+    monkeypatch.setattr(broadcast.asyncio, "sleep", _no_sleep(broadcast.asyncio.sleep))
+    replies = iter([(502, {"error_code": 502, "description": "Bad Gateway"}), None])
+    api = FakeTelegram({7: lambda: next(replies)})
+    b = await make_broadcaster(api)
+    res = await b.call("sendMessage", {"chat_id": 7, "text": "x"})
+    assert res.ok and api.calls == [7, 7]
+
+
+async def test_429_retries_are_capped_and_transient(make_broadcaster):
+    api = FakeTelegram({9: too_many})
+    b = await make_broadcaster(api, max_429=3)
+    res = await b.call("sendMessage", {"chat_id": 9, "text": "x"})
+    assert not res.ok and res.status == 429
+    assert broadcast.classify_error(res) == broadcast.TRANSIENT
+    assert not broadcast.is_permanent(res)
+    assert len(api.calls) == 4  # birinchi urinish + 3 ta qayta
+    assert b.stats.rate_limited == 4
+    assert b.bucket.rate < 1000  # multiplicative decrease
+
+
+async def test_429_then_success_is_not_an_error(make_broadcaster):
+    replies = iter([too_many(), too_many(), None])
+    api = FakeTelegram({5: lambda: next(replies)})
+    b = await make_broadcaster(api, max_429=3)
+    stats = await b.run([5], [TEXT_JOB])
+    assert stats["sent"] == 1 and stats["failed"] == 0
+
+
+# ===================== classify_error =====================
+@pytest.mark.parametrize(
+    "status, description, expected",
+    [
+        (403, "Forbidden: bot was blocked by the user", broadcast.BLOCKED),
+        (403, "Forbidden: user is deactivated", broadcast.UNREACHABLE),
+        (403, "Forbidden: bot can't initiate conversation with a user", broadcast.UNREACHABLE),
+        (400, "Bad Request: chat not found", broadcast.UNREACHABLE),
+        (400, "Bad Request: PEER_ID_INVALID", broadcast.UNREACHABLE),
+        (403, "Forbidden: something new", broadcast.BLOCKED),
+        (429, "Too Many Requests: retry after 5", broadcast.TRANSIENT),
+        (502, "Bad Gateway", broadcast.TRANSIENT),
+        (0, "network: ConnectError", broadcast.TRANSIENT),
+        (400, "Bad Request: wrong file identifier/HTTP URL specified", broadcast.FAILED),
+        (400, "Bad Request: message is too long", broadcast.FAILED),
+    ],
+)
+def test_classify_error(status, description, expected):
+    res = broadcast.CallResult(False, status, description)
+    assert broadcast.classify_error(res) == expected
+    assert broadcast.is_permanent(res) == (expected in (broadcast.BLOCKED, broadcast.UNREACHABLE))
+
+
+def test_bad_file_id_is_not_the_recipients_fault():
+    res = broadcast.CallResult(False, 400, "Bad Request: wrong file identifier/HTTP URL specified")
+    assert broadcast.is_bad_file_id(res)
+    assert not broadcast.is_permanent(res)
+
+
+# ===================== TokenBucket =====================
+def test_job_cost_counts_album_items():
+    album = {"method": "sendMediaGroup", "media": [{"media_field": "photo"}] * 7}
+    assert broadcast.job_cost(album) == 7
+    assert broadcast.job_cost({"method": "copyMessages", "message_ids": list(range(40))}) == 40
+    assert broadcast.job_cost(TEXT_JOB) == 1
+
+
+async def test_cost_above_capacity_goes_into_debt():
+    bucket = broadcast.TokenBucket(rate=50)  # capacity 50
+    t0 = time.monotonic()
+    await bucket.acquire(60)  # to'la bucket: darhol, 10 qarz bilan
+    assert time.monotonic() - t0 < 0.05
+    assert bucket._tokens == pytest.approx(-10, abs=0.5)
+
+    await bucket.acquire(1)  # qarz + 1 token: (10 + 1) / 50 s
+    assert time.monotonic() - t0 >= 0.2
+
+
+async def test_pause_keeps_debt_and_drops_surplus():
+    bucket = broadcast.TokenBucket(rate=50)
+    await bucket.acquire(60)
+    bucket.pause(0.05)
+    assert bucket._tokens == pytest.approx(-10, abs=0.5)  # pauza qarzni kechmaydi
+    assert bucket.rate == pytest.approx(35)
+
+    full = broadcast.TokenBucket(rate=50)
+    full.pause(0.01)
+    assert full._tokens == 0  # pauzadan keyin burst yo'q
+
+
+async def test_average_rate_holds_with_oversized_costs():
+    bucket = broadcast.TokenBucket(rate=1000, capacity=10)
+    t0 = time.monotonic()
+    for _ in range(20):
+        await bucket.acquire(15)  # har biri capacity'dan katta
+    # 300 token: 10 tasi boshlang'ich burst, 5 tasi oxirgi qarz, qolgan 285 — rate bilan
+    assert time.monotonic() - t0 >= 0.28
+
+
+# ===================== Schedule =====================
+def at(hour: int, minute: int = 0) -> datetime:
+    return datetime(2026, 3, 1, hour, minute, tzinfo=broadcast.BROADCAST_TZ)
+
+
+def test_quiet_hours_overnight_window():
+    spec = "23:00-08:00"
+    assert broadcast.in_quiet_hours(spec, at(23, 30))
+    assert broadcast.in_quiet_hours(spec, at(3))
+    assert not broadcast.in_quiet_hours(spec, at(8))
+    assert not broadcast.in_quiet_hours(spec, at(22, 59))
+
+
+def test_quiet_hours_same_day_window_and_disabled():
+    assert broadcast.in_quiet_hours("13:00-14:00", at(13, 30))
+    assert not broadcast.in_quiet_hours("13:00-14:00", at(14))
+    assert not broadcast.in_quiet_hours("", at(3))
+    with pytest.raises(ValueError):
+        broadcast.parse_quiet_hours("23:00")
+
+
+def test_naive_schedule_time_is_local(monkeypatch):
+    monkeypatch.setattr(broadcast, "BROADCAST_TZ", ZoneInfo("Asia/Tashkent"))  # UTC+5
+    assert broadcast.to_utc_naive(datetime(2026, 3, 1, 9, 0)) == datetime(2026, 3, 1, 4, 0)
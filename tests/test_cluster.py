@@ -0,0 +1,98 @@
+import os
+import json
+import time
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import cluster
+from cluster import Cluster, PartitionUnavailable, partition_key
+
+pytestmark = pytest.mark.anyio
+
+
+async def crashing_worker():
+    """Worker factory (spawn jarayonida "test_cluster:crashing_worker" sifatida yuklanadi)."""
+    async def handle(update):
+        if update.get("crash"):
+            os._exit(3)
+
+    async def shutdown():
+        pass
+
+    return handle, shutdown
+
+
+def raw(update) -> bytes:
+    return json.dumps(update).encode()
+
+
+def wait_for(predicate, timeout: float = 20.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+# ===================== partition_key =====================
+def test_partition_key_uses_sender():
+    msg = {"update_id": 7, "message": {"message_id": 1, "from": {"id": 42}, "chat": {"id": -100}}}
+    cb = {"update_id": 8, "callback_query": {"id": "x", "from": {"id": 42}, "message": {"chat": {"id": 42}}}}
+    assert partition_key(msg) == partition_key(cb) == 42
+
+
+def test_partition_key_falls_back_to_chat_then_update_id():
+    post = {"update_id": 9, "channel_post": {"message_id": 1, "chat": {"id": -100500}}}
+    assert partition_key(post) == -100500
+    assert partition_key({"update_id": 11}) == 11
+
+
+def test_same_user_always_lands_on_same_worker():
+    c = Cluster(4, queue_max=100)
+    idx = {c.dispatch(raw({"update_id": i, "message": {"from": {"id": 1234}}})) for i in range(20)}
+    assert idx == {1234 % 4}
+    assert c.dispatched[1234 % 4] == 20
+
+
+# ===================== Ingress =====================
+async def test_webhook_rejects_with_503_when_partition_queue_is_full():
+    c = Cluster(2, queue_max=1)  # worker'lar ishga tushirilmagan — navbat bo'shamaydi
+    async with TestClient(TestServer(c.make_app(path="/hook", secret="s3"))) as http:
+        headers = {"X-Telegram-Bot-Api-Secret-Token": "s3"}
+        update = {"update_id": 1, "message": {"from": {"id": 10}}}
+        assert (await http.post("/hook", data=raw(update))).status == 401
+        assert (await http.post("/hook", data=raw(update), headers=headers)).status == 200
+        assert (await http.post("/hook", data=raw(update), headers=headers)).status == 503
+        # boshqa bo'lim ishlashda davom etadi
+        other = {"update_id": 2, "message": {"from": {"id": 11}}}
+        assert (await http.post("/hook", data=raw(other), headers=headers)).status == 200
+        assert (await http.post("/hook", data=b"not json", headers=headers)).status == 200
+
+        health = await http.get("/healthz")
+        assert health.status == 503  # worker jarayonlari tirik emas
+        assert (await health.json())["dispatched"] == [1, 1]
+
+
+def test_dead_worker_is_restarted_then_partition_fails(monkeypatch):
+    monkeypatch.setattr(cluster, "CLUSTER_RESTART_WINDOW", 600.0)
+    c = Cluster(1, "test_cluster:crashing_worker", max_restarts=1)
+    c.start()
+    try:
+        crash = raw({"update_id": 1, "crash": True})
+        c.dispatch(crash)
+        assert wait_for(lambda: not c._procs[0].is_alive())
+        assert not c.healthy()
+        assert c.supervise() == [0]
+        assert c._procs[0].is_alive() and c.healthy()
+
+        c.dispatch(crash)  # yangi worker ham quladi — ketma-ket ikkinchi marta
+        assert wait_for(lambda: not c._procs[0].is_alive())
+        assert c.supervise() == []
+        assert c.failed == [True]
+        assert not c.healthy()
+        with pytest.raises(PartitionUnavailable):
+            c.dispatch(raw({"update_id": 2}))
+    finally:
+        c.stop(timeout=5)
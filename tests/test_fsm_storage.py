@@ -0,0 +1,142 @@
+import asyncio
+import threading
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from utils import fsm_storage
+from utils.fsm_storage import BoundedMemoryStorage
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(fsm_storage, "time", c)
+    return c
+
+
+def key(user_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+
+# ===================== BoundedMemoryStorage =====================
+async def test_memory_ttl_expires_idle_session(clock):
+    storage = BoundedMemoryStorage(ttl=60, sweep_interval=10)
+    await storage.set_state(key(1), "Diag:q1")
+    await storage.set_data(key(1), {"i": 3})
+
+    clock.now += 59
+    assert await storage.get_state(key(1)) == "Diag:q1"  # o'qish ham muddatni yangilaydi
+    clock.now += 59
+    assert await storage.get_data(key(1)) == {"i": 3}
+    clock.now += 61
+    assert await storage.get_state(key(1)) is None
+    assert storage.stats()["evicted_ttl"] == 1
+    assert storage.stats()["bytes"] == 0
+
+
+async def test_memory_sweep_drops_expired_on_write(clock):
+    storage = BoundedMemoryStorage(ttl=60, sweep_interval=10)
+    for uid in range(5):
+        await storage.set_state(key(uid), "S:a")
+    clock.now += 120
+    await storage.set_state(key(99), "S:b")  # yozish paytidagi sweep
+    assert storage.stats()["sessions"] == 1
+    assert storage.stats()["evicted_ttl"] == 5
+
+
+async def test_memory_lru_cap_evicts_least_recently_used(clock):
+    storage = BoundedMemoryStorage(ttl=0, max_bytes=100)
+    for uid in range(3):
+        await storage.set_data(key(uid), {"x": "a" * 20})
+        clock.now += 1
+    await storage.get_data(key(0))  # 0 — eng yangi, 1 — eng eski
+    await storage.set_data(key(3), {"x": "b" * 40})
+
+    assert await storage.get_data(key(1)) == {}
+    assert await storage.get_data(key(0)) == {"x": "a" * 20}
+    assert storage.stats()["bytes"] <= 100
+    assert storage.stats()["evicted_lru"] >= 1
+
+
+async def test_memory_clear_frees_session(clock):
+    storage = BoundedMemoryStorage()
+    await storage.set_state(key(1), "S:a")
+    await storage.set_data(key(1), {"a": 1})
+    await storage.set_state(key(1), None)
+    await storage.set_data(key(1), {})
+    assert storage.stats()["sessions"] == 0
+    assert storage.stats()["bytes"] == 0
+
+
+# ===================== SQLiteStorage =====================
+async def test_sqlite_survives_restart(tmp_path):
+    path = tmp_path / "fsm.db"
+    storage = fsm_storage.SQLiteStorage(path, flush_interval=60)
+    await storage.set_state(key(1), "Hayvon:q2")
+    await storage.set_data(key(1), {"score": 4, "ism": "Ali"})
+    await storage.set_state(key(2), "Diag:q1")
+    await storage.set_state(key(2), None)  # tozalangan sessiya diskda qolmaydi
+    await storage.close()  # qolgan o'zgarishlar shu yerda yoziladi
+
+    reopened = fsm_storage.SQLiteStorage(path)
+    try:
+        assert await reopened.get_state(key(1)) == "Hayvon:q2"
+        assert await reopened.get_data(key(1)) == {"score": 4, "ism": "Ali"}
+        assert await reopened.get_state(key(2)) is None
+        rows = reopened._conn.execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+        assert rows == 1
+    finally:
+        await reopened.close()
+
+
+async def test_sqlite_coalesces_writes_per_key(tmp_path):
+    storage = fsm_storage.SQLiteStorage(tmp_path / "fsm.db", flush_interval=60)
+    try:
+        for i in range(50):
+            await storage.set_data(key(1), {"i": i})
+        await storage.flush()
+        assert storage.stats()["flushes"] == 1
+        assert storage.stats()["rows_written"] == 1
+        assert await storage.get_data(key(1)) == {"i": 49}
+    finally:
+        await storage.close()
+
+
+async def test_sqlite_write_during_disk_read_wins(tmp_path):
+    storage = fsm_storage.SQLiteStorage(tmp_path / "fsm.db", flush_interval=60)
+    release = threading.Event()
+    calls = []
+
+    def slow_read_row(k):
+        calls.append(k)
+        if len(calls) == 1:
+            release.wait(5)  # birinchi o'qish thread'da "osilib" turadi
+            return ("Old:state", b"")
+        return None
+
+    storage._read_row = slow_read_row
+    try:
+        reader = asyncio.get_running_loop().create_task(storage.get_state(key(1)))
+        await asyncio.sleep(0.05)
+        await storage.set_state(key(1), "New:state")
+        release.set()
+        # eski qator keshga tushmaydi, o'quvchi yangi qiymatni oladi
+        assert await reader == "New:state"
+        assert await storage.get_state(key(1)) == "New:state"
+    finally:
+        release.set()
+        await storage.close()
@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def legacy_db(admin_app, tmp_path):
+    """Eski baza: jadvallar bor, lekin kalitlar unique emas va dublikatlar yozilgan."""
+    path = str(tmp_path / "legacy.db")
+    admin_app.SQLModel.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    db = sqlite3.connect(path, isolation_level=None)
+    for table, column in (("darslik", "code"), ("botuser", "tg_id"), ("hayvonquestion", "key")):
+        db.execute(f"DROP INDEX ix_{table}_{column}")
+        db.execute(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})")
+    db.executemany(
+        "INSERT INTO darslik (code, title, text, pdf_path, enabled, created_at) "
+        "VALUES (?, ?, '', '', 1, '2024-01-01 00:00:00')",
+        [("A1", "birinchi"), ("A1", "ikkinchi"), ("B2", "yagona"), ("A1", "uchinchi")],
+    )
+    db.executemany(
+        "INSERT INTO botuser (tg_id, username, full_name, role, is_blocked, notes, created_at, unreachable) "
+        "VALUES (?, ?, '', 'user', 0, '', '2024-01-01 00:00:00', 0)",
+        [(100, "eski"), (100, "yangi"), (200, "boshqa")],
+    )
+    db.close()
+    return path
+
+
+def rows(path, sql):
+    db = sqlite3.connect(path)
+    try:
+        return db.execute(sql).fetchall()
+    finally:
+        db.close()
+
+
+def test_migrations_dedupe_and_add_unique_keys(admin_app, legacy_db):
+    applied = admin_app.run_migrations(legacy_db)
+    assert applied == [v for v, _ in admin_app.MIGRATIONS]
+
+    # eng kichik id kalitini saqlaydi, qolganlari yo'qolmaydi — qayta nomlanadi
+    assert rows(legacy_db, "SELECT id, code, title FROM darslik ORDER BY id") == [
+        (1, "A1", "birinchi"), (2, "A1~dup2", "ikkinchi"), (3, "B2", "yagona"), (4, "A1~dup4", "uchinchi"),
+    ]
+    assert rows(legacy_db, "SELECT tg_id, username FROM botuser ORDER BY id") == [(100, "eski"), (200, "boshqa")]
+    assert rows(legacy_db, "SELECT tg_id, username FROM botuser_duplicate") == [(100, "yangi")]
+
+    db = sqlite3.connect(legacy_db)
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            db.execute("UPDATE darslik SET code = 'B2' WHERE id = 1")
+    finally:
+        db.close()
+
+
+def test_migrations_are_idempotent(admin_app, legacy_db):
+    admin_app.run_migrations(legacy_db)
+    before = rows(legacy_db, "SELECT * FROM darslik ORDER BY id")
+    assert admin_app.run_migrations(legacy_db) == []
+    assert rows(legacy_db, "SELECT * FROM darslik ORDER BY id") == before
+    versions = rows(legacy_db, "SELECT version FROM schema_migrations ORDER BY version")
+    assert [v for (v,) in versions] == [v for v, _ in admin_app.MIGRATIONS]
+
+
+def test_failed_step_is_rolled_back(admin_app, legacy_db, monkeypatch):
+    def boom(db):
+        db.execute("CREATE TABLE half_done (x)")
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(admin_app, "MIGRATIONS", [*admin_app.MIGRATIONS[:2], (3, boom)])
+    with pytest.raises(RuntimeError):
+        admin_app.run_migrations(legacy_db)
+    assert rows(legacy_db, "SELECT name FROM sqlite_master WHERE name = 'half_done'") == []
+    assert [v for (v,) in rows(legacy_db, "SELECT version FROM schema_migrations")] == [1, 2]
+
+
+# ===================== 409 =====================
+async def test_duplicate_key_returns_409(client):
+    lesson = {"code": "DUP-1", "title": "Alifbo", "text": "", "pdf_path": "", "enabled": True}
+    assert (await client.post("/darslik", json=lesson)).status_code == 200
+    r = await client.post("/darslik", json={**lesson, "title": "Boshqa"})
+    assert r.status_code == 409
+    assert r.json() == {"detail": "code already exists"}
+
+    user = {"tg_id": 777001, "username": "dup_user"}
+    assert (await client.post("/users", json=user)).status_code == 200
+    r = await client.post("/users", json=user)
+    assert r.status_code == 409
+    assert r.json() == {"detail": "tg_id already exists"}
@@ -0,0 +1,70 @@
+import pytest
+
+from tg_ratelimit import BULK, INTERACTIVE, RateLimitCoordinator
+
+
+@pytest.fixture
+def limiters(tmp_path):
+    path = str(tmp_path / "rl.sqlite3")
+    made = []
+
+    def make(**kwargs):
+        limiter = RateLimitCoordinator(path=path, **{"rate": 10, "reserve_percent": 20, **kwargs})
+        made.append(limiter)
+        return limiter
+
+    yield make
+    for limiter in made:
+        limiter.close()
+
+
+def tokens(limiter: RateLimitCoordinator) -> float:
+    return limiter._connect().execute("SELECT tokens FROM bucket").fetchone()[0]
+
+
+def test_bulk_leaves_reserve_for_interactive(limiters):
+    bot, worker = limiters(), limiters()
+    granted = 0
+    while worker._take(BULK, 1) == 0 and granted < 20:
+        granted += 1
+    assert granted == 8  # capacity 10, 20% zaxira
+    assert bot._take(INTERACTIVE, 1) == 0
+    assert bot._take(INTERACTIVE, 1) == 0
+
+
+def test_interactive_wait_blocks_bulk(limiters):
+    bot, worker = limiters(), limiters()
+    for _ in range(10):
+        bot._take(INTERACTIVE, 1)
+    assert bot._take(INTERACTIVE, 1) > 0   # kutmoqda — bulk'ga navbat berilmaydi
+    assert worker._take(BULK, 1) > 0
+
+
+def test_debt_is_shared_and_survives_pause(limiters):
+    bot, worker = limiters(), limiters()
+    assert worker._take(INTERACTIVE, 15) == 0  # capacity 10 — 5 qarz
+    assert tokens(bot) == pytest.approx(-5, abs=0.2)
+    assert bot._take(INTERACTIVE, 1) > 0.5      # qarz + 1 token / 10 per s
+
+    bot.pause(0.01)
+    assert tokens(worker) == pytest.approx(-5, abs=0.2)  # 429 pauzasi qarzni kechmaydi
+
+
+def test_pause_zeroes_surplus_and_blocks_everyone(limiters):
+    bot, worker = limiters(), limiters()
+    bot._take(INTERACTIVE, 1)
+    worker.pause(5)
+    assert tokens(bot) == 0
+    assert bot._take(INTERACTIVE, 1) > 4
+    assert worker._take(BULK, 1) > 4
+
+
+def test_falls_back_to_local_bucket_when_db_unusable(tmp_path):
+    (tmp_path / "dir.sqlite3").mkdir()  # fayl o'rnida papka — ochib bo'lmaydi
+    limiter = RateLimitCoordinator(path=str(tmp_path / "dir.sqlite3"), rate=10)
+    try:
+        assert limiter._take(INTERACTIVE, 1) == 0
+        assert not limiter.shared
+        assert limiter._local.rate == 5  # budjetning yarmi
+    finally:
+        limiter.close()
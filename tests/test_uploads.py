@@ -0,0 +1,73 @@
+import hashlib
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+LIMIT = 1000
+
+
+@pytest.fixture
+def image_dir(admin_app, tmp_path, monkeypatch):
+    """Yuklashlar repo'dagi static/ ga emas, vaqtinchalik papkaga; chegara — 1000 bayt."""
+    monkeypatch.setitem(admin_app.UPLOAD_KINDS, "image", (tmp_path, "images", "image.bin"))
+    monkeypatch.setitem(admin_app.UPLOAD_LIMITS, "image", LIMIT)
+    return tmp_path
+
+
+async def test_upload_streams_file_with_sha256(client, image_dir):
+    data = bytes(range(256)) * 3
+    r = await client.post("/upload/image", files={"file": ("rasm.png", data, "image/png")})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["url"] == "/static/images/rasm.png"
+    assert body["size"] == len(data)
+    assert body["sha256"] == hashlib.sha256(data).hexdigest()
+    assert (image_dir / "rasm.png").read_bytes() == data
+    assert list(image_dir.glob(".*.part")) == []
+
+
+async def test_upload_never_overwrites_and_strips_paths(client, image_dir):
+    first = await client.post("/upload/image", files={"file": ("../../a.png", b"one", "image/png")})
+    second = await client.post("/upload/image", files={"file": ("a.png", b"two", "image/png")})
+    assert first.json()["url"] == "/static/images/a.png"
+    assert second.json()["url"] == "/static/images/a_1.png"
+    assert (image_dir / "a.png").read_bytes() == b"one"
+    assert sorted(p.name for p in image_dir.iterdir()) == ["a.png", "a_1.png"]
+
+
+async def test_upload_over_limit_is_413_without_leftovers(client, image_dir):
+    # Content-Length multipart zaxirasi ichida — chegara oqim paytida tekshiriladi
+    r = await client.post("/upload/image", files={"file": ("big.png", b"x" * (LIMIT + 1), "image/png")})
+    assert r.status_code == 413
+    assert list(image_dir.iterdir()) == []
+
+    exact = await client.post("/upload/image", files={"file": ("ok.png", b"x" * LIMIT, "image/png")})
+    assert exact.status_code == 200
+
+
+async def test_upload_rejected_by_content_length_before_reading(client, admin_app, image_dir, monkeypatch):
+    async def never(*args, **kwargs):
+        raise AssertionError("body o'qilmasligi kerak edi")
+
+    monkeypatch.setattr(admin_app, "save_upload", never)
+    big = b"x" * (LIMIT + admin_app.UPLOAD_MULTIPART_SLACK + 1)
+    r = await client.post("/upload/image", files={"file": ("huge.png", big, "image/png")})
+    assert r.status_code == 413
+    assert r.json() == {"detail": f"file too large (max {LIMIT} bytes)"}
+
+
+async def test_upload_requires_api_key(client, image_dir):
+    r = await client.post(
+        "/upload/image", files={"file": ("a.png", b"x", "image/png")}, headers={"X-API-Key": "wrong"}
+    )
+    assert r.status_code == 401
+    assert list(image_dir.iterdir()) == []
+
+
+def test_upload_limits_env_parsing(admin_app):
+    limits = admin_app.upload_limits("video=500; image=5")
+    assert limits["video"] == 500 * 1024 * 1024 and limits["image"] == 5 * 1024 * 1024
+    assert limits["pdf"] == admin_app.UPLOAD_LIMITS_MB["pdf"] * 1024 * 1024
+    with pytest.raises(RuntimeError):
+        admin_app.upload_limits("gif=5")
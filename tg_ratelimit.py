@@ -0,0 +1,205 @@
+"""
+Bot (bot/main.py) va broadcast worker uchun umumiy Telegram rate limit.
+
+Ikkala jarayon bitta token bilan yuboradi, Telegram limiti esa token bo'yicha
+(~30 msg/s). Shuning uchun ruxsat (permit) bitta SQLite fayldagi token
+bucket'dan olinadi:
+
+- interactive (bot javoblari) — bucket'dagi istalgan tokenni oladi;
+- bulk (broadcast) — faqat zaxiradan (BROADCAST_RESERVE_PERCENT) ortig'ini oladi
+  va interaktiv so'rov kutib turgan paytda umuman olmaydi;
+- 429 kelsa pause(retry_after) hamma jarayonlarni to'xtatadi;
+- narx (n) capacity'dan katta bo'lsa (albom, copyMessages) to'liq yechiladi:
+  balans qarzga ketadi va keyingi ruxsatlar qarz qoplanguncha kutadi.
+
+Fayl ochilmasa yoki uzoq blokda qolsa, jarayon lokal bucket bilan ishlaydi
+(budjetning FALLBACK_SHARE qismi — ikki jarayon birga ham limitdan oshmaydi)
+va RETRY_SHARED_AFTER soniyadan keyin umumiy bucket'ga qaytishga urinadi.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+log = logging.getLogger("tg_ratelimit")
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+TG_RATELIMIT_DB = os.getenv(
+    "TG_RATELIMIT_DB", str(Path(__file__).resolve().parent / "data" / "tg_ratelimit.sqlite3")
+)
+TELEGRAM_RATE_BUDGET = float(os.getenv("TELEGRAM_RATE_BUDGET", "30"))
+BROADCAST_RESERVE_PERCENT = min(95.0, max(0.0, float(os.getenv("BROADCAST_RESERVE_PERCENT", "20"))))
+FALLBACK_SHARE = 0.5
+RETRY_SHARED_AFTER = 30.0
+HI_WAIT_WINDOW = 0.5    # interaktiv so'rov kutayotgani shuncha vaqt "eslab" qolinadi
+MAX_SLEEP = 0.5
+
+
+class _LocalBucket:
+    def __init__(self, rate: float):
+        self.rate = max(0.1, rate)
+        self.capacity = max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.ts = time.time()
+        self.paused_until = 0.0
+
+    def take(self, n: float, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        need = min(n, self.capacity)
+        if self.tokens >= need:
+            self.tokens -= n
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+
+class RateLimitCoordinator:
+    """
+    Foydalanish:
+        limiter = RateLimitCoordinator()
+        await limiter.acquire(BULK, n=1)
+        ...
+        limiter.pause(retry_after)      # 429 kelganda
+    """
+
+    def __init__(
+        self,
+        path: str = TG_RATELIMIT_DB,
+        rate: float = TELEGRAM_RATE_BUDGET,
+        reserve_percent: float = BROADCAST_RESERVE_PERCENT,
+        fallback_rate: Optional[float] = None,
+        name: str = "telegram",
+    ):
+        self.path = path
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate)          # 1 soniyalik burst
+        self.reserve = self.capacity * reserve_percent / 100
+        self._local = _LocalBucket(fallback_rate if fallback_rate is not None else self.rate * FALLBACK_SHARE)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    # ---------- shared (SQLite) ----------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=0.2, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bucket ("
+                " name TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL,"
+                " paused_until REAL NOT NULL DEFAULT 0, hi_wait_until REAL NOT NULL DEFAULT 0)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _take_shared(self, priority: str, n: float) -> float:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, ts, paused_until, hi_wait_until FROM bucket WHERE name = ?", (self.name,)
+            ).fetchone()
+            tokens, ts, paused_until, hi_wait_until = row or (self.capacity, now, 0.0, 0.0)
+            tokens = min(self.capacity, tokens + max(0.0, now - ts) * self.rate)
+            ts = max(ts, now)  # pauza paytida ts = paused_until, token to'planmaydi
+            wait = 0.0
+            if now < paused_until:
+                wait = paused_until - now
+            elif priority == BULK:
+                need = min(n, self.capacity - self.reserve)
+                if now < hi_wait_until:
+                    wait = hi_wait_until - now
+                elif tokens - need >= self.reserve:
+                    tokens -= n
+                else:
+                    wait = (self.reserve + need - tokens) / self.rate
+            else:
+                need = min(n, self.capacity)
+                if tokens >= need:
+                    tokens -= n
+                else:
+                    hi_wait_until = now + HI_WAIT_WINDOW
+                    wait = (need - tokens) / self.rate
+            conn.execute(
+                "INSERT INTO bucket (name, tokens, ts, paused_until, hi_wait_until) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET tokens = excluded.tokens, ts = excluded.ts, "
+                "hi_wait_until = excluded.hi_wait_until",
+                (self.name, tokens, ts, paused_until, hi_wait_until),
+            )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _shared_failed(self, e: BaseException) -> None:
+        log.warning(
+            "Rate limit coordinator unavailable (%s): local limit %.1f/s for %.0fs",
+            e, self._local.rate, RETRY_SHARED_AFTER,
+        )
+        self._down_until = time.time() + RETRY_SHARED_AFTER
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except sqlite3.Error:
+                pass
+            self._conn = None
+
+    def _take(self, priority: str, n: float) -> float:
+        with self._lock:
+            if time.time() >= self._down_until:
+                try:
+                    return self._take_shared(priority, n)
+                except (sqlite3.Error, OSError) as e:
+                    self._shared_failed(e)
+            return self._local.take(n, time.time())
+
+    @property
+    def shared(self) -> bool:
+        return time.time() >= self._down_until
+
+    # ---------- public ----------
+    async def acquire(self, priority: str = INTERACTIVE, n: float = 1.0) -> None:
+        while True:
+            wait = await asyncio.to_thread(self._take, priority, n)
+            if wait <= 0:
+                return
+            await asyncio.sleep(min(max(wait, 0.005), MAX_SLEEP))
+
+    def pause(self, seconds: float) -> None:
+        """429 retry_after: barcha jarayonlar shu vaqtgacha yubormaydi."""
+        until = time.time() + max(0.0, seconds)
+        with self._lock:
+            self._local.paused_until = max(self._local.paused_until, until)
+            if time.time() < self._down_until:
+                return
+            try:
+                self._connect().execute(
+                    "INSERT INTO bucket (name, tokens, ts, paused_until) VALUES (?, 0, ?, ?) "
+                    "ON CONFLICT (name) DO UPDATE SET tokens = MIN(tokens, 0), ts = excluded.ts, "
+                    "paused_until = MAX(paused_until, excluded.paused_until)",
+                    (self.name, until, until),
+                )
+            except (sqlite3.Error, OSError) as e:
+                self._shared_failed(e)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None